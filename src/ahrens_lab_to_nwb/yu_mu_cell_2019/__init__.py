@@ -1,8 +1,26 @@
-from .interfaces.yu_mu_cell_2019_imaging_interface import AhrensHdf5ImagingInterface
-from .interfaces.yu_mu_cell_2019_single_color_segmentation_interface import YuMu2019SingleColorSegmentationInterface
-from .interfaces.yu_mu_cell_2019_dual_color_segmentation_interface import YuMu2019DualColorSegmentationInterface
-from .interfaces.yu_mu_cell_2019_raw_behavior_interface import YuMu2019RawBehaviorInterface
-from .interfaces.yu_mu_cell_2019_processsed_behavior_interface import YuMu2019ProcessedBehaviorInterface
-from .interfaces.yu_mu_cell_2019_trials_interface import YuMu2019TrialsInterface
-from .interfaces.yu_mu_cell_2019_activity_states_interface import YuMu2019ActivityStatesInterface
-from .interfaces.yu_mu_cell_2019_swim_intervals_interface import YuMu2019SwimIntervalsInterface
+import importlib
+
+# The interfaces are imported on first access, so that importing the package (e.g., for its tools) stays cheap
+_INTERFACE_MODULE_NAMES = dict(
+    AhrensHdf5ImagingInterface="yu_mu_cell_2019_imaging_interface",
+    YuMu2019SingleColorSegmentationInterface="yu_mu_cell_2019_single_color_segmentation_interface",
+    YuMu2019DualColorSegmentationInterface="yu_mu_cell_2019_dual_color_segmentation_interface",
+    YuMu2019RawBehaviorInterface="yu_mu_cell_2019_raw_behavior_interface",
+    YuMu2019ProcessedBehaviorInterface="yu_mu_cell_2019_processsed_behavior_interface",
+    YuMu2019TrialsInterface="yu_mu_cell_2019_trials_interface",
+    YuMu2019ActivityStatesInterface="yu_mu_cell_2019_activity_states_interface",
+    YuMu2019SwimIntervalsInterface="yu_mu_cell_2019_swim_intervals_interface",
+)
+
+__all__ = list(_INTERFACE_MODULE_NAMES)
+
+
+def __getattr__(name: str):
+    if name not in _INTERFACE_MODULE_NAMES:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    module = importlib.import_module(name=f".interfaces.{_INTERFACE_MODULE_NAMES[name]}", package=__name__)
+    return getattr(module, name)
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
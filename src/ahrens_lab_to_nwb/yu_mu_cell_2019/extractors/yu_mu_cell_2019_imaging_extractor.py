@@ -1,6 +1,7 @@
 """Modification of the roiextractors.Hdf5ImagingExtractor to read the custom miroscope data from the Ahrens lab."""
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Tuple, Literal
+from typing import List, Optional, Tuple, Literal
 
 import h5py
 import numpy as np
@@ -8,6 +9,10 @@ from roiextractors.imagingextractor import ImagingExtractor
 from roiextractors.extraction_tools import PathType
 from lazy_ops import DatasetView
 
+from ..tools.yu_mu_cell_2019_file_handles import FileHandleCache
+from ..tools.yu_mu_cell_2019_frame_manifest import FrameFileManifest
+from ..tools.yu_mu_cell_2019_frame_prefetch import FrameFilePrefetcher
+
 
 class AhrensHdf5ImagingExtractor(ImagingExtractor):
     """Custom extractor for reading a single frame file from the Ahrens lab volumentric imaging data."""
@@ -72,3 +77,242 @@ class AhrensHdf5ImagingExtractor(ImagingExtractor):
 
     def get_channel_names(self):
         pass
+
+
+class SharedFrameBlockCache:
+    """
+    Holds full-height blocks of frames read once on behalf of several region extractors over the same folder.
+
+    A block is dropped as soon as every participating region has been served from it, and at most `max_blocks`
+    blocks are ever held, so iterators that fall out of step degrade to re-reading rather than growing memory.
+    """
+
+    def __init__(self, regions: List[str], max_blocks: int = 2):
+        assert max_blocks > 0, f"'max_blocks' ({max_blocks}) must be greater than zero!"
+        self.regions = set(regions)
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()  # Maps block key to (frames, regions still waiting on the block)
+
+    def get(self, key: bytes, region: str) -> Optional[np.ndarray]:
+        if key not in self._blocks:
+            return None
+
+        frames, pending_regions = self._blocks[key]
+        pending_regions.discard(region)
+        if not pending_regions:
+            del self._blocks[key]
+        return frames
+
+    def put(self, key: bytes, frames: np.ndarray, region: str):
+        pending_regions = self.regions - {region}
+        if not pending_regions:
+            return
+
+        self._blocks[key] = (frames, pending_regions)
+        while len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+
+    def clear(self):
+        self._blocks.clear()
+
+
+class AhrensHdf5FolderImagingExtractor(ImagingExtractor):
+    """
+    Custom extractor for reading an entire folder of frame files from the Ahrens lab volumetric imaging data.
+
+    Each call to `get_video` reads every frame file in the requested range in a single batch, keeping a bounded
+    pool of open file handles so that consecutive buffers do not pay the cost of re-opening each file. Upcoming frame
+    files can be read ahead on background threads through `prefetch_frames` (see FrameFilePrefetcher).
+
+    The files are opened on first read by each process (see FileHandleCache), so the extractor can be pickled and sent
+    to worker processes; its read-ahead, and any frame reads shared with the extractor of the other region, are not
+    sent along. Closing the extractor, or leaving it as a context manager, closes its files and stops its read-ahead.
+
+    The frame files are discovered through a FrameFileManifest persisted next to the folder, so that repeated
+    conversions of the same session neither re-sort nor re-open every frame file, and truncated frames are
+    reported before any data is written.
+    """
+
+    extractor_name = "AhrensHdf5FolderImaging"
+    mode = "folder"
+
+    def __init__(
+        self,
+        folder_path: PathType,
+        sampling_frequency: float,
+        region: Optional[Literal["top", "bottom"]] = None,
+        shape: Optional[Tuple[int]] = None,  # If specified, don't grab from file
+        dtype: Optional[np.dtype] = None,  # If specified, don't grab from file
+        max_open_files: int = 64,
+        manifest_file_path: Optional[PathType] = None,
+        max_num_frames: Optional[int] = None,  # If specified, only discover the first frame files, e.g., for stubs
+    ):
+        ImagingExtractor.__init__(self)
+        self._kwargs = dict(
+            folder_path=str(Path(folder_path).absolute()),
+            sampling_frequency=sampling_frequency,
+            region=region,
+            shape=shape,
+            dtype=dtype,
+            max_open_files=max_open_files,
+            manifest_file_path=manifest_file_path,
+            max_num_frames=max_num_frames,
+        )
+        self._sampling_frequency = sampling_frequency
+        self.folder_path = folder_path
+        self.region = region
+
+        self._file_handles = FileHandleCache(max_open_files=max_open_files)  # Least recently used are closed first
+        self._frame_cache = None  # Only set when sharing reads with an extractor for the other region
+        self._prefetcher = None  # Only set once frames are first prefetched
+
+        self.manifest = FrameFileManifest(
+            folder_path=folder_path,
+            manifest_file_path=manifest_file_path,
+            shape=shape,
+            dtype=dtype,
+            max_num_files=max_num_frames,
+        )
+        self.manifest.validate()
+        self._file_paths = self.manifest.file_paths
+
+        self._num_stacks, self._num_cols, self._num_rows = self.manifest.shape
+        self._dtype = self.manifest.dtype
+        self._frame_axis_order = [2, 1, 0]
+
+        if self.region is None:
+            self._region_slice = slice(None)
+        elif self.region == "top":
+            self._region_slice = slice(int(self._num_cols / 2), None)
+        elif self.region == "bottom":
+            self._region_slice = slice(None, int(self._num_cols / 2))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.update(_frame_cache=None, _prefetcher=None)
+        return state
+
+    def __del__(self):
+        if hasattr(self, "_file_handles"):
+            self.close()
+
+    def close(self):
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+        self._file_handles.close()
+
+    def __enter__(self) -> "AhrensHdf5FolderImagingExtractor":
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    def share_frame_reads(self, other: "AhrensHdf5FolderImagingExtractor", max_blocks: int = 2):
+        """
+        Read each frame file once for both this extractor and another one over the other region of the same folder.
+
+        Blocks of full-height frames are cached until both extractors have requested them, which happens in lockstep
+        when their data iterators use the same buffer shape along the frame axis.
+        """
+        assert Path(self.folder_path).absolute() == Path(other.folder_path).absolute(), (
+            "Frame reads can only be shared between extractors over the same folder "
+            f"(received '{self.folder_path}' and '{other.folder_path}')."
+        )
+        assert self.region != other.region, "Frame reads can only be shared between extractors of different regions!"
+        assert (self._num_stacks, self._num_cols, self._num_rows, self._dtype) == (
+            other._num_stacks,
+            other._num_cols,
+            other._num_rows,
+            other._dtype,
+        ), "Frame reads can only be shared between extractors with the same frame shape and dtype!"
+
+        frame_cache = SharedFrameBlockCache(regions=[self.region, other.region], max_blocks=max_blocks)
+        self._frame_cache = frame_cache
+        other._frame_cache = frame_cache
+        # Either extractor may read a block first, so both schedule their read-ahead on the same threads
+        prefetcher = self._prefetcher or other._prefetcher or FrameFilePrefetcher(file_paths=self._file_paths)
+        self._prefetcher = prefetcher
+        other._prefetcher = prefetcher
+
+    def prefetch_frames(self, start_frame: int, end_frame: int, num_threads: int = 4):
+        """
+        Read the frame files in [start_frame, end_frame) ahead on background threads, while others are being written.
+
+        The read-ahead only warms the page cache of the operating system; the frames are still read by `get_video`.
+        """
+        if self._prefetcher is None:
+            self._prefetcher = FrameFilePrefetcher(file_paths=self._file_paths, num_threads=num_threads)
+        self._prefetcher.prefetch(start_frame=start_frame, end_frame=end_frame)
+
+    def _get_frame_dataset(self, frame_index: int) -> h5py.Dataset:
+        return self._file_handles.open(file_path=self._file_paths[frame_index])["default"]
+
+    def _read_frames(self, frame_indices: np.ndarray) -> np.ndarray:
+        """Read the frames in their native (stacks, cols, rows) on-disk layout directly into a single buffer."""
+        if self._frame_cache is not None:
+            return self._read_shared_frames(frame_indices=frame_indices)
+
+        if self._prefetcher is not None:
+            self._prefetcher.claim(frame_indices=frame_indices)
+        region_num_cols = self.get_image_size()[1]
+        frames = np.empty(
+            shape=(len(frame_indices), self._num_stacks, region_num_cols, self._num_rows), dtype=self._dtype
+        )
+        for buffer_index, frame_index in enumerate(frame_indices):
+            self._get_frame_dataset(frame_index=frame_index).read_direct(
+                frames, source_sel=np.s_[:, self._region_slice, :], dest_sel=np.s_[buffer_index]
+            )
+        return frames
+
+    def _read_shared_frames(self, frame_indices: np.ndarray) -> np.ndarray:
+        """Serve the frames from the shared cache, reading and caching the full-height frames on a miss."""
+        block_key = np.asarray(frame_indices, dtype="int64").tobytes()
+        frames = self._frame_cache.get(key=block_key, region=self.region)
+        if frames is None:
+            if self._prefetcher is not None:
+                self._prefetcher.claim(frame_indices=frame_indices)
+            frames = np.empty(
+                shape=(len(frame_indices), self._num_stacks, self._num_cols, self._num_rows), dtype=self._dtype
+            )
+            for buffer_index, frame_index in enumerate(frame_indices):
+                self._get_frame_dataset(frame_index=frame_index).read_direct(frames, dest_sel=np.s_[buffer_index])
+            self._frame_cache.put(key=block_key, frames=frames, region=self.region)
+        return frames[:, :, self._region_slice, :]
+
+    def get_video(
+        self, start_frame: Optional[int] = None, end_frame: Optional[int] = None, channel: int = 0
+    ) -> np.ndarray:
+        start_frame = start_frame if start_frame is not None else 0
+        end_frame = min(end_frame if end_frame is not None else self.get_num_frames(), self.get_num_frames())
+        frames = self._read_frames(frame_indices=np.arange(start_frame, end_frame))
+
+        # Frame axis stays first; the remaining axes are flipped to match the single-file extractor
+        return frames.transpose([0] + [axis + 1 for axis in self._frame_axis_order])
+
+    def get_frames(self, frame_idxs, channel: Optional[int] = 0) -> np.ndarray:
+        frame_indices = np.atleast_1d(frame_idxs)
+        assert np.all(frame_indices < self.get_num_frames()), "'frame_idxs' exceed number of frames"
+        frames = self._read_frames(frame_indices=frame_indices)
+        return frames.transpose([0] + [axis + 1 for axis in self._frame_axis_order])
+
+    def get_image_size(self) -> Tuple[int, int, int]:
+        if self.region is None:
+            image_size = (self._num_rows, self._num_cols, self._num_stacks)
+        elif self.region in ["top", "bottom"]:
+            image_size = (self._num_rows, int(self._num_cols / 2), self._num_stacks)
+        return image_size
+
+    def get_num_frames(self):
+        return len(self._file_paths)
+
+    def get_sampling_frequency(self):
+        return self._sampling_frequency
+
+    def get_dtype(self):
+        return self._dtype
+
+    def get_num_channels(self):
+        return 1
+
+    def get_channel_names(self):
+        pass
@@ -1,6 +1,6 @@
 """Modification of the roiextractors.Hdf5ImagingExtractor to read the custom miroscope data from the Ahrens lab."""
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
 import h5py
 import numpy as np
@@ -8,22 +8,53 @@ from numpy.typing import ArrayLike
 from roiextractors.segmentationextractor import SegmentationExtractor
 from neuroconv.utils import FilePathType
 
+from ..tools.yu_mu_cell_2019_file_handles import FileHandleCache
+from ..tools.yu_mu_cell_2019_matlab_half_precision import (
+    MatlabHalfPrecisionDataset,
+    is_matlab_half_precision,
+    resolve_matlab_half_precision_dataset,
+)
+
 
 class YuMu2019SegmentationExtractor(SegmentationExtractor):
-    """Custom extractor for reading segmentation data for the Yu Mu 2019 Cell paper."""
+    """
+    Custom extractor for reading segmentation data for the Yu Mu 2019 Cell paper.
+
+    The file is opened on first read by each process (see FileHandleCache), so the extractor can be pickled and sent
+    to worker processes; the pixel masks and ROI locations cached in memory are not sent along. Closing the extractor,
+    or leaving it as a context manager, closes the file.
+    """
 
     extractor_name = "YuMu2019SegmentationExtractor"
     mode = "file"
 
-    def __init__(self, file_path: FilePathType, sampling_frequency: float):
+    def __init__(
+        self,
+        file_path: FilePathType,
+        sampling_frequency: float,
+        half_precision_dtype: str = "float32",
+        max_num_frames: Optional[int] = None,  # If specified, only the first frames of the traces are exposed
+        max_num_rois: Optional[int] = None,  # If specified, only the first ROIs are exposed
+    ):
         super().__init__()
-        self._kwargs = dict(file_path=str(Path(file_path).absolute()), sampling_frequency=sampling_frequency)
+        self._kwargs = dict(
+            file_path=str(Path(file_path).absolute()),
+            sampling_frequency=sampling_frequency,
+            half_precision_dtype=half_precision_dtype,
+            max_num_frames=max_num_frames,
+            max_num_rois=max_num_rois,
+        )
         self._sampling_frequency = sampling_frequency
+        self._half_precision_dtype = half_precision_dtype
+        # Bounding the ROIs to a contiguous span of columns keeps the reads of masks and traces contiguous on disk
+        self._max_num_frames = max_num_frames
+        self._max_num_rois = max_num_rois
         self.file_path = file_path
-        self._file = h5py.File(name=file_path)
+        self._file_handles = FileHandleCache(max_open_files=1)
+        file = self._get_file()
 
         # Automatic detection of differing formats
-        if "baseline" in self._file:  # Dual-color sessions
+        if "baseline" in file:  # Dual-color sessions
             self._baseline_group_name = "baseline"
             self._timeseries_group_name = "timeseries"
             self._pixel_mask_name_map = dict(x="x", y="y", z="z")
@@ -36,64 +67,216 @@ class YuMu2019SegmentationExtractor(SegmentationExtractor):
 
             self._image_shape = (888, 2048, 29)
 
-        baseline_shape = self._file[self._baseline_group_name].shape
-        assert baseline_shape != (
-            1,
-            6,
-        ), (  # The MATLAB half-precision coding stores the dataset as a (1,6) object
-            "The flourescence series in this file are saved in half precision - file cannot be read in Python! "
-            "Please recast the MATLAB datatype and save a new file."
-        )
+        # Some sessions store the fluorescence series as MATLAB 'half' objects, which are decoded on read
+        self._coded_dataset_names = dict()  # Maps the name of each 'half' trace dataset to that of its coded values
+        for dataset_name in [self._baseline_group_name, self._timeseries_group_name]:
+            if is_matlab_half_precision(dataset=file[dataset_name]):
+                self._coded_dataset_names[dataset_name] = resolve_matlab_half_precision_dataset(
+                    file=file, dataset_name=dataset_name
+                )
+        self._num_source_frames, self._num_source_rois = self._get_trace_dataset(self._baseline_group_name).shape
+
+        self._pixel_masks = None  # Ragged pixel masks of all ROIs, cached on first full read
+        self._roi_locations = None
 
-        self._roi_response_raw = self._file[self._baseline_group_name]
-        self._roi_response_dff = self._file[self._timeseries_group_name]
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.update(_pixel_masks=None, _roi_locations=None)
+        return state
 
     def __del__(self):
-        self._file.close()
+        if hasattr(self, "_file_handles"):
+            self.close()
 
     def close(self):
-        self._file.close()
+        self._file_handles.close()
+
+    def __enter__(self) -> "YuMu2019SegmentationExtractor":
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    def _get_file(self) -> h5py.File:
+        return self._file_handles.open(file_path=self.file_path)
+
+    def _get_trace_dataset(self, dataset_name: str) -> Union[h5py.Dataset, MatlabHalfPrecisionDataset]:
+        if dataset_name in self._coded_dataset_names:
+            return MatlabHalfPrecisionDataset(
+                file=self._get_file(),
+                dataset_name=dataset_name,
+                dtype=self._half_precision_dtype,
+                coded_dataset_name=self._coded_dataset_names[dataset_name],
+            )
+        return self._get_file()[dataset_name]
+
+    def get_traces_dict(self) -> dict:
+        return dict(
+            raw=self._get_trace_dataset(dataset_name=self._baseline_group_name),
+            dff=self._get_trace_dataset(dataset_name=self._timeseries_group_name),
+            neuropil=None,
+            deconvolved=None,
+        )
+
+    def get_trace_dataset_names(self) -> dict:
+        """Names of the datasets in the source file backing each of the traces in `get_traces_dict`."""
+        return dict(raw=self._baseline_group_name, dff=self._timeseries_group_name)
 
     def get_image_size(self):
         return self._image_shape
 
+    def get_num_frames(self) -> int:
+        num_frames = self._num_source_frames
+        return min(num_frames, self._max_num_frames) if self._max_num_frames is not None else num_frames
+
+    def get_num_rois(self) -> int:
+        num_rois = self._num_source_rois
+        return min(num_rois, self._max_num_rois) if self._max_num_rois is not None else num_rois
+
+    def get_traces(
+        self,
+        roi_ids: Optional[ArrayLike] = None,
+        start_frame: Optional[int] = None,
+        end_frame: Optional[int] = None,
+        name: str = "raw",
+    ) -> np.ndarray:
+        """The (num_frames, num_rois) traces, reading only the frames and span of ROIs that are requested."""
+        traces = self.get_traces_dict()
+        if name not in traces:
+            raise ValueError(f"traces for {name} not found, enter one of {list(traces)}")
+        if traces[name] is None:
+            return None
+        num_frames = self.get_num_frames()
+        start_frame = min(start_frame or 0, num_frames)
+        end_frame = min(end_frame if end_frame is not None else num_frames, num_frames)
+        if roi_ids is None:
+            return traces[name][start_frame:end_frame, : self.get_num_rois()]
+
+        roi_ids = np.asarray(roi_ids, dtype="int64")
+        assert np.all(roi_ids < self.get_num_rois()), "'roi_ids' exceed number of ROIs"
+        if len(roi_ids) == 0:
+            return np.empty(shape=(end_frame - start_frame, 0), dtype=traces[name].dtype)
+        roi_span = slice(int(roi_ids.min()), int(roi_ids.max()) + 1)
+        return traces[name][start_frame:end_frame, roi_span][:, roi_ids - roi_span.start]
+
     def get_roi_locations(self, roi_ids: Optional[ArrayLike] = None) -> np.ndarray:
-        roi_ids = roi_ids or range(self.get_num_rois())
-
-        roi_locations = np.empty(shape=(3, len(roi_ids)))
-        pixel_masks = self.get_roi_pixel_masks(roi_ids=roi_ids)
-        for idx, _ in enumerate(roi_ids):
-            roi_locations[:, idx] = np.array(
-                [
-                    np.median(pixel_masks[idx][:, 0]),
-                    np.median(pixel_masks[idx][:, 1]),
-                    np.median(pixel_masks[idx][:, 2]),
-                ]
+        """
+        The median (x, y, z) of the pixels of each ROI, as an array of shape (3, num_rois).
+
+        The locations of all ROIs are computed in one vectorized pass over the cached ragged pixel masks and are
+        themselves cached, so repeated calls do not read or sort anything again.
+        """
+        if self._roi_locations is None:
+            pixel_masks, offsets = self.get_roi_pixel_masks_ragged()
+            self._roi_locations = np.stack(
+                [_get_segment_medians(values=pixel_masks[:, axis], offsets=offsets) for axis in range(3)]
             )
-        return roi_locations
+
+        if roi_ids is None:
+            return self._roi_locations.copy()
+        return self._roi_locations[:, np.asarray(roi_ids, dtype="int64")]
 
     def get_roi_pixel_masks(self, roi_ids: Optional[ArrayLike] = None) -> List[np.ndarray]:
-        pixel_masks = list()
-        roi_ids = roi_ids or range(self.get_num_rois())
-        dtype = self._file[self._pixel_mask_name_map["x"]].dtype
-
-        # Example data had 122,296 ROI's over 3 dimensions of maximum 164 pixels, stored as uint16...
-        # ...approximately 120MB total, so fine to load all into memory.
-        # Actual sparse usage will be much smaller than that, too.
-        for roi in roi_ids:
-            roi_selection = self._file[self._pixel_mask_name_map["x"]][:, roi]
-            nonzero_idxs = np.where(np.logical_and(roi_selection != 0, ~np.isnan(roi_selection)))
-            num_pixels = len(nonzero_idxs[0]) if np.any(nonzero_idxs) else 0
-            pixel_mask = np.empty(shape=(num_pixels, 4), dtype=dtype)
-            pixel_mask[:, 0] = self._file[self._pixel_mask_name_map["x"]][:num_pixels, roi]
-            pixel_mask[:, 1] = self._file[self._pixel_mask_name_map["y"]][:num_pixels, roi]
-            pixel_mask[:, 2] = self._file[self._pixel_mask_name_map["z"]][:num_pixels, roi]
-            pixel_mask[:, 3] = 1
-            pixel_masks.append(pixel_mask)
-        return pixel_masks
+        pixel_masks, offsets = self.get_roi_pixel_masks_ragged(roi_ids=roi_ids)
+        return np.split(pixel_masks, offsets[1:-1])
+
+    def get_roi_pixel_masks_ragged(
+        self, roi_ids: Optional[ArrayLike] = None, block_mb: float = 64.0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Read the pixel masks of many ROIs at once as a single ragged structure.
+
+        The coordinates are stored by MATLAB as (max_num_pixels, num_rois) arrays padded with zeros or NaN, so each
+        row of the HDF5 dataset is contiguous on disk. They are read in blocks of whole rows spanning all requested
+        ROIs, first to count the number of pixels of each ROI and then to scatter the coordinates into place.
+
+        Parameters
+        ----------
+        roi_ids : array-like of int, optional
+            The ROIs to retrieve. Defaults to all ROIs.
+        block_mb : float, default: 64.0
+            The upper bound on the size in megabytes (MB) of each block read from a coordinate dataset.
+
+        Returns
+        -------
+        pixel_masks : numpy.ndarray
+            Array of shape (total_num_pixels, 4) holding the (x, y, z, weight) of every pixel of every ROI.
+        offsets : numpy.ndarray
+            Array of length len(roi_ids) + 1; the pixels of the i-th ROI are pixel_masks[offsets[i] : offsets[i + 1]].
+
+        Notes
+        -----
+        Requesting all ROIs caches the result on the extractor (on the order of a hundred MB for ~120k ROIs); any
+        later request, for all ROIs or a subset, is then served from memory.
+        """
+        if self._pixel_masks is None and roi_ids is None:
+            self._pixel_masks = self._read_roi_pixel_masks_ragged(
+                roi_ids=np.arange(self.get_num_rois()), block_mb=block_mb
+            )
+        if self._pixel_masks is None:
+            return self._read_roi_pixel_masks_ragged(roi_ids=np.asarray(roi_ids, dtype="int64"), block_mb=block_mb)
+
+        pixel_masks, offsets = self._pixel_masks
+        if roi_ids is None:
+            return pixel_masks, offsets
+
+        # Gather the requested segments out of the cached masks of all ROIs
+        roi_ids = np.asarray(roi_ids, dtype="int64")
+        num_pixels = offsets[roi_ids + 1] - offsets[roi_ids]
+        selected_offsets = np.concatenate(([0], np.cumsum(num_pixels)))
+        pixel_indices = np.repeat(offsets[roi_ids] - selected_offsets[:-1], num_pixels) + np.arange(
+            selected_offsets[-1]
+        )
+        return pixel_masks[pixel_indices], selected_offsets
+
+    def _read_roi_pixel_masks_ragged(self, roi_ids: np.ndarray, block_mb: float) -> Tuple[np.ndarray, np.ndarray]:
+        x_dataset = self._get_file()[self._pixel_mask_name_map["x"]]
+        dtype = x_dataset.dtype
+        if len(roi_ids) == 0:
+            return np.empty(shape=(0, 4), dtype=dtype), np.zeros(shape=1, dtype="int64")
+
+        # Read the contiguous span of columns covering the requested ROIs, then select within each block
+        roi_span = slice(int(roi_ids.min()), int(roi_ids.max()) + 1)
+        selected_columns = roi_ids - roi_span.start
+        max_num_pixels = x_dataset.shape[0]
+        rows_per_block = max(1, int(block_mb * 1e6 // ((roi_span.stop - roi_span.start) * dtype.itemsize)))
+
+        num_pixels = np.zeros(shape=len(roi_ids), dtype="int64")
+        for start_row in range(0, max_num_pixels, rows_per_block):
+            block = x_dataset[start_row : start_row + rows_per_block, roi_span][:, selected_columns]
+            num_pixels += np.count_nonzero(np.logical_and(block != 0, ~np.isnan(block)), axis=0)
+        offsets = np.concatenate(([0], np.cumsum(num_pixels)))
+
+        # As with the original per-ROI reads, the first num_pixels rows of each column are taken as that ROI's pixels
+        pixel_masks = np.empty(shape=(offsets[-1], 4), dtype=dtype)
+        pixel_masks[:, 3] = 1
+        used_rows = int(num_pixels.max())
+        for axis, axis_name in enumerate(["x", "y", "z"]):
+            dataset = self._get_file()[self._pixel_mask_name_map[axis_name]]
+            for start_row in range(0, used_rows, rows_per_block):
+                block = dataset[start_row : min(start_row + rows_per_block, used_rows), roi_span][:, selected_columns]
+                rows = np.arange(start_row, start_row + block.shape[0])[:, np.newaxis]
+                in_mask = rows < num_pixels
+                pixel_masks[(offsets[:-1] + rows)[in_mask], axis] = block[in_mask]
+
+        return pixel_masks, offsets
 
     def get_accepted_list(self) -> list:
         return self.get_roi_ids()
 
     def get_rejected_list(self) -> list:
         return list()
+
+
+def _get_segment_medians(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Median of each contiguous segment values[offsets[i] : offsets[i + 1]]; NaN for empty segments."""
+    num_values = np.diff(offsets)
+    segment_ids = np.repeat(np.arange(len(num_values)), num_values)
+    sorted_values = values[np.lexsort((values, segment_ids))].astype("float64")
+
+    medians = np.full(shape=len(num_values), fill_value=np.nan)
+    non_empty = num_values > 0
+    lower_middle = (offsets[:-1] + (num_values - 1) // 2)[non_empty]
+    upper_middle = (offsets[:-1] + num_values // 2)[non_empty]
+    medians[non_empty] = (sorted_values[lower_middle] + sorted_values[upper_middle]) / 2
+    return medians
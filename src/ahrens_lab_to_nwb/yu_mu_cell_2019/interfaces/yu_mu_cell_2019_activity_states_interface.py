@@ -2,14 +2,15 @@
 from typing import Optional
 from pathlib import Path
 
-import pandas as pd
-from scipy.io import loadmat
+import numpy as np
 from pynwb import NWBFile
-from pynwb.epoch import TimeIntervals
 from neuroconv.basedatainterface import BaseDataInterface
 from neuroconv.tools.nwb_helpers import get_module
 from neuroconv.utils import FolderPathType
 
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options
+from ..tools.yu_mu_cell_2019_time_intervals import create_time_intervals_from_columns
+
 
 class YuMu2019ActivityStatesInterface(BaseDataInterface):
     """Custom interface for handling processed behavior data for Yu Mu 2019 Cell paper."""
@@ -18,12 +19,18 @@ class YuMu2019ActivityStatesInterface(BaseDataInterface):
         self.source_data = dict(folder_path=folder_path, sampling_frequency=sampling_frequency, verbose=verbose)
         self.verbose = verbose
 
-    def run_conversion(self, nwbfile: NWBFile, metadata: Optional[dict] = None):
+    def run_conversion(
+        self, nwbfile: NWBFile, metadata: Optional[dict] = None, compression_options: Optional[dict] = None
+    ):
+        from scipy.io import loadmat
+
+        compression_options = compression_options or get_default_compression_options(series_type="behavior")
+
         behavior_module = get_module(
             nwbfile=nwbfile, name="behavior", description="Contains processed behavioral data."
         )
 
-        table_dict = dict(start_time=list(), stop_time=list(), state_type=list())
+        start_times, stop_times, state_types = [np.empty(0)], [np.empty(0)], [np.empty(0, dtype=str)]
         for channel_name in ["ch1", "ch2"]:
             for state_name in ["active", "passive", "transient"]:
                 group_name = f"{state_name}State"
@@ -31,21 +38,19 @@ class YuMu2019ActivityStatesInterface(BaseDataInterface):
 
                 if file_path.exists():
                     source_file = loadmat(file_name=str(file_path))
-                    table_dict["start_time"].extend(
-                        source_file[group_name]["start"][0][0][0] / self.source_data["sampling_frequency"]
-                    )
-                    table_dict["stop_time"].extend(
-                        source_file[group_name]["end"][0][0][0] / self.source_data["sampling_frequency"]
-                    )
-                    table_dict["state_type"].extend([state_name] * len(source_file[group_name]["start"][0][0][0]))
-
-        table_dataframe = pd.DataFrame(data=table_dict)
-        table_dataframe = table_dataframe.sort_values(by=["start_time"])
-
-        time_intervals = TimeIntervals(
-            name="ActivityStates", description="Classified periods of activity (passive, active, or transient)."
+                    state_starts = source_file[group_name]["start"][0][0][0]
+                    start_times.append(state_starts / self.source_data["sampling_frequency"])
+                    stop_times.append(source_file[group_name]["end"][0][0][0] / self.source_data["sampling_frequency"])
+                    state_types.append(np.repeat(state_name, len(state_starts)))
+
+        # The states of both channels are merged in order of their start
+        time_intervals = create_time_intervals_from_columns(
+            name="ActivityStates",
+            description="Classified periods of activity (passive, active, or transient).",
+            start_time=np.concatenate(start_times),
+            stop_time=np.concatenate(stop_times),
+            columns=dict(state_type=("The type of classified state.", np.concatenate(state_types))),
+            sort=True,
+            compression_options=compression_options,
         )
-        time_intervals.add_column(name="state_type", description="The type of classified state.")
-        for start_time, stop_time, state_type in table_dataframe.itertuples(index=False):
-            time_intervals.add_interval(start_time=start_time, stop_time=stop_time, state_type=state_type)
         behavior_module.add(time_intervals)
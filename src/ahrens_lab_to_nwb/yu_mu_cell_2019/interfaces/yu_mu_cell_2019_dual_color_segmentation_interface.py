@@ -5,24 +5,34 @@ from pathlib import Path
 import numpy as np
 from pynwb import NWBFile
 from pynwb.ophys import ImageSegmentation, Fluorescence, DfOverF, RoiResponseSeries
-from hdmf.backends.hdf5.h5_utils import H5DataIO
 from neuroconv.datainterfaces.ophys.basesegmentationextractorinterface import BaseSegmentationExtractorInterface
-from neuroconv.tools.hdmf import SliceableDataChunkIterator
 from neuroconv.utils import FilePathType, load_dict_from_file
 
-from ..extractors.yu_mu_cell_2019_segmentation_extractor import YuMu2019SegmentationExtractor
+from ..tools.yu_mu_cell_2019_plane_segmentation import (
+    OPHYS_MODULE_DESCRIPTION,
+    create_plane_segmentation_from_ragged_voxel_masks,
+)
+from ..tools.yu_mu_cell_2019_trace_iterator import MatlabTraceDataChunkIterator
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options, wrap_data
 
 
 class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface):
-    """Data Interface for single-color sessions of YuMu2019SegmentationExtractor."""
+    """
+    Data Interface for dual-color sessions of YuMu2019SegmentationExtractor.
 
-    Extractor = YuMu2019SegmentationExtractor
+    The extractors are only constructed once they are first used, so that constructing the interface opens no file.
+    """
+
+    ExtractorModuleName = "ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_segmentation_extractor"
+    ExtractorName = "YuMu2019SegmentationExtractor"
 
     def __init__(
         self,
         neuron_file_path: FilePathType,
         glia_file_path: FilePathType,
         sampling_frequency: float,
+        stub_frames: Optional[int] = None,  # If specified, only the first frames of the traces are read
+        stub_rois: Optional[int] = None,  # If specified, only the first ROIs of each segmentation are read
         verbose: bool = True,
     ):
         self.source_data = dict(
@@ -32,13 +42,26 @@ class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface)
             verbose=verbose,
         )
         self.verbose = verbose
-        self.neuron_segmentation_extractor = YuMu2019SegmentationExtractor(
-            file_path=neuron_file_path, sampling_frequency=sampling_frequency
-        )
-        self.glia_segmentation_extractor = YuMu2019SegmentationExtractor(
-            file_path=glia_file_path, sampling_frequency=sampling_frequency
+        self._segmentation_extractors = dict()
+        self._extractor_kwargs = dict(
+            sampling_frequency=sampling_frequency, max_num_frames=stub_frames, max_num_rois=stub_rois
         )
 
+    def _get_segmentation_extractor(self, population: str):
+        if population not in self._segmentation_extractors:
+            self._segmentation_extractors[population] = self.Extractor(
+                file_path=self.source_data[f"{population}_file_path"], **self._extractor_kwargs
+            )
+        return self._segmentation_extractors[population]
+
+    @property
+    def neuron_segmentation_extractor(self):
+        return self._get_segmentation_extractor(population="neuron")
+
+    @property
+    def glia_segmentation_extractor(self):
+        return self._get_segmentation_extractor(population="glia")
+
     def get_metadata(self):
         metadata_folder = (
             Path(__file__).parent.parent / "metadata"
@@ -58,7 +81,7 @@ class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface)
     ):
         # Assume all Imaging-related data has been added already
         iterator_options = iterator_options or dict()
-        compression_options = compression_options or dict(compression="gzip")
+        compression_options = compression_options or get_default_compression_options(series_type="fluorescence")
 
         # Neuron segmentation
         if stub_test:
@@ -70,29 +93,39 @@ class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface)
             segmentation_extractor = self.neuron_segmentation_extractor
 
         image_segmentation = ImageSegmentation(name=metadata["Ophys"]["ImageSegmentation"]["name"])
+        neuron_series_metadata, glia_series_metadata = metadata["Ophys"]["TwoPhotonSeries"][:2]
 
-        neuron_plane_segmentation = image_segmentation.create_plane_segmentation(
+        pixel_masks, offsets = self.neuron_segmentation_extractor.get_roi_pixel_masks_ragged()
+        neuron_plane_segmentation = create_plane_segmentation_from_ragged_voxel_masks(
+            image_segmentation=image_segmentation,
             name=metadata["Ophys"]["ImageSegmentation"]["plane_segmentations"][0]["name"],
             description=metadata["Ophys"]["ImageSegmentation"]["plane_segmentations"][0]["description"],
-            imaging_plane=nwbfile.imaging_planes["NeuronVolume"],
-            reference_images=nwbfile.acquisition["NeuronTwoPhotonSeries"],
+            imaging_plane=nwbfile.imaging_planes[neuron_series_metadata["imaging_plane"]],
+            reference_images=nwbfile.acquisition[neuron_series_metadata["name"]],
+            roi_ids=self.neuron_segmentation_extractor.get_roi_ids(),
+            pixel_masks=pixel_masks,
+            offsets=offsets,
+            compression_options=compression_options,
         )
 
-        for roi in segmentation_extractor.get_roi_ids():
-            voxel_mask = np.array(segmentation_extractor.get_roi_pixel_masks(roi_ids=[roi])).squeeze()
-            neuron_plane_segmentation.add_roi(id=roi, voxel_mask=voxel_mask)
-
         # Make baseline series
         roi_table_region = neuron_plane_segmentation.create_roi_table_region(
             region=segmentation_extractor.get_roi_ids(), description="Region reference to ROI table."
         )
+        trace_dataset_names = self.neuron_segmentation_extractor.get_trace_dataset_names()
         timestamps = segmentation_extractor.frame_to_time(frames=np.arange(segmentation_extractor.get_num_frames()))
         neuron_baseline_response_series = RoiResponseSeries(
             name=metadata["Ophys"]["Fluorescence"]["roi_response_series"][0]["name"],
             description=metadata["Ophys"]["DfOverF"]["roi_response_series"][0]["description"],
-            data=H5DataIO(
-                SliceableDataChunkIterator(segmentation_extractor.get_traces(name="raw"), **iterator_options),
-                **compression_options,
+            data=wrap_data(
+                MatlabTraceDataChunkIterator(
+                    file_path=self.source_data["neuron_file_path"],
+                    dataset_name=trace_dataset_names["raw"],
+                    end_frame=segmentation_extractor.get_num_frames(),
+                    end_roi=segmentation_extractor.get_num_rois(),
+                    **iterator_options,
+                ),
+                compression_options=compression_options,
             ),
             rois=roi_table_region,
             unit="a.u.",
@@ -103,9 +136,15 @@ class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface)
         neuron_detrended_response_series = RoiResponseSeries(
             name=metadata["Ophys"]["DfOverF"]["roi_response_series"][0]["name"],
             description=metadata["Ophys"]["DfOverF"]["roi_response_series"][0]["description"],
-            data=H5DataIO(
-                SliceableDataChunkIterator(segmentation_extractor.get_traces(name="dff"), **iterator_options),
-                **compression_options,
+            data=wrap_data(
+                MatlabTraceDataChunkIterator(
+                    file_path=self.source_data["neuron_file_path"],
+                    dataset_name=trace_dataset_names["dff"],
+                    end_frame=segmentation_extractor.get_num_frames(),
+                    end_roi=segmentation_extractor.get_num_rois(),
+                    **iterator_options,
+                ),
+                compression_options=compression_options,
             ),
             rois=roi_table_region,
             unit="a.u.",
@@ -120,28 +159,37 @@ class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface)
         else:
             segmentation_extractor = self.glia_segmentation_extractor
 
-        glia_plane_segmentation = image_segmentation.create_plane_segmentation(
+        pixel_masks, offsets = self.glia_segmentation_extractor.get_roi_pixel_masks_ragged()
+        glia_plane_segmentation = create_plane_segmentation_from_ragged_voxel_masks(
+            image_segmentation=image_segmentation,
             name=metadata["Ophys"]["ImageSegmentation"]["plane_segmentations"][1]["name"],
             description=metadata["Ophys"]["ImageSegmentation"]["plane_segmentations"][1]["description"],
-            imaging_plane=nwbfile.imaging_planes["GliaVolume"],
-            reference_images=nwbfile.acquisition["GliaTwoPhotonSeries"],
+            imaging_plane=nwbfile.imaging_planes[glia_series_metadata["imaging_plane"]],
+            reference_images=nwbfile.acquisition[glia_series_metadata["name"]],
+            roi_ids=self.glia_segmentation_extractor.get_roi_ids(),
+            pixel_masks=pixel_masks,
+            offsets=offsets,
+            compression_options=compression_options,
         )
 
-        for roi in segmentation_extractor.get_roi_ids():
-            voxel_mask = np.array(segmentation_extractor.get_roi_pixel_masks(roi_ids=[roi])).squeeze()
-            glia_plane_segmentation.add_roi(id=roi, voxel_mask=voxel_mask)
-
         # Make baseline series
         roi_table_region = glia_plane_segmentation.create_roi_table_region(
             region=segmentation_extractor.get_roi_ids(), description="Region reference to ROI table."
         )
+        trace_dataset_names = self.glia_segmentation_extractor.get_trace_dataset_names()
         timestamps = segmentation_extractor.frame_to_time(frames=np.arange(segmentation_extractor.get_num_frames()))
         glia_baseline_response_series = RoiResponseSeries(
             name=metadata["Ophys"]["Fluorescence"]["roi_response_series"][1]["name"],
             description=metadata["Ophys"]["DfOverF"]["roi_response_series"][1]["description"],
-            data=H5DataIO(
-                SliceableDataChunkIterator(segmentation_extractor.get_traces(name="raw"), **iterator_options),
-                **compression_options,
+            data=wrap_data(
+                MatlabTraceDataChunkIterator(
+                    file_path=self.source_data["glia_file_path"],
+                    dataset_name=trace_dataset_names["raw"],
+                    end_frame=segmentation_extractor.get_num_frames(),
+                    end_roi=segmentation_extractor.get_num_rois(),
+                    **iterator_options,
+                ),
+                compression_options=compression_options,
             ),
             rois=roi_table_region,
             unit="a.u.",
@@ -152,9 +200,15 @@ class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface)
         glia_detrended_response_series = RoiResponseSeries(
             name=metadata["Ophys"]["DfOverF"]["roi_response_series"][1]["name"],
             description=metadata["Ophys"]["DfOverF"]["roi_response_series"][1]["description"],
-            data=H5DataIO(
-                SliceableDataChunkIterator(segmentation_extractor.get_traces(name="dff"), **iterator_options),
-                **compression_options,
+            data=wrap_data(
+                MatlabTraceDataChunkIterator(
+                    file_path=self.source_data["glia_file_path"],
+                    dataset_name=trace_dataset_names["dff"],
+                    end_frame=segmentation_extractor.get_num_frames(),
+                    end_roi=segmentation_extractor.get_num_rois(),
+                    **iterator_options,
+                ),
+                compression_options=compression_options,
             ),
             rois=roi_table_region,
             unit="a.u.",
@@ -162,7 +216,7 @@ class YuMu2019DualColorSegmentationInterface(BaseSegmentationExtractorInterface)
         )
 
         # Add everything to the ophys module
-        ophys_module = nwbfile.create_processing_module(name="ophys", description="optical physiology processed data")
+        ophys_module = nwbfile.create_processing_module(name="ophys", description=OPHYS_MODULE_DESCRIPTION)
         ophys_module.add(image_segmentation)
         ophys_module.add(
             Fluorescence(
@@ -1,21 +1,27 @@
 """Modification of the roiextractors.Hdf5ImagingExtractor to read the custom miroscope data from the Ahrens lab."""
-from pathlib import Path
+from copy import deepcopy
 from typing import Optional
 
 import numpy as np
-from natsort import natsorted
-from roiextractors import MultiImagingExtractor
+from pynwb import NWBFile
+from pynwb.ophys import TwoPhotonSeries
 from neuroconv.datainterfaces.ophys.baseimagingextractorinterface import BaseImagingExtractorInterface
-from neuroconv.utils import FolderPathType
+from neuroconv.utils import FilePathType, FolderPathType, calculate_regular_series_rate, dict_deep_update
 
-
-from ..extractors.yu_mu_cell_2019_imaging_extractor import AhrensHdf5ImagingExtractor
+from ..tools.yu_mu_cell_2019_chunk_shape import describe_chunk_shape
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options, wrap_data
 
 
 class AhrensHdf5ImagingInterface(BaseImagingExtractorInterface):
-    """Data Interface for AhrensHdf5ImagingExtractor."""
+    """
+    Data Interface for AhrensHdf5FolderImagingExtractor.
+
+    The extractor module (along with roiextractors) is only imported once an interface is constructed, and the
+    extractor is only constructed once it is first used, so that constructing the interface lists no frame files.
+    """
 
-    Extractor = AhrensHdf5ImagingExtractor
+    ExtractorModuleName = "ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_imaging_extractor"
+    ExtractorName = "AhrensHdf5FolderImagingExtractor"
 
     def __init__(
         self,
@@ -24,17 +30,103 @@ class AhrensHdf5ImagingInterface(BaseImagingExtractorInterface):
         region: Optional[str] = None,  # Literal["top", "bottom"]], but source_schema can't handle it yet
         shape: Optional[list] = None,  # If specified, don't grab from file
         dtype: Optional[str] = None,  # If specified, don't grab from file
+        max_open_files: int = 64,  # Bounds the number of frame files kept open between reads
+        manifest_file_path: Optional[FilePathType] = None,  # Defaults to '<folder_path>_frame_manifest.json'
+        stub_frames: Optional[int] = None,  # If specified, only the first frame files are discovered
         verbose: bool = True,
     ):
         self.source_data = dict(folder_path=folder_path, sampling_frequency=sampling_frequency, verbose=verbose)
         self.verbose = verbose
-        dtype = np.dtype(dtype) if dtype is not None else dtype
 
-        frame_files = natsorted([file for file in Path(folder_path).iterdir() if ".h5" in file.suffixes])
-        imaging_extractors = [
-            AhrensHdf5ImagingExtractor(
-                file_path=file_path, sampling_frequency=sampling_frequency, region=region, shape=shape, dtype=dtype
+        self._imaging_extractor = None
+        self._extractor_kwargs = dict(
+            folder_path=folder_path,
+            sampling_frequency=sampling_frequency,
+            region=region,
+            shape=shape,
+            dtype=dtype,
+            max_open_files=max_open_files,
+            manifest_file_path=manifest_file_path,
+            max_num_frames=stub_frames,
+        )
+
+    @property
+    def imaging_extractor(self):
+        if self._imaging_extractor is None:
+            self._imaging_extractor = self.Extractor(**self._extractor_kwargs)
+        return self._imaging_extractor
+
+    def run_conversion(
+        self,
+        nwbfile: Optional[NWBFile] = None,
+        metadata: Optional[dict] = None,
+        stub_test: bool = False,
+        stub_frames: int = 100,
+        imaging_plane_index: int = 0,
+        two_photon_series_index: int = 0,
+        iterator_options: Optional[dict] = None,
+        compression_options: Optional[dict] = None,
+        read_profile: str = "frame",  # How the series will be read; one of "frame", "timeseries", or "balanced"
+        summary_images: bool = False,  # Accumulate the mean, max and variance images while the frames are written
+        binned_series_options: Optional[dict] = None,  # E.g., dict(frames_per_bin=100, pixels_per_bin=4)
+    ):
+        from neuroconv.tools.roiextractors.roiextractors import add_imaging_plane, get_nwb_imaging_metadata
+
+        from ..tools.yu_mu_cell_2019_imaging_iterator import AhrensImagingDataChunkIterator
+        from ..tools.yu_mu_cell_2019_summary_images import SummaryImageAccumulator
+
+        if stub_test:
+            stub_frames = min([stub_frames, self.imaging_extractor.get_num_frames()])
+            imaging_extractor = self.imaging_extractor.frame_slice(start_frame=0, end_frame=stub_frames)
+        else:
+            imaging_extractor = self.imaging_extractor
+
+        iterator_options = iterator_options or dict()
+        compression_options = compression_options or get_default_compression_options(series_type="imaging")
+
+        metadata = dict_deep_update(get_nwb_imaging_metadata(imaging_extractor), deepcopy(metadata), append_list=False)
+        add_imaging_plane(nwbfile=nwbfile, metadata=metadata, imaging_plane_index=imaging_plane_index)
+
+        # The chunk shape is chosen for the read profile unless specified in the iterator options
+        iterator = AhrensImagingDataChunkIterator(
+            imaging_extractor, **dict(iterator_options, read_profile=read_profile)
+        )
+        two_photon_series_metadata = metadata["Ophys"]["TwoPhotonSeries"][two_photon_series_index]
+        if summary_images or binned_series_options:
+            # Added to the file once every frame is written (see `write_summary_images`)
+            iterator.summary_accumulator = SummaryImageAccumulator(
+                series_name=two_photon_series_metadata["name"],
+                num_frames=iterator.maxshape[0],
+                frame_shape=iterator.maxshape[1:],
+                dtype=iterator.dtype,
+                summary_images=summary_images,
+                compression_options=compression_options,
+                **(binned_series_options or dict()),
             )
-            for file_path in frame_files
+        comments = [
+            two_photon_series_metadata.get("comments"),
+            describe_chunk_shape(
+                chunk_shape=iterator.chunk_shape,
+                read_profile=None if iterator_options.get("chunk_shape") else read_profile,
+            ),
         ]
-        self.imaging_extractor = MultiImagingExtractor(imaging_extractors=imaging_extractors)
+        two_photon_series_kwargs = dict(
+            two_photon_series_metadata,
+            imaging_plane=nwbfile.get_imaging_plane(name=two_photon_series_metadata["imaging_plane"]),
+            # The iterator records its progress when the conversion is resumable
+            data=wrap_data(iterator, compression_options=compression_options),
+            dimension=imaging_extractor.get_image_size(),
+            comments=" ".join(comment for comment in comments if comment),
+        )
+        if imaging_extractor.has_time_vector():
+            timestamps = imaging_extractor.frame_to_time(np.arange(imaging_extractor.get_num_frames()))
+            estimated_rate = calculate_regular_series_rate(series=timestamps)
+            if estimated_rate:
+                two_photon_series_kwargs.update(starting_time=timestamps[0], rate=estimated_rate)
+            else:
+                two_photon_series_kwargs.update(
+                    timestamps=wrap_data(timestamps, compression_options=compression_options), rate=None
+                )
+        else:
+            two_photon_series_kwargs.update(starting_time=0.0, rate=float(imaging_extractor.get_sampling_frequency()))
+        nwbfile.add_acquisition(TwoPhotonSeries(**two_photon_series_kwargs))
@@ -1,13 +1,14 @@
 """Custom interface for handling processed behavior data for Yu Mu 2019 Cell paper."""
 from typing import Optional
 
-import h5py
-import numpy as np
-from pynwb import NWBFile, TimeSeries, H5DataIO
+from pynwb import NWBFile, TimeSeries
 from neuroconv.basedatainterface import BaseDataInterface
 from neuroconv.tools.nwb_helpers import get_module
 from neuroconv.utils import FolderPathType
 
+from ..tools.yu_mu_cell_2019_behavior_iterator import MatlabBehaviorDataChunkIterator
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options, wrap_data
+
 
 class YuMu2019ProcessedBehaviorInterface(BaseDataInterface):
     """Custom interface for handling processed behavior data for Yu Mu 2019 Cell paper."""
@@ -16,21 +17,36 @@ class YuMu2019ProcessedBehaviorInterface(BaseDataInterface):
         self.source_data = dict(file_path=file_path, sampling_frequency=sampling_frequency, verbose=verbose)
         self.verbose = verbose
 
-    def run_conversion(self, nwbfile: NWBFile, metadata: Optional[dict] = None):
+    def get_series_dataset_paths(self) -> dict:
+        """The paths of the channels, stacked as columns, of each series in the file."""
+        return dict(FilteredSwimSignals=["data/fltCh1", "data/fltCh2"])
+
+    def run_conversion(
+        self,
+        nwbfile: NWBFile,
+        metadata: Optional[dict] = None,
+        iterator_options: Optional[dict] = None,
+        compression_options: Optional[dict] = None,
+    ):
+        iterator_options = iterator_options or dict()
+        compression_options = compression_options or get_default_compression_options(series_type="behavior")
+
         behavior_module = get_module(
             nwbfile=nwbfile, name="behavior", description="Contains processed behavioral data."
         )
-
-        with h5py.File(name=self.source_data["file_path"]) as source_file:
-            combined_data = np.empty(shape=(source_file["data"]["fltCh1"].shape[1], 2))
-            for idx, matlab_key in enumerate(["fltCh1", "fltCh2"]):
-                combined_data[:, idx] = source_file["data"][matlab_key]
-            behavior_module.add(
-                TimeSeries(
-                    name="FilteredSwimSignals",
-                    description="A filtered version of the raw SwimSignals in acquisition.",
-                    data=H5DataIO(combined_data, compression="gzip"),
-                    rate=self.source_data["sampling_frequency"],
-                    unit="a.u",
-                )
+        behavior_module.add(
+            TimeSeries(
+                name="FilteredSwimSignals",
+                description="A filtered version of the raw SwimSignals in acquisition.",
+                data=wrap_data(
+                    MatlabBehaviorDataChunkIterator(
+                        file_path=self.source_data["file_path"],
+                        dataset_paths=self.get_series_dataset_paths()["FilteredSwimSignals"],
+                        **iterator_options,
+                    ),
+                    compression_options=compression_options,
+                ),
+                rate=self.source_data["sampling_frequency"],
+                unit="a.u",
             )
+        )
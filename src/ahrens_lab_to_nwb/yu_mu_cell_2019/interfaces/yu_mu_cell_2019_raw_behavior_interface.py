@@ -1,12 +1,13 @@
 """Custom interface for handling raw behavior data for Yu Mu 2019 Cell paper."""
 from typing import Optional
 
-import h5py
-import numpy as np
-from pynwb import NWBFile, TimeSeries, H5DataIO
+from pynwb import NWBFile, TimeSeries
 from neuroconv.basedatainterface import BaseDataInterface
 from neuroconv.utils import FilePathType, load_dict_from_file
 
+from ..tools.yu_mu_cell_2019_behavior_iterator import MatlabBehaviorDataChunkIterator
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options, wrap_data
+
 
 class YuMu2019RawBehaviorInterface(BaseDataInterface):
     """Custom interface for handling raw behavior data for Yu Mu 2019 Cell paper."""
@@ -26,29 +27,47 @@ class YuMu2019RawBehaviorInterface(BaseDataInterface):
         )
         self.verbose = verbose
 
-    def run_conversion(self, nwbfile: NWBFile, metadata: Optional[dict] = None):
+    def get_series_dataset_paths(self) -> dict:
+        """The path of the channel (or list of paths of the channels stacked as columns) of each series in the file."""
+        series_dataset_paths = dict()
+        for series in load_dict_from_file(file_path=self.source_data["metadata_file_path"]):
+            if isinstance(series["matlab_key"], list):
+                series_dataset_paths[series["series_name"]] = [f"rawdata/{key}" for key in series["matlab_key"]]
+            else:
+                series_dataset_paths[series["series_name"]] = f"rawdata/{series['matlab_key']}"
+        return series_dataset_paths
+
+    def run_conversion(
+        self,
+        nwbfile: NWBFile,
+        metadata: Optional[dict] = None,
+        iterator_options: Optional[dict] = None,
+        compression_options: Optional[dict] = None,
+    ):
+        iterator_options = iterator_options or dict()
+        compression_options = compression_options or get_default_compression_options(series_type="behavior")
+
         signals_names_and_descriptions = load_dict_from_file(file_path=self.source_data["metadata_file_path"])
+        series_dataset_paths = self.get_series_dataset_paths()
         timing_info = dict(
             starting_time=0.0,  # All time references in NWBFile relative to behavior
             rate=self.source_data["sampling_frequency"],
             unit="a.u.",  # These could technically have some scale of 'voltage' unit but exact is unknown
         )
 
-        with h5py.File(name=self.source_data["data_file_path"]) as source_file:
-            all_series_lengths = source_file["rawdata"]["ch1"].shape[1]
-
-            for series in signals_names_and_descriptions:
-                if isinstance(series["matlab_key"], list):
-                    series_data = np.empty(shape=(all_series_lengths, len(series["matlab_key"])))
-                    for idx, key in enumerate(series["matlab_key"]):
-                        series_data[:, idx] = source_file["rawdata"][key][0, :]
-                else:
-                    series_data = source_file["rawdata"][series["matlab_key"]][0, :]
-                nwbfile.add_acquisition(
-                    TimeSeries(
-                        name=series["series_name"],
-                        description=series["series_description"],
-                        data=H5DataIO(series_data, compression="gzip"),
-                        **timing_info,
-                    )
+        for series in signals_names_and_descriptions:
+            nwbfile.add_acquisition(
+                TimeSeries(
+                    name=series["series_name"],
+                    description=series["series_description"],
+                    data=wrap_data(
+                        MatlabBehaviorDataChunkIterator(
+                            file_path=self.source_data["data_file_path"],
+                            dataset_paths=series_dataset_paths[series["series_name"]],
+                            **iterator_options,
+                        ),
+                        compression_options=compression_options,
+                    ),
+                    **timing_info,
                 )
+            )
@@ -4,26 +4,51 @@ from typing import Optional
 import numpy as np
 from pynwb import NWBFile
 from pynwb.ophys import ImageSegmentation, Fluorescence, DfOverF, RoiResponseSeries
-from hdmf.backends.hdf5.h5_utils import H5DataIO
 from neuroconv.datainterfaces.ophys.basesegmentationextractorinterface import BaseSegmentationExtractorInterface
-from neuroconv.tools.hdmf import SliceableDataChunkIterator
 from neuroconv.utils import FilePathType
 
-from ..extractors.yu_mu_cell_2019_segmentation_extractor import YuMu2019SegmentationExtractor
+from ..tools.yu_mu_cell_2019_plane_segmentation import (
+    OPHYS_MODULE_DESCRIPTION,
+    create_plane_segmentation_from_ragged_voxel_masks,
+)
+from ..tools.yu_mu_cell_2019_trace_iterator import MatlabTraceDataChunkIterator
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options, wrap_data
 
 
 class YuMu2019SingleColorSegmentationInterface(BaseSegmentationExtractorInterface):
-    """Data Interface for single-color sessions of YuMu2019SegmentationExtractor."""
+    """
+    Data Interface for single-color sessions of YuMu2019SegmentationExtractor.
 
-    Extractor = YuMu2019SegmentationExtractor
+    The extractor is only constructed once it is first used, so that constructing the interface opens no file.
+    """
 
-    def __init__(self, file_path: FilePathType, sampling_frequency: float, verbose: bool = True):
+    ExtractorModuleName = "ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_segmentation_extractor"
+    ExtractorName = "YuMu2019SegmentationExtractor"
+
+    def __init__(
+        self,
+        file_path: FilePathType,
+        sampling_frequency: float,
+        stub_frames: Optional[int] = None,  # If specified, only the first frames of the traces are read
+        stub_rois: Optional[int] = None,  # If specified, only the first ROIs are read
+        verbose: bool = True,
+    ):
         self.source_data = dict(file_path=file_path, sampling_frequency=sampling_frequency, verbose=verbose)
         self.verbose = verbose
-        self.segmentation_extractor = YuMu2019SegmentationExtractor(
-            file_path=file_path, sampling_frequency=sampling_frequency
+        self._segmentation_extractor = None
+        self._extractor_kwargs = dict(
+            file_path=file_path,
+            sampling_frequency=sampling_frequency,
+            max_num_frames=stub_frames,
+            max_num_rois=stub_rois,
         )
 
+    @property
+    def segmentation_extractor(self):
+        if self._segmentation_extractor is None:
+            self._segmentation_extractor = self.Extractor(**self._extractor_kwargs)
+        return self._segmentation_extractor
+
     def run_conversion(
         self,
         nwbfile: Optional[NWBFile] = None,
@@ -41,41 +66,49 @@ class YuMu2019SingleColorSegmentationInterface(BaseSegmentationExtractorInterfac
 
         # Assume all Imaging-related data has been added already
         iterator_options = iterator_options or dict()
-        compression_options = compression_options or dict(compression="gzip")
+        compression_options = compression_options or get_default_compression_options(series_type="fluorescence")
 
         ophys_module = nwbfile.create_processing_module(
-            name="ophys", description="Processed data for the optical physiology."  # Best Practice name
+            name="ophys", description=OPHYS_MODULE_DESCRIPTION  # Best Practice name
         )
 
         image_segmentation = ImageSegmentation(name=metadata["Ophys"]["ImageSegmentation"]["name"])
+        two_photon_series_metadata = metadata["Ophys"]["TwoPhotonSeries"][0]
 
-        plane_segmentation = image_segmentation.create_plane_segmentation(
+        # The masks do not depend on the frames, so read them from the full extractor even when stubbing
+        pixel_masks, offsets = self.segmentation_extractor.get_roi_pixel_masks_ragged()
+        plane_segmentation = create_plane_segmentation_from_ragged_voxel_masks(
+            image_segmentation=image_segmentation,
             name=metadata["Ophys"]["ImageSegmentation"]["plane_segmentations"][0]["name"],
             description=metadata["Ophys"]["ImageSegmentation"]["plane_segmentations"][0]["description"],
-            imaging_plane=nwbfile.imaging_planes["NeuronVolume"],
-            reference_images=nwbfile.acquisition["RawTwoPhotonSeries"],
+            imaging_plane=nwbfile.imaging_planes[two_photon_series_metadata["imaging_plane"]],
+            reference_images=nwbfile.acquisition[two_photon_series_metadata["name"]],
+            roi_ids=self.segmentation_extractor.get_roi_ids(),
+            pixel_masks=pixel_masks,
+            offsets=offsets,
+            compression_options=compression_options,
         )
 
-        for roi in segmentation_extractor.get_roi_ids():
-            voxel_mask = np.array(segmentation_extractor.get_roi_pixel_masks(roi_ids=[roi])).squeeze()
-            plane_segmentation.add_roi(id=roi, voxel_mask=voxel_mask)
-
         ophys_module.add(image_segmentation)
 
         # Add baseline series
         roi_table_region = plane_segmentation.create_roi_table_region(
             description="Region reference to ROI table.",  # With region=None, it should select entire ROI table
         )
+        trace_dataset_names = self.segmentation_extractor.get_trace_dataset_names()
         timestamps = segmentation_extractor.frame_to_time(frames=np.arange(segmentation_extractor.get_num_frames()))
         baseline_response_series = RoiResponseSeries(
             name=metadata["Ophys"]["Fluorescence"]["roi_response_series"][0]["name"],
             description=metadata["Ophys"]["DfOverF"]["roi_response_series"][0]["description"],
-            data=H5DataIO(
-                SliceableDataChunkIterator(
-                    segmentation_extractor.get_traces_dict()["raw"],  # DO NOT USE get_traces() as that loads array
+            data=wrap_data(
+                MatlabTraceDataChunkIterator(
+                    file_path=self.source_data["file_path"],
+                    dataset_name=trace_dataset_names["raw"],
+                    end_frame=segmentation_extractor.get_num_frames(),
+                    end_roi=segmentation_extractor.get_num_rois(),
                     **iterator_options,
                 ),
-                **compression_options,
+                compression_options=compression_options,
             ),
             rois=roi_table_region,
             unit="a.u.",
@@ -89,12 +122,15 @@ class YuMu2019SingleColorSegmentationInterface(BaseSegmentationExtractorInterfac
         detrended_response_series = RoiResponseSeries(
             name=metadata["Ophys"]["DfOverF"]["roi_response_series"][0]["name"],
             description=metadata["Ophys"]["DfOverF"]["roi_response_series"][0]["description"],
-            data=H5DataIO(
-                SliceableDataChunkIterator(
-                    segmentation_extractor.get_traces_dict()["dff"],  # DO NOT USE get_traces() as that loads array
+            data=wrap_data(
+                MatlabTraceDataChunkIterator(
+                    file_path=self.source_data["file_path"],
+                    dataset_name=trace_dataset_names["dff"],
+                    end_frame=segmentation_extractor.get_num_frames(),
+                    end_roi=segmentation_extractor.get_num_rois(),
                     **iterator_options,
                 ),
-                **compression_options,
+                compression_options=compression_options,
             ),
             rois=roi_table_region,
             unit="a.u.",
@@ -2,12 +2,13 @@
 from typing import Optional
 
 import h5py
-from pynwb import NWBFile, H5DataIO
-from pynwb.epoch import TimeIntervals
+from pynwb import NWBFile
 from neuroconv.basedatainterface import BaseDataInterface
 from neuroconv.tools.nwb_helpers import get_module
 from neuroconv.utils import FilePathType
-from ndx_events import AnnotatedEventsTable
+
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options
+from ..tools.yu_mu_cell_2019_time_intervals import create_time_intervals_from_columns
 
 
 class YuMu2019SwimIntervalsInterface(BaseDataInterface):
@@ -17,7 +18,13 @@ class YuMu2019SwimIntervalsInterface(BaseDataInterface):
         self.source_data = dict(file_path=file_path, sampling_frequency=sampling_frequency, verbose=verbose)
         self.verbose = verbose
 
-    def run_conversion(self, nwbfile: NWBFile, metadata: Optional[dict] = None):
+    def run_conversion(
+        self, nwbfile: NWBFile, metadata: Optional[dict] = None, compression_options: Optional[dict] = None
+    ):
+        from ndx_events import AnnotatedEventsTable  # Loads the extension namespace, so only when writing
+
+        compression_options = compression_options or get_default_compression_options(series_type="behavior")
+
         behavior_module = get_module(
             nwbfile=nwbfile, name="behavior", description="Contains processed behavioral data."
         )
@@ -27,24 +34,18 @@ class YuMu2019SwimIntervalsInterface(BaseDataInterface):
             swim_starts = source_file["data"]["swimStartIndT"][0, :] / self.source_data["sampling_frequency"]
             swim_stops = source_file["data"]["swimEndIndT"][0, :] / self.source_data["sampling_frequency"]
 
-            time_intervals = TimeIntervals(
-                name="SwimIntervals", description="Intervals of time when subject is estimated to be swimming."
+            # TODO: units for power and width
+            time_intervals = create_time_intervals_from_columns(
+                name="SwimIntervals",
+                description="Intervals of time when subject is estimated to be swimming.",
+                start_time=swim_starts,
+                stop_time=swim_stops,
+                columns=dict(
+                    power=("Estimated power of the swim event.", source_file["data"]["swimPower__"][0, :]),
+                    width=("Estimated width spanned by the swim event.", source_file["data"]["swimWidth"][0, :]),
+                ),
+                compression_options=compression_options,
             )
-            for start_time, stop_time in zip(swim_starts, swim_stops):
-                time_intervals.add_interval(start_time=start_time, stop_time=stop_time)
-
-            # TODO: units for these two
-            time_intervals.add_column(
-                name="power",
-                description="Estimated power of the swim event.",
-                data=H5DataIO(source_file["data"]["swimPower__"][0, :], compression="gzip"),
-            )
-            time_intervals.add_column(
-                name="width",
-                description="Estimated width spanned by the swim event.",
-                data=H5DataIO(source_file["data"]["swimWidth"][0, :], compression="gzip"),
-            )
-
             behavior_module.add(time_intervals)
 
             # Burst events
@@ -1,12 +1,18 @@
 """Custom interface for processed trials data for Yu Mu 2019 Cell paper."""
 from typing import Optional
-from collections import defaultdict
 
+import numpy as np
 from pynwb import NWBFile
-from scipy.io import loadmat
 from neuroconv.basedatainterface import BaseDataInterface
 from neuroconv.utils import FilePathType
 
+from ..tools.yu_mu_cell_2019_compression import get_default_compression_options
+from ..tools.yu_mu_cell_2019_time_intervals import create_time_intervals_from_columns
+
+# Records type as simple integer; no reference to meaning
+# TODO: need to confirm this assignment
+TRIAL_TYPES = {1: "closed-loop", 3: "open-loop"}
+
 
 class YuMu2019TrialsInterface(BaseDataInterface):
     """Custom interface for processed trials data for Yu Mu 2019 Cell paper."""
@@ -15,21 +21,28 @@ class YuMu2019TrialsInterface(BaseDataInterface):
         self.source_data = dict(file_path=file_path, sampling_frequency=sampling_frequency, verbose=verbose)
         self.verbose = verbose
 
-    def run_conversion(self, nwbfile: NWBFile, metadata: Optional[dict] = None):
+    def run_conversion(
+        self, nwbfile: NWBFile, metadata: Optional[dict] = None, compression_options: Optional[dict] = None
+    ):
+        from scipy.io import loadmat
+
+        compression_options = compression_options or get_default_compression_options(series_type="behavior")
+
         trials_struct = loadmat(file_name=self.source_data["file_path"])["trial_info"]
 
         # Records time as the frame index for the behavior sync channel
         starts = trials_struct[:, 0] / self.source_data["sampling_frequency"]
         stops = trials_struct[:, 1] / self.source_data["sampling_frequency"]
 
-        # Records type as simple integer; no reference to meaning
-        # TODO: need to confirm this assignment
-        trial_type_id_to_str = defaultdict(lambda: "other")
-        trial_type_id_to_str[1] = "closed-loop"
-        trial_type_id_to_str[3] = "open-loop"
-
-        nwbfile.add_trial_column(name="trial_type", description="Closed-loop, open-loop, or other.")
-        for start_time, stop_time, trial_type_id in zip(starts, stops, trials_struct[:, -1]):
-            nwbfile.add_trial(
-                start_time=start_time, stop_time=stop_time, trial_type=trial_type_id_to_str[trial_type_id]
-            )
+        trial_types = np.full(shape=len(trials_struct), fill_value="other", dtype=object)
+        for trial_type_id, trial_type in TRIAL_TYPES.items():
+            trial_types[trials_struct[:, -1] == trial_type_id] = trial_type
+
+        nwbfile.trials = create_time_intervals_from_columns(
+            name="trials",
+            description="experimental trials",
+            start_time=starts,
+            stop_time=stops,
+            columns=dict(trial_type=("Closed-loop, open-loop, or other.", trial_types)),
+            compression_options=compression_options,
+        )
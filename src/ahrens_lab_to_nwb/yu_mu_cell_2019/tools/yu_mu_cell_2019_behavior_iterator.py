@@ -0,0 +1,138 @@
+"""DataChunkIterator for the behavior channels stored in the MATLAB (v7.3) ephys files."""
+from typing import List, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+from hdmf.data_utils import GenericDataChunkIterator
+from neuroconv.utils import FilePathType
+
+from .yu_mu_cell_2019_file_handles import FileHandleCache
+from .yu_mu_cell_2019_memory_budget import BudgetedDataChunkIteratorMixin
+from .yu_mu_cell_2019_performance_report import MeasuredDataChunkIteratorMixin
+from .yu_mu_cell_2019_write_checkpoint import CheckpointedDataChunkIteratorMixin
+
+
+class MatlabBehaviorDataChunkIterator(
+    CheckpointedDataChunkIteratorMixin,
+    MeasuredDataChunkIteratorMixin,
+    BudgetedDataChunkIteratorMixin,
+    GenericDataChunkIterator,
+):
+    """
+    Iterate over one or more (1, num_samples) behavior channels of a MATLAB file, stacked as columns.
+
+    A single dataset path yields a (num_samples,) series; a list of paths yields a (num_samples, num_channels) series
+    whose columns are filled one buffer at a time, so the channels are never loaded in full. The source dtype is kept.
+    """
+
+    def __init__(
+        self,
+        file_path: FilePathType,
+        dataset_paths: Union[str, List[str]],
+        chunk_cache_mb: float = 64.0,
+        buffer_gb: Optional[float] = None,
+        buffer_shape: Optional[tuple] = None,
+        chunk_mb: Optional[float] = None,
+        chunk_shape: Optional[tuple] = None,
+        display_progress: bool = False,
+        progress_bar_options: Optional[dict] = None,
+    ):
+        """
+        Initialize an Iterable object which returns DataChunks with data and their selections on each iteration.
+
+        Parameters
+        ----------
+        file_path : FilePathType
+            Path to the MATLAB (v7.3) file, e.g., 'rawdata.mat' or 'data_full.mat'.
+        dataset_paths : str or list of str
+            The path of each channel within the file, e.g., 'rawdata/ch1' or ['data/fltCh1', 'data/fltCh2'].
+        chunk_cache_mb : float, default: 64.0
+            The size of the HDF5 chunk cache used when reading the source datasets.
+        buffer_gb : float, optional
+            The upper bound on size in gigabytes (GB) of each selection from the iteration.
+            Cannot be set if `buffer_shape` is also specified. The default is 0.1GB.
+        buffer_shape : tuple, optional
+            Manual specification of buffer shape to return on each iteration.
+            Must be a multiple of chunk_shape along each axis.
+            Cannot be set if `buffer_gb` is also specified.
+        chunk_mb : float, optional
+            The upper bound on size in megabytes (MB) of the internal chunk for the HDF5 dataset.
+            Cannot be set if `chunk_shape` is also specified. The default is 1MB.
+        chunk_shape : tuple, optional
+            Manual specification of the internal chunk shape for the HDF5 dataset.
+            Cannot be set if `chunk_mb` is also specified.
+        display_progress : bool, optional
+            Display a progress bar with iteration rate and estimated completion time.
+        progress_bar_options : dict, optional
+            Dictionary of keyword arguments to be passed directly to tqdm.
+        """
+        assert not (buffer_gb and buffer_shape), "Only one of 'buffer_gb' or 'buffer_shape' can be specified!"
+        assert not (chunk_mb and chunk_shape), "Only one of 'chunk_mb' or 'chunk_shape' can be specified!"
+
+        self.file_path = file_path
+        self.stacked = not isinstance(dataset_paths, str)
+        self.dataset_paths = list(dataset_paths) if self.stacked else [dataset_paths]
+        self.chunk_cache_mb = chunk_cache_mb
+
+        with h5py.File(name=file_path, mode="r") as file:
+            source_shapes = [file[dataset_path].shape for dataset_path in self.dataset_paths]
+            self._source_dtype = np.result_type(*[file[dataset_path].dtype for dataset_path in self.dataset_paths])
+        assert all(
+            len(source_shape) == 2 and source_shape[0] == 1 for source_shape in source_shapes
+        ), f"Expected every channel to be of shape (1, num_samples); found {source_shapes}!"
+        num_samples = {source_shape[1] for source_shape in source_shapes}
+        assert len(num_samples) == 1, f"The channels {self.dataset_paths} differ in length ({num_samples})!"
+        self._num_samples = num_samples.pop()
+
+        self._maxshape = self._get_maxshape()
+        self._dtype = self._get_dtype()
+        if chunk_mb is None and chunk_shape is None:
+            chunk_mb = 1.0
+        if chunk_shape is None:
+            chunk_shape = self._get_sample_chunk_shape(gigabytes=chunk_mb * 1e-3)
+        if buffer_gb is None and buffer_shape is None:
+            buffer_gb = 0.1
+        if buffer_shape is None:
+            buffer_shape = self._get_sample_chunk_shape(gigabytes=buffer_gb, multiple_of=chunk_shape[0])
+
+        self._file_handles = FileHandleCache(max_open_files=1)  # Opened on the first read of each process
+        super().__init__(
+            buffer_shape=buffer_shape,
+            chunk_shape=chunk_shape,
+            display_progress=display_progress,
+            progress_bar_options=progress_bar_options,
+        )
+
+    def _get_budgeted_buffer_shape(self, buffer_gb: float) -> Tuple[int, ...]:
+        return self._get_sample_chunk_shape(gigabytes=buffer_gb, multiple_of=self.chunk_shape[0])
+
+    def _get_sample_chunk_shape(self, gigabytes: float, multiple_of: int = 1) -> Tuple[int, ...]:
+        """Span all channels and as many samples as fit within the size; time series are read along time."""
+        bytes_per_sample = self._dtype.itemsize * len(self.dataset_paths)
+        num_samples = max(int(gigabytes * 1e9 / bytes_per_sample) // multiple_of, 1) * multiple_of
+        return (min(num_samples, self._num_samples),) + self._maxshape[1:]
+
+    def _get_file(self) -> h5py.File:
+        return self._file_handles.open(file_path=self.file_path, rdcc_nbytes=int(self.chunk_cache_mb * 1e6))
+
+    def _get_data(self, selection: Tuple[slice]) -> np.ndarray:
+        file = self._get_file()
+        if not self.stacked:
+            return file[self.dataset_paths[0]][0, selection[0]].astype(self._dtype, copy=False)
+
+        data = np.empty(shape=(selection[0].stop - selection[0].start, len(self.dataset_paths)), dtype=self._dtype)
+        for channel_index, dataset_path in enumerate(self.dataset_paths):
+            data[:, channel_index] = file[dataset_path][0, selection[0]]
+        return data[:, selection[1]]
+
+    def _get_dtype(self) -> np.dtype:
+        return self._source_dtype
+
+    def _get_maxshape(self) -> Tuple[int, ...]:
+        if not self.stacked:
+            return (self._num_samples,)
+        return (self._num_samples, len(self.dataset_paths))
+
+    def __del__(self):
+        if hasattr(self, "_file_handles"):
+            self._file_handles.close()
@@ -0,0 +1,110 @@
+"""Selection of the chunk shape of the TwoPhotonSeries from the geometry of the volumes and how they will be read."""
+import math
+from typing import Optional, Tuple
+from warnings import warn
+
+import numpy as np
+
+READ_PROFILES = ["frame", "timeseries", "balanced"]
+# Fits one full plane of both the single-color (888 x 2048) and dual-color (1024 x 2048 per region) int16 volumes
+DEFAULT_IMAGING_CHUNK_MB = 5.0
+# The smallest (width, height) of the tiles of 'timeseries' chunks; smaller tiles make for very many chunks per frame
+MIN_TIMESERIES_TILE_SHAPE = (32, 32)
+
+
+def _fit_tile(width: int, height: int, max_num_elements: int) -> Tuple[int, int]:
+    """The squarest tile of at most `max_num_elements` within the (width, height) of a plane."""
+    side = max(1, int(math.sqrt(max_num_elements)))
+    tile_width = min(width, side)
+    tile_height = min(height, max(1, int(max_num_elements) // tile_width))
+    return tile_width, tile_height
+
+
+def _fit_plane(width: int, height: int, max_num_elements: int) -> Tuple[int, int]:
+    """The whole (width, height) of a plane, split only along its width if it holds more than `max_num_elements`."""
+    tile_height = min(height, max_num_elements)
+    tile_width = min(width, max(1, int(max_num_elements) // tile_height))
+    return tile_width, tile_height
+
+
+def get_max_frames_per_buffer(maxshape: Tuple[int, ...], dtype: np.dtype, buffer_gb: float) -> int:
+    """The number of whole frames held by a buffer of `buffer_gb`; at least one."""
+    frame_bytes = int(np.prod(maxshape[1:])) * np.dtype(dtype).itemsize
+    return max(1, int(buffer_gb * 1e9 // frame_bytes))
+
+
+def get_imaging_chunk_shape(
+    maxshape: Tuple[int, ...],
+    dtype: np.dtype,
+    read_profile: str = "frame",
+    chunk_mb: float = DEFAULT_IMAGING_CHUNK_MB,
+    buffer_frames: Optional[int] = None,
+) -> Tuple[int, ...]:
+    """
+    Choose the chunk shape of a (frames, width, height[, depth]) TwoPhotonSeries for the way it will be read.
+
+    Parameters
+    ----------
+    maxshape : tuple of int
+        The shape of the series.
+    dtype : numpy.dtype
+    read_profile : str, default: "frame"
+        - 'frame': chunks of a single frame spanning whole planes, for reading frames or planes. Planes larger than
+          `chunk_mb` are split along their width only.
+        - 'timeseries': chunks of as many frames as possible over small tiles (`MIN_TIMESERIES_TILE_SHAPE`) of a
+          single plane, for reading the time series of voxels or small regions. The tiles only grow when the chunks
+          span the whole series.
+        - 'balanced': chunks of about as many frames as voxels along each side of a tile of a single plane.
+    chunk_mb : float, default: 5.0
+        The upper bound on the size in megabytes (MB) of each chunk.
+    buffer_frames : int, optional
+        The number of frames in each buffer of the iterator writing the series (see `get_max_frames_per_buffer`). The
+        imaging extractors read whole frames, so each buffer spans whole frames; chunks spanning more frames than a
+        buffer holds would enlarge the buffers beyond their bound. If specified, chunks are limited to this length.
+
+    Returns
+    -------
+    chunk_shape : tuple of int
+    """
+    assert read_profile in READ_PROFILES, f"Unknown read profile '{read_profile}'; choose from {READ_PROFILES}!"
+    assert chunk_mb > 0, f"'chunk_mb' ({chunk_mb}) must be greater than zero!"
+    num_frames, width, height = maxshape[:3]
+    depth = maxshape[3] if len(maxshape) == 4 else 1
+    max_num_elements = max(1, int(chunk_mb * 1e6 // np.dtype(dtype).itemsize))
+    max_num_frames = max(1, min(num_frames, buffer_frames or num_frames))
+
+    if read_profile == "frame":
+        chunk_frames = 1
+    elif read_profile == "timeseries":
+        tile_width, tile_height = min(width, MIN_TIMESERIES_TILE_SHAPE[0]), min(height, MIN_TIMESERIES_TILE_SHAPE[1])
+        chunk_frames = max(1, max_num_elements // (tile_width * tile_height))
+    else:
+        chunk_frames = max(1, round(max_num_elements ** (1 / 3)))
+    if chunk_frames > max_num_frames and max_num_frames < num_frames:
+        warn(
+            f"Chunks for '{read_profile}' reads would span {min(chunk_frames, num_frames)} frames, but the buffers "
+            f"only hold {max_num_frames}; limiting the chunks to {max_num_frames} frames. "
+            "Increase 'buffer_gb' for longer chunks."
+        )
+    chunk_frames = min(chunk_frames, max_num_frames)
+
+    # The remaining elements are spread over a tile of a plane, then for 'frame' reads over as many planes as fit
+    if read_profile == "frame":
+        tile_width, tile_height = _fit_plane(width=width, height=height, max_num_elements=max_num_elements)
+    elif read_profile == "timeseries" and chunk_frames < num_frames:
+        tile_width, tile_height = min(width, MIN_TIMESERIES_TILE_SHAPE[0]), min(height, MIN_TIMESERIES_TILE_SHAPE[1])
+    else:
+        tile_width, tile_height = _fit_tile(
+            width=width, height=height, max_num_elements=max_num_elements // chunk_frames
+        )
+    chunk_shape = (chunk_frames, tile_width, tile_height)
+    if len(maxshape) == 4:
+        chunk_depth = 1 if read_profile != "frame" else max(1, max_num_elements // (tile_width * tile_height))
+        chunk_shape += (min(depth, chunk_depth),)
+    return chunk_shape
+
+
+def describe_chunk_shape(chunk_shape: Tuple[int, ...], read_profile: Optional[str] = None) -> str:
+    """A sentence recording the chunking of a series, e.g., in its 'comments'."""
+    description = f"Stored in chunks of shape {tuple(int(length) for length in chunk_shape)}"
+    return f"{description}, chosen for '{read_profile}' reads." if read_profile else f"{description}."
@@ -0,0 +1,167 @@
+"""Selection of the compression filter of each type of series, for either the HDF5 or the Zarr backend."""
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import h5py
+import numpy as np
+from hdmf.backends.hdf5.h5_utils import H5DataIO
+from hdmf.data_utils import DataIO
+
+COMPRESSION_METHODS = ["gzip", "lzf", "blosc-lz4", "blosc-zstd", "blosc-blosclz", "zstd", "lz4"]
+# Filters other than 'gzip' and 'lzf' are dynamically loaded plugins; reading the file then requires 'hdf5plugin'
+PLUGIN_COMPRESSION_METHODS = ["blosc-lz4", "blosc-zstd", "blosc-blosclz", "zstd", "lz4"]
+
+# Defaults only use the filters built into every HDF5 library, so the files remain readable anywhere
+DEFAULT_COMPRESSION = dict(
+    # The int16 volumes are the bulk of every session; shuffling separates the mostly constant high bytes,
+    # which recovers most of the ratio of higher gzip levels at a fraction of the time
+    imaging=dict(method="gzip", level=1, shuffle=True),
+    # The float traces and masks are small next to the imaging and compress poorly at low levels
+    fluorescence=dict(method="gzip", level=4, shuffle=True),
+    # Hours of 6 kHz channels
+    behavior=dict(method="gzip", level=1, shuffle=True),
+)
+# Blosc ships with every Zarr installation and compresses with multiple threads
+DEFAULT_ZARR_COMPRESSION = dict(
+    imaging=dict(method="blosc-zstd", level=3, shuffle=True),
+    fluorescence=dict(method="blosc-zstd", level=5, shuffle=True),
+    behavior=dict(method="blosc-lz4", level=5, shuffle=True),
+)
+
+
+def get_compression_options(
+    method: str = "gzip", level: Optional[int] = None, shuffle: bool = True, backend: str = "hdf5"
+) -> dict:
+    """
+    Keyword arguments of H5DataIO, or of ZarrDataIO, that compress a dataset with the given filter.
+
+    Parameters
+    ----------
+    method : str, default: "gzip"
+        One of COMPRESSION_METHODS. For HDF5, the 'blosc-*', 'zstd' and 'lz4' filters require the 'hdf5plugin'
+        package, both to write the file and to read it back. Zarr supports all of them except 'lzf'.
+    level : int, optional
+        The compression level; the default of the filter if not specified. Not supported by 'lzf' and 'lz4'.
+    shuffle : bool, default: True
+        Whether to shuffle the bytes of each chunk before compressing. Blosc shuffles internally.
+        For Zarr, only Blosc shuffles.
+    backend : str, default: "hdf5"
+        Either 'hdf5' or 'zarr'.
+    """
+    assert method in COMPRESSION_METHODS, f"Unknown compression method '{method}'; choose from {COMPRESSION_METHODS}!"
+    assert level is None or method not in ["lzf", "lz4"], f"The '{method}' filter does not support a level!"
+    assert backend in ["hdf5", "zarr"], f"Unknown backend '{backend}'; choose from ['hdf5', 'zarr']!"
+
+    if backend == "zarr":
+        return dict(compressor=_get_zarr_compressor(method=method, level=level, shuffle=shuffle))
+
+    if method == "gzip":
+        return dict(compression="gzip", compression_opts=4 if level is None else level, shuffle=shuffle)
+    if method == "lzf":
+        return dict(compression="lzf", shuffle=shuffle)
+
+    try:
+        import hdf5plugin
+    except ImportError:
+        raise ImportError(f"The '{method}' compression method requires the 'hdf5plugin' package to be installed!")
+    if method.startswith("blosc-"):
+        compression_filter = hdf5plugin.Blosc(
+            cname=method.split("-")[1],
+            clevel=5 if level is None else level,
+            shuffle=hdf5plugin.Blosc.SHUFFLE if shuffle else hdf5plugin.Blosc.NOSHUFFLE,
+        )
+        return dict(**compression_filter, allow_plugin_filters=True)
+    if method == "zstd":
+        compression_filter = hdf5plugin.Zstd() if level is None else hdf5plugin.Zstd(clevel=level)
+    else:
+        compression_filter = hdf5plugin.LZ4()
+    return dict(**compression_filter, shuffle=shuffle, allow_plugin_filters=True)
+
+
+def _get_zarr_compressor(method: str, level: Optional[int], shuffle: bool):
+    import numcodecs
+
+    assert method != "lzf", "The 'lzf' filter is not available for Zarr!"
+    if method == "gzip":
+        return numcodecs.GZip(level=4 if level is None else level)
+    if method.startswith("blosc-"):
+        return numcodecs.Blosc(
+            cname=method.split("-")[1],
+            clevel=5 if level is None else level,
+            shuffle=numcodecs.Blosc.SHUFFLE if shuffle else numcodecs.Blosc.NOSHUFFLE,
+        )
+    if method == "zstd":
+        return numcodecs.Zstd() if level is None else numcodecs.Zstd(level=level)
+    return numcodecs.LZ4()
+
+
+def get_default_compression_options(series_type: str, backend: str = "hdf5") -> dict:
+    """Keyword arguments of the DataIO for the default compression of 'imaging', 'fluorescence' or 'behavior' series."""
+    default_compression = DEFAULT_ZARR_COMPRESSION if backend == "zarr" else DEFAULT_COMPRESSION
+    assert series_type in default_compression, f"Unknown series type '{series_type}'!"
+    return get_compression_options(**default_compression[series_type], backend=backend)
+
+
+def wrap_data(data, compression_options: dict) -> DataIO:
+    """Wrap the data in the DataIO of the backend the compression options were made for."""
+    if "compressor" in compression_options:
+        from hdmf_zarr import ZarrDataIO
+
+        return ZarrDataIO(data=data, **compression_options)
+    return H5DataIO(data, **compression_options)
+
+
+def benchmark_compression(
+    data: np.ndarray, chunk_shape: tuple, compression_options: Dict[str, dict], num_repeats: int = 3
+) -> List[dict]:
+    """
+    Measure the ratio and throughput of compressing a sample of data with each set of options.
+
+    The sample is written to and read back from an HDF5 file held in memory, so the timings reflect the filters
+    rather than the disk, and without a chunk cache so that the reads decompress every chunk. The fastest of the
+    repeats is kept.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        A sample of the series, e.g., the first buffer of its DataChunkIterator.
+    chunk_shape : tuple
+        The shape of the chunks the series is written with.
+    compression_options : dict
+        Maps a label to keyword arguments of H5DataIO, e.g., as returned by `get_compression_options`.
+    num_repeats : int, default: 3
+
+    Returns
+    -------
+    results : list of dict
+        The 'label', 'ratio', 'write_mb_per_second' and 'read_mb_per_second' of each set of options.
+    """
+    megabytes = data.nbytes / 1e6
+    results = list()
+    for label, options in compression_options.items():
+        dataset_options = {key: value for key, value in options.items() if key != "allow_plugin_filters"}
+        write_seconds, read_seconds = list(), list()
+        for _ in range(num_repeats):
+            with h5py.File(name=str(uuid.uuid4()), mode="w", driver="core", backing_store=False, rdcc_nbytes=0) as file:
+                dataset = file.create_dataset(
+                    name="data", shape=data.shape, dtype=data.dtype, chunks=chunk_shape, **dataset_options
+                )
+                start_time = time.perf_counter()
+                dataset[...] = data
+                file.flush()
+                write_seconds.append(time.perf_counter() - start_time)
+                storage_size = dataset.id.get_storage_size()
+
+                start_time = time.perf_counter()
+                dataset[...]
+                read_seconds.append(time.perf_counter() - start_time)
+        results.append(
+            dict(
+                label=label,
+                ratio=data.nbytes / storage_size,
+                write_mb_per_second=megabytes / min(write_seconds),
+                read_mb_per_second=megabytes / min(read_seconds),
+            )
+        )
+    return results
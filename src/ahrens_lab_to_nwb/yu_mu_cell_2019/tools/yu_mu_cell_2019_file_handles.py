@@ -0,0 +1,77 @@
+"""Lazily opened HDF5 files that are reopened by each process rather than pickled or inherited."""
+import os
+import threading
+from collections import OrderedDict
+
+import h5py
+from neuroconv.utils import FilePathType
+
+# Handles inherited by a forked process; kept referenced so that they are neither used nor torn down by the child
+_inherited_files = list()
+
+
+class FileHandleCache:
+    """
+    A small pool of HDF5 files opened for reading on first use, the least recently used closed first when it is full.
+
+    Only the size of the pool is part of its state: it is pickled empty, so the objects holding one (e.g., extractors)
+    can be sent to worker processes, which open the files themselves on their first read. A process forked from the one
+    that opened the files does not use the handles it inherits either, but opens its own. Within a process, the files
+    are shared by its threads, since h5py serializes every call behind a single lock anyway.
+
+    Closing the pool, or leaving it as a context manager, closes its files; they are opened again if read afterwards.
+    """
+
+    def __init__(self, max_open_files: int = 1):
+        assert max_open_files > 0, f"'max_open_files' ({max_open_files}) must be greater than zero!"
+        self.max_open_files = max_open_files
+        self._reset()
+
+    def _reset(self):
+        self._files = OrderedDict()  # Maps the path and options of each file to the open h5py.File
+        self._process_id = os.getpid()
+        self._lock = threading.Lock()
+
+    def _check_process(self):
+        if self._process_id != os.getpid():  # Forked; the lock may have been held by a thread of the parent
+            _inherited_files.extend(self._files.values())
+            self._reset()
+
+    def open(self, file_path: FilePathType, **file_kwargs) -> h5py.File:
+        """The file opened for reading with the keyword arguments of h5py.File (e.g., 'rdcc_nbytes')."""
+        self._check_process()
+        key = (str(file_path), tuple(sorted(file_kwargs.items())))
+        with self._lock:
+            file = self._files.get(key)
+            if file is not None:
+                self._files.move_to_end(key)
+                return file
+
+            while len(self._files) >= self.max_open_files:
+                _, least_recent_file = self._files.popitem(last=False)
+                least_recent_file.close()
+            file = h5py.File(name=file_path, mode="r", **file_kwargs)
+            self._files[key] = file
+            return file
+
+    def close(self):
+        self._check_process()
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files.clear()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __enter__(self) -> "FileHandleCache":
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    def __getstate__(self) -> dict:
+        return dict(max_open_files=self.max_open_files)
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
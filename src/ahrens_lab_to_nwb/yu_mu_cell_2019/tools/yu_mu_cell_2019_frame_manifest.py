@@ -0,0 +1,196 @@
+"""Persistent manifest of the frame files that make up a session of the Ahrens lab volumetric imaging data."""
+import json
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from warnings import warn
+
+import h5py
+import numpy as np
+from natsort import natsorted
+from neuroconv.utils import FilePathType, FolderPathType
+
+MANIFEST_VERSION = 2
+
+
+def get_default_manifest_file_path(folder_path: FolderPathType) -> Path:
+    """The manifest lives next to the frame folder (in the session folder) rather than among the frame files."""
+    folder_path = Path(folder_path).absolute()
+    return folder_path.parent / f"{folder_path.name}_frame_manifest.json"
+
+
+class FrameFileManifest:
+    """
+    Ordered list of the frame files in a folder along with their shapes, dtypes, sizes and modification times.
+
+    The manifest is reused across runs and only the entries of files whose size or modification time changed are
+    refreshed. Files are only opened when their shape is needed: the first frame file serves as the reference, and
+    any file whose size differs from the most common size is opened to confirm it is readable and of the same shape.
+    If `shape` or `dtype` are specified, the frame files are expected to match them rather than the reference file.
+
+    With `max_num_files`, only the first files (in natural order) are inspected, as for stub conversions; their
+    partial manifest is not saved, but any manifest saved by an earlier full run is still reused.
+    """
+
+    def __init__(
+        self,
+        folder_path: FolderPathType,
+        manifest_file_path: Optional[FilePathType] = None,
+        shape: Optional[Tuple[int]] = None,  # If specified, the expected shape of every frame file
+        dtype: Optional[np.dtype] = None,  # If specified, the expected dtype of every frame file
+        max_num_files: Optional[int] = None,  # If specified, only list the first files
+    ):
+        assert max_num_files is None or max_num_files > 0, f"'max_num_files' ({max_num_files}) must be positive!"
+        self.folder_path = Path(folder_path).absolute()
+        self.manifest_file_path = (
+            Path(manifest_file_path) if manifest_file_path is not None else get_default_manifest_file_path(folder_path)
+        )
+        self._shape = tuple(shape) if shape is not None else None
+        self._dtype = np.dtype(dtype).str if dtype is not None else None
+        self.max_num_files = max_num_files
+
+        self.entries = self._update_entries(previous_entries=self._load_previous_entries())
+
+    def _load_previous_entries(self) -> dict:
+        if not self.manifest_file_path.exists():
+            return dict()
+
+        try:
+            with open(file=self.manifest_file_path, mode="r") as file:
+                manifest = json.load(fp=file)
+        except (OSError, ValueError):
+            warn(f"Unable to read the frame manifest at '{self.manifest_file_path}'; it will be rebuilt.")
+            return dict()
+
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("folder_path") != str(self.folder_path):
+            return dict()
+        return {entry["name"]: entry for entry in manifest["entries"]}
+
+    def _update_entries(self, previous_entries: dict) -> List[dict]:
+        directory_entries = dict()
+        with os.scandir(self.folder_path) as directory:
+            for directory_entry in directory:
+                if ".h5" in Path(directory_entry.name).suffixes:
+                    directory_entries[directory_entry.name] = directory_entry
+        assert len(directory_entries) > 0, f"No frame files were found in '{self.folder_path}'!"
+
+        # Only the listed files are stat-ed, which dominates the listing of large folders on network shares
+        names = natsorted(directory_entries)[: self.max_num_files]
+        entries = list()
+        for name in names:
+            stat = directory_entries[name].stat()
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            previous_entry = previous_entries.get(name)
+            if previous_entry is not None and (previous_entry["size"], previous_entry["mtime_ns"]) == (size, mtime_ns):
+                entries.append(previous_entry)
+            else:
+                entries.append(dict(name=name, size=size, mtime_ns=mtime_ns, shape=None, dtype=None, readable=None))
+        modified = len(entries) != len(previous_entries) or any(entry["readable"] is None for entry in entries)
+
+        # Inspect the reference frame and every frame whose size stands out from the rest
+        common_size = Counter(entry["size"] for entry in entries).most_common(1)[0][0]
+        for index, entry in enumerate(entries):
+            if entry["readable"] is None and (index == 0 or entry["size"] != common_size):
+                self._inspect_entry(entry=entry)
+
+        reference_entry = next((entry for entry in entries if entry["readable"]), None)
+        assert reference_entry is not None, f"None of the frame files in '{self.folder_path}' could be read!"
+        for entry in entries:
+            if entry["readable"] is None:  # Same size as the reference, so the same shape is assumed
+                entry.update(shape=reference_entry["shape"], dtype=reference_entry["dtype"], readable=True)
+
+        if modified and self.max_num_files is None:
+            self._save(entries=entries)
+        return entries
+
+    def _inspect_entry(self, entry: dict):
+        try:
+            with h5py.File(name=self.folder_path / entry["name"], mode="r") as file:
+                entry.update(shape=list(file["default"].shape), dtype=file["default"].dtype.str, readable=True)
+        except (OSError, KeyError):  # Truncated HDF5 files fail to open, partially written ones may lack the dataset
+            entry.update(readable=False)
+
+    def _save(self, entries: List[dict]):
+        manifest = dict(version=MANIFEST_VERSION, folder_path=str(self.folder_path), entries=entries)
+        temporary_file_path = self.manifest_file_path.with_suffix(".json.tmp")
+        try:
+            with open(file=temporary_file_path, mode="w") as file:
+                json.dump(obj=manifest, fp=file)
+            os.replace(temporary_file_path, self.manifest_file_path)
+        except OSError:  # e.g., a read-only share; the manifest is then rebuilt on every run
+            warn(f"Unable to write the frame manifest to '{self.manifest_file_path}'.")
+
+    @property
+    def file_paths(self) -> List[Path]:
+        return [self.folder_path / entry["name"] for entry in self.entries]
+
+    @property
+    def shape(self) -> Tuple[int]:
+        """The shape of every frame file; the specified one, or else that of the first readable file."""
+        return self._shape or tuple(next(entry["shape"] for entry in self.entries if entry["readable"]))
+
+    @property
+    def dtype(self) -> np.dtype:
+        """The dtype of every frame file; the specified one, or else that of the first readable file."""
+        return np.dtype(self._dtype or next(entry["dtype"] for entry in self.entries if entry["readable"]))
+
+    @property
+    def frame_numbers(self) -> Optional[List[int]]:
+        """The frame numbers encoded in the file names (e.g., 'TM00042_CM0_CHN00.h5' is frame 42), if any."""
+        frame_numbers = [re.search(pattern=r"\d+", string=entry["name"]) for entry in self.entries]
+        if any(frame_number is None for frame_number in frame_numbers):
+            return None
+        return [int(frame_number.group()) for frame_number in frame_numbers]
+
+    @property
+    def missing_frame_numbers(self) -> List[int]:
+        """Frame numbers absent from the folder, including any missing before the first frame file."""
+        frame_numbers = self.frame_numbers
+        if frame_numbers is None:
+            return list()
+        return sorted(set(range(max(frame_numbers) + 1)) - set(frame_numbers))
+
+    @property
+    def truncated_frame_numbers(self) -> List[int]:
+        """Frame numbers (or positions, if the names carry no number) of files that are unreadable."""
+        frame_numbers = self.frame_numbers or range(len(self.entries))
+        return [frame_number for frame_number, entry in zip(frame_numbers, self.entries) if not entry["readable"]]
+
+    @property
+    def misshapen_frames(self) -> Dict[int, Tuple[Tuple[int], np.dtype]]:
+        """The shape and dtype of the readable files that differ from `shape` or `dtype`, by frame number."""
+        frame_numbers = self.frame_numbers or range(len(self.entries))
+        expected_shape_and_dtype = (self.shape, self.dtype)
+        misshapen_frames = dict()
+        for frame_number, entry in zip(frame_numbers, self.entries):
+            shape_and_dtype = (tuple(entry["shape"]), np.dtype(entry["dtype"])) if entry["readable"] else None
+            if shape_and_dtype is not None and shape_and_dtype != expected_shape_and_dtype:
+                misshapen_frames[frame_number] = shape_and_dtype
+        return misshapen_frames
+
+    def validate(self):
+        """Warn about missing frames and raise an error if any frame file is corrupt or of an unexpected shape."""
+        missing_frame_numbers = self.missing_frame_numbers
+        if missing_frame_numbers:
+            warn(
+                f"{len(missing_frame_numbers)} frames are missing from '{self.folder_path}' "
+                f"(first missing: {missing_frame_numbers[:10]})."
+            )
+
+        truncated_frame_numbers = self.truncated_frame_numbers
+        if truncated_frame_numbers:
+            raise ValueError(
+                f"{len(truncated_frame_numbers)} frame files in '{self.folder_path}' are truncated or corrupt: "
+                f"{truncated_frame_numbers}. Please restore or remove them before converting."
+            )
+
+        misshapen_frames = self.misshapen_frames
+        if misshapen_frames:
+            first_frame_number, (found_shape, found_dtype) = next(iter(misshapen_frames.items()))
+            raise ValueError(
+                f"{len(misshapen_frames)} frame files in '{self.folder_path}' are not of the expected shape "
+                f"{self.shape} and dtype '{self.dtype}' (frame {first_frame_number} has shape {found_shape} and dtype "
+                f"'{found_dtype}'): {list(misshapen_frames)[:10]}."
+            )
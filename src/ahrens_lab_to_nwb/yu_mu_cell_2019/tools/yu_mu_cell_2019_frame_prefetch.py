@@ -0,0 +1,131 @@
+"""Read-ahead of the frame files of the Ahrens lab imaging data on background threads."""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Iterable, List
+
+from neuroconv.utils import FilePathType
+
+# Each prefetching thread reads the frame files through a scratch buffer of this size
+PREFETCH_READ_BYTES = 8 * 1024**2
+
+
+def _read_file(file_path: FilePathType) -> int:
+    """Read the whole file and discard its bytes, leaving them in the page cache of the operating system."""
+    num_bytes = 0
+    scratch = bytearray(PREFETCH_READ_BYTES)
+    with open(file=file_path, mode="rb", buffering=0) as file:
+        while True:
+            num_bytes_read = file.readinto(scratch)
+            if not num_bytes_read:
+                return num_bytes
+            num_bytes += num_bytes_read
+
+
+class FrameFilePrefetcher:
+    """
+    Reads upcoming frame files on a pool of background threads while the current buffer is compressed and written.
+
+    The files are read with plain file reads rather than h5py, which serializes every call behind a single lock, so the
+    latency of the storage overlaps with the compression and writing of the NWB file. Their bytes land in the page cache
+    of the operating system, where h5py finds them when the frames are read, so the memory held by the process does
+    not grow with the read-ahead.
+
+    Frames are scheduled in order and at most once while pending, so readers in step (e.g., the extractors of both
+    regions of a dual-color session) share the reads. The frames about to be read are claimed: the reader waits for
+    their reads, which the threads share, rather than fetching each file itself; the reads of frames left behind the
+    reader are cancelled. A reader requesting frames behind the latest claim (e.g., on a second pass over the frames)
+    starts the schedule over from there.
+
+    The threads of a process are not carried over to a process forked from it; there, the read-ahead starts over.
+    """
+
+    def __init__(self, file_paths: List[FilePathType], num_threads: int = 4):
+        assert num_threads > 0, f"'num_threads' ({num_threads}) must be greater than zero!"
+        self.file_paths = file_paths
+        self.num_threads = num_threads
+        self.num_prefetched_files = 0
+        self.num_prefetched_bytes = 0
+
+        self._reset()
+
+    def _reset(self):
+        self._executor = None  # Only started once frames are first prefetched
+        self._pending = OrderedDict()  # Maps frame index to the Future of its read
+        self._next_frame_index = 0  # Frames are scheduled in order, from here on
+        self._claimed_frame_index = 0  # The first frame of the latest claim
+        self._lock = threading.RLock()  # Reads completed before their callback is added record themselves at once
+        self._process_id = os.getpid()
+
+    def _check_process(self):
+        if self._process_id != os.getpid():  # Forked; the threads, and any lock they held, belong to the parent
+            self._reset()
+
+    def prefetch(self, start_frame: int, end_frame: int):
+        """Schedule the reads of the frames in [start_frame, end_frame) that are not already scheduled."""
+        self._check_process()
+        with self._lock:
+            end_frame = min(end_frame, len(self.file_paths))
+            if start_frame < self._claimed_frame_index:  # Behind the latest read, e.g., a second pass over the frames
+                self._next_frame_index = min(self._next_frame_index, start_frame)
+            start_frame = max(start_frame, self._next_frame_index)
+            if start_frame >= end_frame:
+                return
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="frame_prefetch")
+            for frame_index in range(start_frame, end_frame):
+                if frame_index in self._pending:  # Already scheduled ahead of another reader
+                    continue
+                future = self._executor.submit(_read_file, self.file_paths[frame_index])
+                future.add_done_callback(self._record_read)
+                self._pending[frame_index] = future
+            self._next_frame_index = end_frame
+
+    def claim(self, frame_indices: Iterable[int]):
+        """Wait for the reads of the frames about to be read, and cancel those of the frames left behind."""
+        frame_indices = set(int(frame_index) for frame_index in frame_indices)
+        if not frame_indices:
+            return
+        self._check_process()
+
+        with self._lock:
+            claimed_futures = [
+                self._pending.pop(frame_index) for frame_index in frame_indices if frame_index in self._pending
+            ]
+            # Frames before the requested ones will not be read again, e.g., when a resumed write skipped them
+            min_frame_index = min(frame_indices)
+            self._claimed_frame_index = min_frame_index
+            for frame_index in [frame_index for frame_index in self._pending if frame_index < min_frame_index]:
+                self._pending.pop(frame_index).cancel()
+
+        for future in claimed_futures:
+            self._wait(future=future)
+
+    def _record_read(self, future: Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            self.num_prefetched_files += 1
+            self.num_prefetched_bytes += future.result()
+
+    @staticmethod
+    def _wait(future: Future):
+        try:
+            future.result()
+        except (CancelledError, OSError):
+            pass  # The frame is read directly, which raises any error of the file itself
+
+    def close(self):
+        """Cancel the pending reads and stop the threads; prefetching starts again if more frames are requested."""
+        self._check_process()
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._next_frame_index = 0
+            self._claimed_frame_index = 0
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
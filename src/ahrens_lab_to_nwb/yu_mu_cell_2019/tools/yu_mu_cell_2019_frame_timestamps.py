@@ -0,0 +1,198 @@
+"""Imaging timestamps derived from the frame tracker of the behavior acquisition, persisted across runs."""
+import os
+from pathlib import Path
+from typing import Optional
+from warnings import warn
+
+import h5py
+import numpy as np
+from neuroconv.utils import FilePathType
+
+from .yu_mu_cell_2019_frame_manifest import FrameFileManifest
+
+FRAME_TIMESTAMPS_VERSION = 1
+
+
+def get_default_frame_timestamps_file_path(file_path: FilePathType) -> Path:
+    """The timestamps live next to the behavior file they were derived from."""
+    file_path = Path(file_path).absolute()
+    return file_path.parent / f"{file_path.stem}_frame_timestamps.npz"
+
+
+def detect_frame_transitions(
+    dataset: h5py.Dataset, block_size: int = 2**22, max_num_transitions: Optional[int] = None
+) -> np.ndarray:
+    """
+    Find the sample indices at which the value of a (1, num_samples) frame tracker changes.
+
+    Equivalent to np.where(np.diff(dataset[0, :]))[0], computed one block of samples at a time so that the full
+    tracker is never loaded; the last sample of each block is carried over to compare against the next one.
+    If `max_num_transitions` is specified, the scan stops as soon as that many transitions are found.
+    """
+    assert dataset.ndim == 2 and dataset.shape[0] == 1, f"Expected a (1, num_samples) tracker; found {dataset.shape}!"
+    num_samples = dataset.shape[1]
+    if dataset.chunks is not None:  # Align the blocks to the storage so each chunk is decompressed once
+        block_size = max(block_size // dataset.chunks[1], 1) * dataset.chunks[1]
+
+    transitions = list()
+    num_transitions = 0
+    previous_sample = None
+    for block_start in range(0, num_samples, block_size):
+        block = dataset[0, block_start : block_start + block_size]
+        if previous_sample is not None and block[0] != previous_sample:
+            transitions.append(np.array([block_start - 1]))
+            num_transitions += 1
+        transitions.append(np.flatnonzero(block[1:] != block[:-1]) + block_start)
+        num_transitions += len(transitions[-1])
+        previous_sample = block[-1]
+        if max_num_transitions is not None and num_transitions >= max_num_transitions:
+            break
+    transitions = np.concatenate(transitions) if transitions else np.empty(shape=0, dtype="int64")
+    return transitions[:max_num_transitions]
+
+
+class FrameTrackerTimestamps:
+    """
+    Timestamps of every imaging frame as detected from the 'frame' tracker of the processed behavior file.
+
+    Each change of the tracker value marks the acquisition of a frame; the final transition marks the end of the
+    recording and is dropped. The result is saved next to the behavior file along with its size, modification time
+    and sampling frequency, and is reused on later runs as long as none of these changed.
+
+    With `max_num_frames`, as for stub conversions, only the timestamps of the first frames are kept: the tracker is
+    only scanned up to them, or a saved result of a full scan is truncated to them. Such partial timestamps are not
+    saved, and `is_complete` is False.
+    """
+
+    def __init__(
+        self,
+        file_path: FilePathType,
+        sampling_frequency: float,
+        dataset_path: str = "data/frame",
+        timestamps_file_path: Optional[FilePathType] = None,
+        block_size: int = 2**22,
+        max_num_frames: Optional[int] = None,
+    ):
+        self.file_path = Path(file_path).absolute()
+        self.sampling_frequency = sampling_frequency
+        self.dataset_path = dataset_path
+        self.timestamps_file_path = (
+            Path(timestamps_file_path)
+            if timestamps_file_path is not None
+            else get_default_frame_timestamps_file_path(file_path=file_path)
+        )
+
+        stat = self.file_path.stat()
+        self._source_signature = dict(
+            version=FRAME_TIMESTAMPS_VERSION,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            sampling_frequency=float(sampling_frequency),
+            dataset_path=dataset_path,
+        )
+        self.timestamps = self._load_timestamps()
+        self.is_complete = True
+        if self.timestamps is not None and max_num_frames is not None and len(self.timestamps) > max_num_frames:
+            self.timestamps = self.timestamps[:max_num_frames]
+            self.is_complete = False
+        elif self.timestamps is None:
+            # One more transition than frames tells the frames apart from the end of the recording
+            max_num_transitions = max_num_frames + 1 if max_num_frames is not None else None
+            with h5py.File(name=self.file_path, mode="r") as file:
+                transitions = detect_frame_transitions(
+                    dataset=file[dataset_path], block_size=block_size, max_num_transitions=max_num_transitions
+                )
+            if max_num_transitions is not None and len(transitions) == max_num_transitions:
+                self.timestamps = transitions[:max_num_frames] / sampling_frequency
+                self.is_complete = False
+            else:  # The entire tracker was scanned
+                self.timestamps = transitions[:-1] / sampling_frequency
+                self._save_timestamps()
+
+    def _load_timestamps(self) -> Optional[np.ndarray]:
+        if not self.timestamps_file_path.exists():
+            return None
+
+        try:
+            with np.load(file=self.timestamps_file_path, allow_pickle=False) as saved:
+                signature = {key: saved[key].item() for key in self._source_signature if key in saved}
+                timestamps = saved["timestamps"]
+        except (OSError, ValueError, KeyError):
+            warn(f"Unable to read the frame timestamps at '{self.timestamps_file_path}'; they will be recomputed.")
+            return None
+        return timestamps if signature == self._source_signature else None
+
+    def _save_timestamps(self):
+        temporary_file_path = self.timestamps_file_path.with_suffix(".tmp.npz")
+        try:
+            np.savez(file=temporary_file_path, timestamps=self.timestamps, **self._source_signature)
+            os.replace(temporary_file_path, self.timestamps_file_path)
+        except OSError:  # e.g., a read-only share; the timestamps are then recomputed on every run
+            warn(f"Unable to write the frame timestamps to '{self.timestamps_file_path}'.")
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def get_frame_file_timestamps(
+        self, manifest: FrameFileManifest, frame_offset: int = 0, allow_missing_trailing_frames: bool = False
+    ) -> np.ndarray:
+        """
+        Select the timestamps of the frames that have a file in the folder described by the manifest.
+
+        The frame number in each file name, plus `frame_offset`, indexes the tracker transitions. Frames missing
+        before the first file or in between files are detected from the file names and skipped with a warning, rather
+        than shifting every later timestamp. Frames of the tracker past the last file cannot be told apart from frames
+        whose imaging is missing before the file numbered zero, so they raise an error unless `frame_offset` accounts
+        for them, or `allow_missing_trailing_frames` is set for a session whose last frame files are missing. Frame
+        files past the end of the tracker raise an error.
+
+        Parameters
+        ----------
+        manifest : FrameFileManifest
+        frame_offset : int, default: 0
+            The index of the tracker frame of the frame file numbered zero, e.g., the number of frames acquired before
+            the imaging that was kept.
+        allow_missing_trailing_frames : bool, default: False
+            Drop the frames of the tracker past the last frame file with a warning, rather than raising an error.
+        """
+        assert frame_offset >= 0, f"'frame_offset' ({frame_offset}) must be zero or more!"
+        frame_numbers = manifest.frame_numbers
+        if frame_numbers is None:
+            warn(
+                f"The frame files in '{manifest.folder_path}' carry no frame numbers; "
+                "assuming they start with the frame at 'frame_offset' of the tracker and have no gaps."
+            )
+            frame_numbers = list(range(len(manifest.entries)))
+        tracker_frame_numbers = np.asarray(frame_numbers) + frame_offset
+
+        frames_past_tracker = tracker_frame_numbers[tracker_frame_numbers >= len(self.timestamps)]
+        if len(frames_past_tracker) > 0:
+            raise ValueError(
+                f"{len(frames_past_tracker)} frame files in '{manifest.folder_path}' lie beyond the "
+                f"{len(self.timestamps)} frames detected in the tracker of '{self.file_path}' with a 'frame_offset' of "
+                f"{frame_offset} (first: {frames_past_tracker[:10].tolist()})."
+            )
+
+        num_leading_missing = int(tracker_frame_numbers[0])
+        num_gaps = int(tracker_frame_numbers[-1] - tracker_frame_numbers[0] + 1 - len(tracker_frame_numbers))
+        # Only the timestamps and frame files of a full scan and listing tell whether the last frames are missing
+        is_complete = self.is_complete and manifest.max_num_files is None
+        num_trailing_missing = len(self.timestamps) - int(tracker_frame_numbers[-1]) - 1 if is_complete else 0
+        if num_trailing_missing and not allow_missing_trailing_frames:
+            raise ValueError(
+                f"The tracker of '{self.file_path}' detected {len(self.timestamps)} frames, but the last of the "
+                f"{len(tracker_frame_numbers)} frame files in '{manifest.folder_path}' is frame "
+                f"{int(tracker_frame_numbers[-1])} (with a 'frame_offset' of {frame_offset}), leaving "
+                f"{num_trailing_missing} frames of the tracker without a file. If the imaging of the first frames is "
+                f"missing, pass the number of frames before the first file as 'frame_offset' (at most "
+                f"{frame_offset + num_trailing_missing}); if the last frame files are missing, pass "
+                "'allow_missing_trailing_frames=True'."
+            )
+        if num_leading_missing or num_gaps or num_trailing_missing:
+            warn(
+                f"The tracker of '{self.file_path}' detected {len(self.timestamps)} frames, but "
+                f"'{manifest.folder_path}' holds {len(tracker_frame_numbers)} frame files: {num_leading_missing} "
+                f"frames are missing before the first file, {num_gaps} in between files, and {num_trailing_missing} "
+                "after the last file. Only the timestamps of the frames with a file are used."
+            )
+        return self.timestamps[tracker_frame_numbers]
@@ -0,0 +1,125 @@
+"""Chunked iteration over the frames of the Ahrens lab imaging extractors, with resumable and measured progress."""
+from typing import Optional, Tuple
+from warnings import warn
+
+import numpy as np
+from neuroconv.tools.roiextractors.imagingextractordatachunkiterator import ImagingExtractorDataChunkIterator
+from roiextractors import ImagingExtractor
+from roiextractors.imagingextractor import FrameSliceImagingExtractor
+
+from .yu_mu_cell_2019_chunk_shape import DEFAULT_IMAGING_CHUNK_MB, get_imaging_chunk_shape, get_max_frames_per_buffer
+from .yu_mu_cell_2019_memory_budget import BudgetedDataChunkIteratorMixin
+from .yu_mu_cell_2019_performance_report import MeasuredDataChunkIteratorMixin
+from .yu_mu_cell_2019_summary_images import SummaryImageAccumulator
+from .yu_mu_cell_2019_write_checkpoint import CheckpointedDataChunkIteratorMixin
+
+
+class AhrensImagingDataChunkIterator(
+    CheckpointedDataChunkIteratorMixin,
+    MeasuredDataChunkIteratorMixin,
+    BudgetedDataChunkIteratorMixin,
+    ImagingExtractorDataChunkIterator,
+):
+    """
+    ImagingExtractorDataChunkIterator whose committed buffers can be recorded in a WriteCheckpoint, whose reads
+    and writes can be measured in a PerformanceReport, and whose buffers can be shrunk to fit a MemoryBudget.
+
+    Unless specified, the chunk shape is chosen for the `read_profile` of the series (see `get_imaging_chunk_shape`),
+    with chunks of at most `chunk_mb` that never span more frames than a buffer of `buffer_gb` holds.
+
+    When the extractor supports it (see `AhrensHdf5FolderImagingExtractor.prefetch_frames`), the frame files of the
+    next `prefetch_buffers` buffers are read ahead on `prefetch_threads` background threads while the current buffer
+    is written. Those of the current buffer are scheduled too, so that a buffer requested before its read-ahead (e.g.,
+    the first one, or the first after resuming a write) is still fetched on several threads.
+
+    With a `summary_accumulator`, the summary images of the series are accumulated from each buffer as it is read.
+    """
+
+    # The frames read for a buffer, and the contiguous copy of their transpose written to the file
+    buffer_copies = 2
+    summary_accumulator: Optional[SummaryImageAccumulator] = None
+
+    def __init__(
+        self,
+        imaging_extractor: ImagingExtractor,
+        buffer_gb: Optional[float] = None,
+        buffer_shape: Optional[tuple] = None,
+        chunk_mb: Optional[float] = None,
+        chunk_shape: Optional[tuple] = None,
+        read_profile: str = "frame",
+        prefetch_buffers: int = 1,
+        prefetch_threads: int = 4,
+        display_progress: bool = False,
+        progress_bar_options: Optional[dict] = None,
+    ):
+        assert not (chunk_mb and chunk_shape), "Only one of 'chunk_mb' or 'chunk_shape' can be specified!"
+        assert prefetch_buffers >= 0, f"'prefetch_buffers' ({prefetch_buffers}) must be zero or more!"
+        self.imaging_extractor = imaging_extractor
+        self.read_profile = read_profile
+        self.prefetch_buffers = prefetch_buffers
+        self.prefetch_threads = prefetch_threads
+        self._prefetching_extractor, self._prefetch_frame_offset = _get_prefetching_extractor(imaging_extractor)
+        maxshape, dtype = self._get_maxshape(), self._get_dtype()
+        if buffer_shape is None:
+            # The buffers span whole frames, as many as fit in 'buffer_gb'
+            max_buffer_frames = get_max_frames_per_buffer(maxshape=maxshape, dtype=dtype, buffer_gb=buffer_gb or 1.0)
+        else:
+            assert tuple(buffer_shape[1:]) == maxshape[1:], (
+                f"The buffers ({buffer_shape}) must span whole frames ({maxshape[1:]}), "
+                "otherwise every frame is read once for each buffer!"
+            )
+            max_buffer_frames = buffer_shape[0]
+
+        if chunk_shape is None:
+            chunk_shape = get_imaging_chunk_shape(
+                maxshape=maxshape,
+                dtype=dtype,
+                read_profile=read_profile,
+                chunk_mb=chunk_mb or DEFAULT_IMAGING_CHUNK_MB,
+                buffer_frames=max_buffer_frames,
+            )
+        elif chunk_shape[0] > max_buffer_frames and max_buffer_frames < maxshape[0]:
+            warn(
+                f"Chunks of {chunk_shape[0]} frames span more frames than the buffers hold ({max_buffer_frames}); "
+                "the buffers will be enlarged to whole chunks of frames, regardless of 'buffer_gb'."
+            )
+
+        super().__init__(
+            imaging_extractor=imaging_extractor,
+            buffer_gb=buffer_gb,
+            buffer_shape=buffer_shape,
+            chunk_shape=chunk_shape,
+            display_progress=display_progress,
+            progress_bar_options=progress_bar_options,
+        )
+
+    def _get_data(self, selection: Tuple[slice]) -> np.ndarray:
+        if self._prefetching_extractor is not None and self.prefetch_buffers > 0:
+            end_frame = min(selection[0].stop + self.prefetch_buffers * self.buffer_shape[0], self.maxshape[0])
+            self._prefetching_extractor.prefetch_frames(
+                start_frame=self._prefetch_frame_offset + selection[0].start,
+                end_frame=self._prefetch_frame_offset + end_frame,
+                num_threads=self.prefetch_threads,
+            )
+        data = super()._get_data(selection=selection)
+        if self.summary_accumulator is not None:
+            self.summary_accumulator.add_frames(frames=data, start_frame=selection[0].start)
+        return data
+
+    @property
+    def in_memory_gb(self) -> float:
+        return 0.0 if self.summary_accumulator is None else self.summary_accumulator.nbytes / 1e9
+
+    def _get_budgeted_buffer_shape(self, buffer_gb: float) -> tuple:
+        return self._get_scaled_buffer_shape(buffer_gb=buffer_gb, chunk_shape=self.chunk_shape)
+
+
+def _get_prefetching_extractor(imaging_extractor: ImagingExtractor) -> Tuple[Optional[ImagingExtractor], int]:
+    """The extractor reading the frame files ahead, if any, and the offset of its frames through any frame slices."""
+    frame_offset = 0
+    while isinstance(imaging_extractor, FrameSliceImagingExtractor):
+        frame_offset += imaging_extractor._start_frame or 0
+        imaging_extractor = imaging_extractor._parent_imaging
+    if not hasattr(imaging_extractor, "prefetch_frames"):
+        return None, 0
+    return imaging_extractor, frame_offset
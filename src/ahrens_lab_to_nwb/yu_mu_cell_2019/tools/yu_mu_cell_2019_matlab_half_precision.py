@@ -0,0 +1,179 @@
+"""Tools for reading MATLAB half-precision arrays directly from MATLAB (v7.3) files."""
+from typing import Optional, Tuple
+
+import h5py
+import numpy as np
+
+MCOS_MAGIC_NUMBER = 0xDD000000
+HALF_PRECISION_PROPERTY_NAME = "codedValue"
+
+
+def is_matlab_half_precision(dataset: h5py.Dataset) -> bool:
+    """
+    Whether a dataset is the (1, 6) object handle MATLAB writes for an array of class 'half'.
+
+    MATLAB stores objects in v7.3 files as a small uint32 handle pointing into the '#subsystem#/MCOS' cell array,
+    which holds the actual property values of every object in the file.
+    """
+    matlab_class = dataset.attrs.get("MATLAB_class", b"")
+    matlab_class = matlab_class.decode() if isinstance(matlab_class, bytes) else str(matlab_class)
+    return matlab_class == "half" and dataset.dtype == np.uint32 and dataset.size >= 6
+
+
+def _parse_object_handle(dataset: h5py.Dataset) -> int:
+    handle = dataset[()].flatten()
+    assert handle[0] == MCOS_MAGIC_NUMBER, f"'{dataset.name}' is not a MATLAB object handle!"
+    num_dims = int(handle[1])
+    num_objects = int(np.prod(handle[2 : 2 + num_dims]))
+    assert num_objects == 1, f"'{dataset.name}' holds an array of {num_objects} objects; only one is supported."
+    return int(handle[2 + num_dims])
+
+
+def _parse_file_wrapper_strings(metadata: bytes, num_strings: int, names_end: int) -> Tuple[str, ...]:
+    strings = tuple(string.decode() for string in metadata[40:names_end].split(b"\x00") if string)
+    _check_layout(
+        condition=len(strings) >= num_strings,
+        message=f"the header announces {num_strings} names, but only {len(strings)} were found",
+    )
+    return strings[:num_strings]
+
+
+def _check_layout(condition: bool, message: str):
+    """Raise rather than decode values from a 'FileWrapper__' metadata that does not follow the expected layout."""
+    if not condition:
+        raise ValueError(
+            f"Unexpected layout of the MATLAB subsystem metadata ({message}); the MATLAB half arrays of this file "
+            "cannot be read."
+        )
+
+
+def resolve_matlab_half_precision_dataset(file: h5py.File, dataset_name: str) -> str:
+    """
+    Find the uint16 dataset holding the coded values of the MATLAB 'half' array stored under `dataset_name`.
+
+    The object's properties are looked up through the 'FileWrapper__' metadata, the first element of the MCOS cell:
+    a header of ten uint32 (version, number of names, eight segment offsets) followed by the names, then a segment
+    of 16-byte class records (package name, class name, -, -), a segment of 24-byte object records (class, -, -, -,
+    property set, object id) and a segment of property sets, each a count followed by (name index, type, value)
+    triplets padded to eight bytes. The first record of each segment is an empty placeholder. Properties of type 1
+    point into the MCOS cell, whose property values start at its third element.
+
+    MathWorks does not document this layout; it follows the reverse-engineered descriptions of the MCOS subsystem of
+    MAT-files used by third-party readers (e.g., MAT.jl), and is only exercised here against the files written by
+    `write_synthetic_session`. Any part of the metadata that does not fit it raises a ValueError.
+
+    Returns
+    -------
+    coded_dataset_name : str
+        The full HDF5 path of the dataset; its uint16 values are the IEEE 754 half-precision bit patterns.
+    """
+    object_id = _parse_object_handle(dataset=file[dataset_name])
+
+    mcos_cell = file["#subsystem#"]["MCOS"][()].flatten()
+    metadata = file[mcos_cell[0]][()].flatten().astype("uint8").tobytes()
+    _check_layout(condition=len(metadata) >= 40, message=f"a header of {len(metadata)} bytes")
+    header = np.frombuffer(metadata[:40], dtype="<u4")
+    num_strings, segment_offsets = int(header[1]), [int(offset) for offset in header[2:]]
+    _check_layout(
+        condition=segment_offsets == sorted(segment_offsets)
+        and 40 <= segment_offsets[0]
+        and segment_offsets[-1] <= len(metadata),
+        message=f"segment offsets {segment_offsets} for {len(metadata)} bytes",
+    )
+    names = _parse_file_wrapper_strings(metadata=metadata, num_strings=num_strings, names_end=segment_offsets[0])
+
+    class_segment = metadata[segment_offsets[0] : segment_offsets[1]]
+    object_segment = metadata[segment_offsets[2] : segment_offsets[3]]
+    property_segment = metadata[segment_offsets[3] : segment_offsets[4]]
+    _check_layout(
+        condition=len(class_segment) % 16 == 0 and len(object_segment) % 24 == 0 and len(property_segment) % 8 == 0,
+        message=(
+            f"class, object and property segments of {len(class_segment)}, {len(object_segment)} and "
+            f"{len(property_segment)} bytes"
+        ),
+    )
+    class_records = np.frombuffer(class_segment, dtype="<u4").reshape(-1, 4)
+    object_records = np.frombuffer(object_segment, dtype="<u4").reshape(-1, 6)
+
+    matching_records = object_records[object_records[:, 5] == object_id]
+    _check_layout(
+        condition=len(matching_records) == 1, message=f"{len(matching_records)} records of object {object_id}"
+    )
+    class_index, *unused_fields, property_set_index, _ = (int(field) for field in matching_records[0])
+    _check_layout(
+        condition=0 < class_index < len(class_records) and unused_fields == [0, 0, 0] and property_set_index > 0,
+        message=f"the record {matching_records[0].tolist()} of object {object_id}",
+    )
+    class_name_index = int(class_records[class_index, 1])
+    class_name = names[class_name_index - 1] if 0 < class_name_index <= len(names) else None
+    _check_layout(condition=class_name == "half", message=f"object {object_id} is of class '{class_name}'")
+
+    # Walk the property sets up to the one belonging to this object
+    property_sets = np.frombuffer(property_segment, dtype="<u4")
+    position = 2  # The first property set is an empty placeholder of eight bytes
+    for _ in range(property_set_index - 1):
+        _check_layout(condition=position < len(property_sets), message=f"no property set {property_set_index}")
+        num_properties = int(property_sets[position])
+        position += 1 + 3 * num_properties
+        position += position % 2  # Padding to eight bytes
+    _check_layout(condition=position < len(property_sets), message=f"no property set {property_set_index}")
+    num_properties = int(property_sets[position])
+    properties = property_sets[position + 1 : position + 1 + 3 * num_properties]
+    _check_layout(
+        condition=len(properties) == 3 * num_properties,
+        message=f"property set {property_set_index} is cut short",
+    )
+
+    for name_index, property_type, value in properties.reshape(-1, 3):
+        _check_layout(condition=0 < name_index <= len(names), message=f"a property named by index {name_index}")
+        if names[name_index - 1] != HALF_PRECISION_PROPERTY_NAME:
+            continue
+        _check_layout(
+            condition=property_type == 1 and value + 2 < len(mcos_cell),
+            message=f"a '{HALF_PRECISION_PROPERTY_NAME}' of type {property_type} and value {value}",
+        )
+        coded_dataset = file[mcos_cell[value + 2]]
+        _check_layout(
+            condition=isinstance(coded_dataset, h5py.Dataset) and coded_dataset.dtype == np.uint16,
+            message=f"a '{HALF_PRECISION_PROPERTY_NAME}' that is not a uint16 dataset",
+        )
+        return coded_dataset.name
+    raise ValueError(f"Could not find the '{HALF_PRECISION_PROPERTY_NAME}' of the MATLAB half array '{dataset_name}'!")
+
+
+class MatlabHalfPrecisionDataset:
+    """Sliceable view of a MATLAB 'half' array that decodes each selection on read."""
+
+    def __init__(
+        self,
+        file: h5py.File,
+        dataset_name: str,
+        dtype: str = "float32",
+        coded_dataset_name: Optional[str] = None,  # If specified, don't resolve it from the MATLAB metadata
+    ):
+        self.name = dataset_name
+        self.dtype = np.dtype(dtype)
+        assert self.dtype.kind == "f" and self.dtype.itemsize >= 2, "Half-precision data can only be read as floats!"
+        coded_dataset_name = coded_dataset_name or resolve_matlab_half_precision_dataset(
+            file=file, dataset_name=dataset_name
+        )
+        self._coded_dataset = file[coded_dataset_name]
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self._coded_dataset.shape
+
+    @property
+    def chunks(self) -> Tuple[int, ...]:
+        return self._coded_dataset.chunks
+
+    def __len__(self) -> int:
+        return len(self._coded_dataset)
+
+    def __getitem__(self, selection) -> np.ndarray:
+        return decode_half_precision(coded_values=self._coded_dataset[selection], dtype=self.dtype)
+
+
+def decode_half_precision(coded_values: np.ndarray, dtype: str = "float32") -> np.ndarray:
+    """Reinterpret the uint16 bit patterns as IEEE 754 half-precision floats and cast to the requested dtype."""
+    return np.asarray(coded_values, dtype="uint16").view("float16").astype(dtype, copy=False)
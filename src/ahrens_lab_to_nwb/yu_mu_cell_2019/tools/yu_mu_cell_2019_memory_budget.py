@@ -0,0 +1,209 @@
+"""Division of a single memory limit of a conversion among its in-memory data and the buffers of its iterators."""
+from itertools import chain, product
+from typing import Dict, Iterable, List, Optional
+from warnings import warn
+
+import numpy as np
+from hdmf.container import AbstractContainer
+from hdmf.data_utils import AbstractDataChunkIterator, DataIO
+
+# The interpreter, the imported libraries, the in-memory NWBFile and the caches of the open HDF5 files
+DEFAULT_RESERVED_GB = 0.5
+MIN_BUFFER_GB = 0.01
+
+
+class BudgetedDataChunkIteratorMixin:
+    """
+    Mixin for GenericDataChunkIterators whose buffers can be resized to fit a MemoryBudget before any is read.
+
+    Subclasses select the shape of a buffer of a given size in `_get_budgeted_buffer_shape`, with the same alignment
+    to the chunks (and sources) as their own default buffers. `buffer_copies` is the number of buffers of that size
+    held in memory at once while a buffer is read and written.
+    """
+
+    buffer_copies: float = 1.0
+
+    @property
+    def in_memory_gb(self) -> float:
+        """The memory held by the iterator besides its buffers, e.g., for statistics accumulated over them."""
+        return 0.0
+
+    def _get_budgeted_buffer_shape(self, buffer_gb: float) -> tuple:
+        raise NotImplementedError
+
+    @property
+    def buffer_gb(self) -> float:
+        return int(np.prod(self.buffer_shape)) * np.dtype(self.dtype).itemsize / 1e9
+
+    def set_buffer_gb(self, buffer_gb: float):
+        """Resize the buffers to at most `buffer_gb`; only before the first buffer is requested."""
+        self.buffer_shape = tuple(int(length) for length in self._get_budgeted_buffer_shape(buffer_gb=buffer_gb))
+        self.num_buffers = int(
+            np.prod(
+                [
+                    -(-maxshape_axis // buffer_axis)
+                    for buffer_axis, maxshape_axis in zip(self.buffer_shape, self.maxshape)
+                ]
+            )
+        )
+        # The same order of selections as GenericDataChunkIterator
+        self.buffer_selection_generator = (
+            tuple(slice(lower_bound, upper_bound) for lower_bound, upper_bound in zip(lower_bounds, upper_bounds))
+            for lower_bounds, upper_bounds in zip(
+                product(
+                    *[
+                        range(0, maxshape_axis, buffer_axis)
+                        for maxshape_axis, buffer_axis in zip(self.maxshape, self.buffer_shape)
+                    ]
+                ),
+                product(
+                    *[
+                        chain(range(buffer_axis, maxshape_axis, buffer_axis), [maxshape_axis])
+                        for maxshape_axis, buffer_axis in zip(self.maxshape, self.buffer_shape)
+                    ]
+                ),
+            )
+        )
+        if getattr(self, "display_progress", False):
+            self.progress_bar.total = self.num_buffers
+            self.progress_bar.refresh()
+
+
+def find_budgeted_iterators(containers: Iterable[AbstractContainer]) -> List[BudgetedDataChunkIteratorMixin]:
+    """Every budgeted iterator among the fields of the containers."""
+    iterators = list()
+    for container in containers:
+        for value in container.fields.values():
+            data = value.data if isinstance(value, DataIO) else value
+            if isinstance(data, AbstractDataChunkIterator) and isinstance(data, BudgetedDataChunkIteratorMixin):
+                iterators.append(data)
+    return iterators
+
+
+def get_in_memory_gb(containers: Iterable[AbstractContainer]) -> float:
+    """The size of the arrays held in memory by the fields of the containers until they are written."""
+    num_bytes = 0
+    for container in containers:
+        for value in container.fields.values():
+            data = value.data if isinstance(value, DataIO) else value
+            if isinstance(data, np.ndarray):
+                num_bytes += data.nbytes
+    return num_bytes / 1e9
+
+
+class MemoryBudget:
+    """
+    A limit on the memory of a conversion, divided among the data the interfaces hold in memory and the buffers of
+    their iterators.
+
+    The arrays added to the NWBFile (e.g., the voxel masks of the segmentations, the timestamps or the behavior
+    tables) are held from the moment their interface runs until the file is written, as is the `in_memory_gb` of the
+    iterators (e.g., their summary images), so they are subtracted from the
+    limit first, along with `reserved_gb` for everything else in the process. The iterators then write one buffer at a
+    time, save for the Zarr backend, which holds up to `num_concurrent_buffers` buffers waiting to be written, so the
+    remainder bounds each buffer of every iterator once divided by its `buffer_copies`.
+
+    Buffers are only ever shrunk to fit the budget, never enlarged beyond the options of their interface. They are
+    sized from the limit and the sizes of the data rather than from the memory in use at the time, so a resumed
+    conversion divides its buffers exactly as the interrupted one did.
+    """
+
+    def __init__(self, memory_gb: float, reserved_gb: float = DEFAULT_RESERVED_GB):
+        assert (
+            memory_gb > reserved_gb
+        ), f"The memory limit ({memory_gb} GB) must exceed the memory reserved for the process ({reserved_gb} GB)!"
+        self.memory_gb = memory_gb
+        self.reserved_gb = reserved_gb
+        self.in_memory_gb = dict()
+        self.iterators = dict()
+        self.buffer_gb = dict()
+        self.num_concurrent_buffers = 1
+        self.buffer_copies = dict()
+        self.peak_rss_gb = None
+
+    def add(self, name: str, containers: Iterable[AbstractContainer]):
+        """Account for the in-memory arrays and the iterators of the containers added by the interface `name`."""
+        containers = list(containers)
+        iterators = find_budgeted_iterators(containers=containers)
+        self.in_memory_gb[name] = (
+            self.in_memory_gb.get(name, 0.0)
+            + get_in_memory_gb(containers=containers)
+            + sum(iterator.in_memory_gb for iterator in iterators)
+        )
+        self.iterators.setdefault(name, list()).extend(iterators)
+
+    @property
+    def available_gb(self) -> float:
+        """The memory left for the buffers of the iterators."""
+        return self.memory_gb - self.reserved_gb - sum(self.in_memory_gb.values())
+
+    def allocate(self, num_concurrent_buffers: int = 1, buffer_copies: Optional[Dict[str, float]] = None):
+        """
+        Shrink the buffers of every iterator to fit the memory left by the in-memory data.
+
+        Parameters
+        ----------
+        num_concurrent_buffers : int, default: 1
+            The number of buffers held in memory at once by the writer.
+        buffer_copies : dict, optional
+            Overrides the `buffer_copies` of the iterators of some interfaces, e.g., when they share their reads.
+        """
+        self.num_concurrent_buffers = num_concurrent_buffers
+        self.buffer_copies = dict(buffer_copies or dict())
+        available_gb = self.available_gb
+        if available_gb < MIN_BUFFER_GB:
+            warn(
+                f"The in-memory data of the conversion ({sum(self.in_memory_gb.values()):.2f} GB) leave no room for "
+                f"buffers within the memory limit ({self.memory_gb} GB); the smallest buffers will be used."
+            )
+            available_gb = MIN_BUFFER_GB
+
+        for name, iterators in self.iterators.items():
+            for iterator in iterators:
+                copies = self._get_buffer_copies(name=name, iterator=iterator) * num_concurrent_buffers
+                budgeted_buffer_gb = max(available_gb / copies, MIN_BUFFER_GB)
+                if budgeted_buffer_gb < iterator.buffer_gb:
+                    iterator.set_buffer_gb(buffer_gb=budgeted_buffer_gb)
+                # Buffers span at least one chunk, or one frame for the imaging, regardless of the budget
+                if iterator.buffer_gb * copies > available_gb:
+                    warn(
+                        f"The smallest buffers of '{name}' ({iterator.buffer_gb:.3f} GB) exceed its share of the "
+                        f"memory limit ({available_gb / copies:.3f} GB)!"
+                    )
+            self.buffer_gb[name] = max((iterator.buffer_gb for iterator in iterators), default=0.0)
+
+    def _get_buffer_copies(self, name: str, iterator: BudgetedDataChunkIteratorMixin) -> float:
+        return self.buffer_copies.get(name, iterator.buffer_copies)
+
+    @property
+    def expected_peak_gb(self) -> float:
+        """The memory expected at the peak of the conversion, when the largest buffers are held."""
+        largest_buffers_gb = max(
+            (
+                iterator.buffer_gb * self._get_buffer_copies(name=name, iterator=iterator)
+                for name, iterators in self.iterators.items()
+                for iterator in iterators
+            ),
+            default=0.0,
+        )
+        return self.reserved_gb + sum(self.in_memory_gb.values()) + largest_buffers_gb * self.num_concurrent_buffers
+
+    def record_peak(self, peak_rss_gb: float):
+        """Compare the observed peak resident memory of the conversion to the limit."""
+        self.peak_rss_gb = peak_rss_gb
+        if peak_rss_gb > self.memory_gb:
+            warn(
+                f"The peak memory of the conversion ({peak_rss_gb:.2f} GB) exceeded its limit ({self.memory_gb} GB); "
+                "increase 'reserved_gb' for the data held outside of the NWBFile and its iterators."
+            )
+
+    def to_dict(self) -> dict:
+        return dict(
+            memory_gb=self.memory_gb,
+            reserved_gb=self.reserved_gb,
+            in_memory_gb=self.in_memory_gb,
+            buffer_gb=self.buffer_gb,
+            num_concurrent_buffers=self.num_concurrent_buffers,
+            expected_peak_gb=self.expected_peak_gb,
+            peak_rss_gb=self.peak_rss_gb,
+        )
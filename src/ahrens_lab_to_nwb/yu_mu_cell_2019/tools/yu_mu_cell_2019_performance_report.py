@@ -0,0 +1,218 @@
+"""Measurement of the time, I/O and memory spent by each interface during each phase of a conversion."""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import psutil
+from hdmf.container import AbstractContainer
+from hdmf.data_utils import AbstractDataChunkIterator, DataIO
+from neuroconv.utils import FilePathType
+
+PERFORMANCE_REPORT_VERSION = 1
+
+
+def get_default_performance_report_file_path(nwbfile_path: FilePathType) -> Path:
+    """The report is saved next to the NWB file, e.g., 'session.nwb' is described by 'session.performance.json'."""
+    return Path(nwbfile_path).with_suffix(".performance.json")
+
+
+class _PeakRSSSampler:
+    """Tracks the peak resident memory of the process from a background thread."""
+
+    def __init__(self, process: psutil.Process, sampling_interval: float = 0.01):
+        self.process = process
+        self.sampling_interval = sampling_interval
+        self.peak_rss = process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stop.wait(timeout=self.sampling_interval):
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def stop(self) -> int:
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+        return self.peak_rss
+
+
+class PerformanceReport:
+    """
+    Accumulates measurements of a conversion, per interface and per phase, for a structured JSON report.
+
+    The phases of each interface are 'init' (constructing the interface), 'metadata' (`get_metadata`),
+    'object_construction' (`run_conversion`, adding its objects to the in-memory NWBFile) and 'data_write' (reading
+    and writing the buffers of its DataChunkIterators). Phases of the conversion as a whole, such as the 'write' of
+    the entire file, are recorded separately.
+
+    Each phase records its wall time in 'seconds', the 'bytes_read' and 'bytes_written' by the process (as counted by
+    the operating system, so including files of other threads and excluding memory-mapped access), and the
+    'peak_rss_mb' of the process while it ran. The 'data_write' phase also records the number of buffers and chunks,
+    the size of the data in memory, and the time spent reading the sources apart from compressing and writing.
+    """
+
+    def __init__(self):
+        self._process = psutil.Process()
+        self.interfaces = dict()
+        self.phases = dict()
+        self.metadata = dict()
+        self._pending_buffer = None  # The last buffer returned by an iterator; written before the next is requested
+
+    def get_io_counters(self) -> Tuple[int, int]:
+        """The bytes read and written by the process so far, or zeros where the platform does not count them."""
+        try:
+            io_counters = self._process.io_counters()
+        except (AttributeError, psutil.Error):
+            return 0, 0
+        # On Linux, the 'chars' include reads served from the page cache, as for repeated reads of the same files
+        return (
+            getattr(io_counters, "read_chars", io_counters.read_bytes),
+            getattr(io_counters, "write_chars", io_counters.write_bytes),
+        )
+
+    def _get_record(self, phase: str, name: Optional[str] = None) -> dict:
+        records = self.phases if name is None else self.interfaces.setdefault(name, dict())
+        return records.setdefault(phase, dict(seconds=0.0, bytes_read=0, bytes_written=0, peak_rss_mb=0.0))
+
+    def start(self, phase: str, name: Optional[str] = None) -> dict:
+        """Begin measuring a phase of the conversion, or of the interface called `name`; see `stop`."""
+        bytes_read, bytes_written = self.get_io_counters()
+        return dict(
+            phase=phase,
+            name=name,
+            start_time=time.perf_counter(),
+            bytes_read=bytes_read,
+            bytes_written=bytes_written,
+            sampler=_PeakRSSSampler(process=self._process),
+        )
+
+    def stop(self, measurement: dict):
+        """Add a measurement begun by `start` to the record of its phase."""
+        seconds = time.perf_counter() - measurement["start_time"]
+        peak_rss = measurement["sampler"].stop()
+        bytes_read, bytes_written = self.get_io_counters()
+
+        record = self._get_record(phase=measurement["phase"], name=measurement["name"])
+        record["seconds"] += seconds
+        record["bytes_read"] += bytes_read - measurement["bytes_read"]
+        record["bytes_written"] += bytes_written - measurement["bytes_written"]
+        record["peak_rss_mb"] = max(record["peak_rss_mb"], peak_rss / 1e6)
+
+    @contextmanager
+    def measure(self, phase: str, name: Optional[str] = None):
+        """Measure the enclosed phase of the conversion, or of the interface called `name`."""
+        measurement = self.start(phase=phase, name=name)
+        try:
+            yield
+        finally:
+            self.stop(measurement=measurement)
+
+    def record_buffer_read(self, name: str, seconds: float, bytes_read: int, num_bytes: int, num_chunks: int):
+        """Record a buffer read by an iterator of the interface called `name`, which is then about to be written."""
+        record = self._get_record(phase="data_write", name=name)
+        for key in ["read_seconds", "num_buffers", "num_chunks", "data_bytes"]:
+            record.setdefault(key, 0)
+        record["seconds"] += seconds
+        record["read_seconds"] += seconds
+        record["bytes_read"] += bytes_read
+        record["num_buffers"] += 1
+        record["num_chunks"] += num_chunks
+        record["data_bytes"] += num_bytes
+        record["peak_rss_mb"] = max(record["peak_rss_mb"], self._process.memory_info().rss / 1e6)
+
+        bytes_read, bytes_written = self.get_io_counters()
+        self._pending_buffer = dict(
+            name=name, start_time=time.perf_counter(), bytes_read=bytes_read, bytes_written=bytes_written
+        )
+
+    def record_buffer_write(self):
+        """
+        Record the writing of the last buffer read, if any.
+
+        HDMF writes every buffer before requesting another from any iterator, so the time until the next request
+        is spent compressing and writing that buffer.
+        """
+        if self._pending_buffer is None:
+            return
+        pending_buffer, self._pending_buffer = self._pending_buffer, None
+        seconds = time.perf_counter() - pending_buffer["start_time"]
+        bytes_read, bytes_written = self.get_io_counters()
+
+        record = self._get_record(phase="data_write", name=pending_buffer["name"])
+        record.setdefault("write_seconds", 0.0)
+        record["seconds"] += seconds
+        record["write_seconds"] += seconds
+        record["bytes_read"] += bytes_read - pending_buffer["bytes_read"]
+        record["bytes_written"] += bytes_written - pending_buffer["bytes_written"]
+
+    def to_dict(self) -> dict:
+        """The report, with the throughput of each phase in 'mb_per_second'."""
+
+        def with_throughput(record: dict) -> dict:
+            # The data in memory for the data writes; otherwise the larger of the bytes read and written
+            num_bytes = record.get("data_bytes", max(record["bytes_read"], record["bytes_written"]))
+            return dict(record, mb_per_second=num_bytes / 1e6 / record["seconds"] if record["seconds"] else None)
+
+        return dict(
+            version=PERFORMANCE_REPORT_VERSION,
+            **self.metadata,
+            phases={phase: with_throughput(record) for phase, record in self.phases.items()},
+            interfaces={
+                name: {phase: with_throughput(record) for phase, record in records.items()}
+                for name, records in self.interfaces.items()
+            },
+        )
+
+    def save(self, file_path: FilePathType):
+        with open(file=file_path, mode="w") as file:
+            json.dump(obj=self.to_dict(), fp=file, indent=2)
+
+
+class MeasuredDataChunkIteratorMixin:
+    """Mixin for GenericDataChunkIterators that records the reading and writing of each buffer in a PerformanceReport."""
+
+    performance_report: Optional[PerformanceReport] = None
+    performance_key: Optional[str] = None
+
+    def __next__(self):
+        if self.performance_report is None:
+            return super().__next__()
+
+        self.performance_report.record_buffer_write()
+        start_time = time.perf_counter()
+        start_bytes_read, _ = self.performance_report.get_io_counters()
+        data_chunk = super().__next__()  # StopIteration once every buffer is written
+        bytes_read, _ = self.performance_report.get_io_counters()
+
+        num_chunks = int(
+            np.prod(
+                [
+                    -(-(selection.stop - selection.start) // chunk_length)
+                    for selection, chunk_length in zip(data_chunk.selection, self.chunk_shape)
+                ]
+            )
+        )
+        self.performance_report.record_buffer_read(
+            name=self.performance_key,
+            seconds=time.perf_counter() - start_time,
+            bytes_read=bytes_read - start_bytes_read,
+            num_bytes=data_chunk.data.nbytes,
+            num_chunks=num_chunks,
+        )
+        return data_chunk
+
+
+def attach_performance_report(containers: Iterable[AbstractContainer], performance_report: PerformanceReport, key: str):
+    """Record the buffers of every measured iterator among the fields of the containers under `key`."""
+    for container in containers:
+        for value in container.fields.values():
+            data = value.data if isinstance(value, DataIO) else value
+            if isinstance(data, AbstractDataChunkIterator) and isinstance(data, MeasuredDataChunkIteratorMixin):
+                data.performance_report = performance_report
+                data.performance_key = key
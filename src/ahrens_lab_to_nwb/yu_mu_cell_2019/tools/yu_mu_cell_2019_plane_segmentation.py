@@ -0,0 +1,72 @@
+"""Columnar construction of PlaneSegmentation tables from ragged voxel masks."""
+from typing import Optional
+
+import numpy as np
+from numpy.typing import ArrayLike
+from pynwb.ophys import ImageSegmentation, ImagingPlane, PlaneSegmentation, TwoPhotonSeries
+from hdmf.common import VectorData, VectorIndex
+
+from .yu_mu_cell_2019_compression import wrap_data
+
+# Shared by every writer of the 'ophys' processing module, so that it is described the same way whichever creates it
+OPHYS_MODULE_DESCRIPTION = "Processed data for the optical physiology."
+
+VOXEL_MASK_DTYPE = np.dtype([("x", "uint32"), ("y", "uint32"), ("z", "uint32"), ("weight", "float32")])
+
+
+def create_plane_segmentation_from_ragged_voxel_masks(
+    image_segmentation: ImageSegmentation,
+    name: str,
+    description: str,
+    imaging_plane: ImagingPlane,
+    reference_images: TwoPhotonSeries,
+    roi_ids: ArrayLike,
+    pixel_masks: np.ndarray,
+    offsets: np.ndarray,
+    compression_options: Optional[dict] = None,
+) -> PlaneSegmentation:
+    """
+    Create a PlaneSegmentation whose 'voxel_mask' and 'id' columns are filled in one operation.
+
+    Parameters
+    ----------
+    image_segmentation : ImageSegmentation
+        The container to create the PlaneSegmentation in.
+    name : str
+        The name of the PlaneSegmentation.
+    description : str
+        The description of the PlaneSegmentation.
+    imaging_plane : ImagingPlane
+        The ImagingPlane the ROIs apply to.
+    reference_images : TwoPhotonSeries
+        The series the masks apply to.
+    roi_ids : array-like of int
+        The ID of each ROI.
+    pixel_masks : numpy.ndarray
+        Array of shape (total_num_voxels, 4) holding the (x, y, z, weight) of every voxel of every ROI.
+    offsets : numpy.ndarray
+        Array of length len(roi_ids) + 1; the voxels of the i-th ROI are pixel_masks[offsets[i] : offsets[i + 1]].
+    compression_options : dict, optional
+        Compression options (see `get_compression_options`) of the voxel mask column and its index.
+        If not specified, the columns are written without chunking or compression.
+    """
+    assert len(offsets) == len(roi_ids) + 1, "There must be exactly one more offset than ROI ids!"
+
+    voxel_masks = np.empty(shape=len(pixel_masks), dtype=VOXEL_MASK_DTYPE)
+    for axis, field_name in enumerate(VOXEL_MASK_DTYPE.names):
+        voxel_masks[field_name] = pixel_masks[:, axis]
+    voxel_mask_index_data = np.asarray(offsets[1:], dtype="uint64")
+    if compression_options is not None:
+        voxel_masks = wrap_data(voxel_masks, compression_options=compression_options)
+        voxel_mask_index_data = wrap_data(voxel_mask_index_data, compression_options=compression_options)
+
+    voxel_mask = VectorData(name="voxel_mask", description="Voxel masks for each ROI", data=voxel_masks)
+    voxel_mask_index = VectorIndex(name="voxel_mask_index", data=voxel_mask_index_data, target=voxel_mask)
+    return image_segmentation.create_plane_segmentation(
+        name=name,
+        description=description,
+        imaging_plane=imaging_plane,
+        reference_images=reference_images,
+        id=np.asarray(roi_ids, dtype="int64"),
+        columns=[voxel_mask, voxel_mask_index],
+    )
@@ -0,0 +1,272 @@
+"""Summary images of the imaging data, accumulated in the same pass that streams its frames to the NWB file."""
+from typing import Iterable, List, Optional
+from warnings import warn
+
+import numpy as np
+from hdmf.container import AbstractContainer
+from hdmf.data_utils import DataIO
+from neuroconv.tools.nwb_helpers import get_module
+from neuroconv.utils import FilePathType
+from pynwb import NWBFile
+
+from .yu_mu_cell_2019_compression import wrap_data
+from .yu_mu_cell_2019_plane_segmentation import OPHYS_MODULE_DESCRIPTION
+
+# The statistics are updated over blocks of rows of this many bytes (as float32), bounding their temporary arrays
+UPDATE_BLOCK_BYTES = 16 * 1024**2
+
+
+class SummaryImageAccumulator:
+    """
+    Per-voxel running statistics of the frames of a series, updated as each buffer is read to be written.
+
+    The mean and variance are updated one frame at a time (Welford's algorithm) and stored as float32, along with the
+    maximum in the dtype of the frames. With `frames_per_bin`, a low-resolution copy of the series is also accumulated,
+    averaging consecutive bins of frames and square blocks of `pixels_per_bin` pixels of every plane.
+
+    The buffers must be read in order, and only once; if any is skipped (e.g., when resuming an interrupted write), the
+    accumulator is incomplete and its images are not written.
+    """
+
+    def __init__(
+        self,
+        series_name: str,
+        num_frames: int,
+        frame_shape: tuple,
+        dtype: np.dtype,
+        summary_images: bool = True,
+        frames_per_bin: Optional[int] = None,
+        pixels_per_bin: int = 1,
+        compression_options: Optional[dict] = None,
+    ):
+        """
+        Parameters
+        ----------
+        series_name : str
+            The name of the TwoPhotonSeries in the acquisition of the NWBFile.
+        num_frames : int
+            The number of frames of the series.
+        frame_shape : tuple
+            The shape of each frame, as (rows, columns, planes).
+        dtype : np.dtype
+            The dtype of the frames.
+        summary_images : bool, default: True
+            Whether to accumulate the mean, maximum and variance of every voxel.
+        frames_per_bin : int, optional
+            If specified, also accumulate a series binned over this many frames.
+        pixels_per_bin : int, default: 1
+            The side of the square blocks of pixels averaged by the binned series.
+        compression_options : dict, optional
+            Compression options (see `get_compression_options`) of the images and the binned series.
+        """
+        assert summary_images or frames_per_bin, "Either 'summary_images' or 'frames_per_bin' must be specified!"
+        assert frames_per_bin is None or frames_per_bin > 0, f"'frames_per_bin' ({frames_per_bin}) must be positive!"
+        assert pixels_per_bin > 0, f"'pixels_per_bin' ({pixels_per_bin}) must be positive!"
+        self.series_name = series_name
+        self.num_frames = num_frames
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.summary_images = summary_images
+        self.frames_per_bin = frames_per_bin
+        self.pixels_per_bin = pixels_per_bin
+        self.compression_options = compression_options
+
+        self.num_accumulated_frames = 0
+        self._is_in_order = True
+        # Allocated with the first frames, so that constructing the accumulator holds no memory
+        self._mean = None
+        self._sum_of_squares = None  # Of the deviations from the mean
+        self._max = None
+        self._binned_sum = None
+
+    @property
+    def num_bins(self) -> int:
+        return 0 if self.frames_per_bin is None else -(-self.num_frames // self.frames_per_bin)
+
+    @property
+    def binned_frame_shape(self) -> tuple:
+        num_rows, num_columns, num_planes = self.frame_shape
+        return -(-num_rows // self.pixels_per_bin), -(-num_columns // self.pixels_per_bin), num_planes
+
+    @property
+    def nbytes(self) -> int:
+        """The memory held by the statistics once allocated."""
+        num_bytes = 0
+        if self.summary_images:
+            num_bytes += int(np.prod(self.frame_shape)) * (2 * 4 + self.dtype.itemsize)
+        if self.frames_per_bin is not None:
+            num_bytes += self.num_bins * int(np.prod(self.binned_frame_shape)) * 4
+        return num_bytes
+
+    @property
+    def is_complete(self) -> bool:
+        return self._is_in_order and self.num_accumulated_frames == self.num_frames
+
+    def add_frames(self, frames: np.ndarray, start_frame: int):
+        """Update the statistics with the frames (frames, rows, columns, planes) starting at `start_frame`."""
+        if start_frame != self.num_accumulated_frames:
+            self._is_in_order = False
+        if not self._is_in_order:
+            return
+
+        if self._mean is None and self.summary_images:
+            self._mean = np.zeros(shape=self.frame_shape, dtype="float32")
+            self._sum_of_squares = np.zeros(shape=self.frame_shape, dtype="float32")
+            self._max = np.full(shape=self.frame_shape, fill_value=_get_min_value(dtype=self.dtype), dtype=self.dtype)
+        if self._binned_sum is None and self.frames_per_bin is not None:
+            self._binned_sum = np.zeros(shape=(self.num_bins,) + self.binned_frame_shape, dtype="float32")
+
+        for frame_offset, frame in enumerate(frames):
+            frame_index = start_frame + frame_offset
+            if self.summary_images:
+                self._update_statistics(frame=frame, num_frames=frame_index + 1)
+            if self.frames_per_bin is not None:
+                self._binned_sum[frame_index // self.frames_per_bin] += self._bin_pixels(frame=frame)
+        self.num_accumulated_frames += len(frames)
+
+    def _update_statistics(self, frame: np.ndarray, num_frames: int):
+        num_rows = self.frame_shape[0]
+        block_rows = max(1, UPDATE_BLOCK_BYTES // (4 * int(np.prod(self.frame_shape[1:]))))
+        deviation = np.empty(shape=(block_rows,) + self.frame_shape[1:], dtype="float32")
+        update = np.empty_like(deviation)
+        for start_row in range(0, num_rows, block_rows):
+            rows = slice(start_row, min(start_row + block_rows, num_rows))
+            block_deviation, block_update = deviation[: rows.stop - rows.start], update[: rows.stop - rows.start]
+            mean, block = self._mean[rows], frame[rows]
+
+            np.subtract(block, mean, out=block_deviation)
+            np.divide(block_deviation, num_frames, out=block_update)
+            mean += block_update
+            np.subtract(block, mean, out=block_update)
+            block_update *= block_deviation
+            self._sum_of_squares[rows] += block_update
+            np.maximum(self._max[rows], block, out=self._max[rows])
+
+    def _bin_pixels(self, frame: np.ndarray) -> np.ndarray:
+        if self.pixels_per_bin == 1:
+            return frame
+        num_rows, num_columns, _ = self.frame_shape
+        row_starts = np.arange(0, num_rows, self.pixels_per_bin)
+        column_starts = np.arange(0, num_columns, self.pixels_per_bin)
+        binned_frame = np.add.reduceat(frame, row_starts, axis=0, dtype="float32")
+        binned_frame = np.add.reduceat(binned_frame, column_starts, axis=1)
+        row_counts = np.diff(np.append(row_starts, num_rows))
+        column_counts = np.diff(np.append(column_starts, num_columns))
+        return binned_frame / np.multiply.outer(row_counts, column_counts)[:, :, np.newaxis]
+
+    def add_to_nwbfile(self, nwbfile: NWBFile):
+        """Add the images, and the binned series, to the 'ophys' processing module of the NWBFile of the series."""
+        from pynwb.base import Images
+        from pynwb.image import GrayscaleImage
+        from pynwb.ophys import TwoPhotonSeries
+
+        assert self.is_complete, f"The summary images of '{self.series_name}' have not seen every frame of the series!"
+        two_photon_series = nwbfile.acquisition[self.series_name]
+        ophys = get_module(nwbfile=nwbfile, name="ophys", description=OPHYS_MODULE_DESCRIPTION)
+
+        if self.summary_images:
+            variance = self._sum_of_squares / np.float32(max(self.num_frames, 1))
+            images = list()
+            for statistic, volume in [("mean", self._mean), ("max", self._max), ("variance", variance)]:
+                for plane_index in range(self.frame_shape[2]):
+                    images.append(
+                        GrayscaleImage(
+                            name=f"{statistic}_plane_{plane_index:02d}",
+                            data=self._wrap(np.ascontiguousarray(volume[:, :, plane_index])),
+                            description=f"The {statistic} of plane {plane_index} over the {self.num_frames} frames.",
+                        )
+                    )
+            ophys.add(
+                Images(
+                    name=f"{self.series_name}SummaryImages",
+                    images=images,
+                    description=f"The per-voxel mean, maximum and (population) variance of {self.series_name}.",
+                )
+            )
+
+        if self.frames_per_bin is not None:
+            frames_per_bin = np.diff(np.append(np.arange(0, self.num_frames, self.frames_per_bin), self.num_frames))
+            binned_data = self._binned_sum / frames_per_bin.astype("float32")[:, np.newaxis, np.newaxis, np.newaxis]
+            timing_kwargs = dict()
+            if two_photon_series.rate is not None:
+                timing_kwargs.update(
+                    starting_time=two_photon_series.starting_time, rate=two_photon_series.rate / self.frames_per_bin
+                )
+            else:
+                timing_kwargs.update(timestamps=two_photon_series.timestamps[:][:: self.frames_per_bin])
+            ophys.add(
+                TwoPhotonSeries(
+                    name=f"{self.series_name}Binned",
+                    description=(
+                        f"{self.series_name} averaged over bins of {self.frames_per_bin} frames and of "
+                        f"{self.pixels_per_bin}x{self.pixels_per_bin} pixels of every plane, timed by the first "
+                        "frame of each bin."
+                    ),
+                    data=self._wrap(binned_data),
+                    imaging_plane=two_photon_series.imaging_plane,
+                    unit=two_photon_series.unit,
+                    dimension=list(self.binned_frame_shape),
+                    **timing_kwargs,
+                )
+            )
+
+    def _wrap(self, data: np.ndarray):
+        return (
+            data if self.compression_options is None else wrap_data(data, compression_options=self.compression_options)
+        )
+
+
+def _get_min_value(dtype: np.dtype):
+    return np.iinfo(dtype).min if np.issubdtype(dtype, np.integer) else -np.inf
+
+
+def find_summary_image_accumulators(containers: Iterable[AbstractContainer]) -> List[SummaryImageAccumulator]:
+    """The accumulators of every iterator among the fields of the containers."""
+    accumulators = list()
+    for container in containers:
+        for value in container.fields.values():
+            data = value.data if isinstance(value, DataIO) else value
+            accumulator = getattr(data, "summary_accumulator", None)
+            if isinstance(accumulator, SummaryImageAccumulator):
+                accumulators.append(accumulator)
+    return accumulators
+
+
+def write_summary_images(
+    nwbfile_path: FilePathType, accumulators: List[SummaryImageAccumulator], backend: str = "hdf5"
+) -> List[str]:
+    """
+    Append the summary images of the accumulators to a written NWB file.
+
+    The images are only known once every frame has been written, so they are added to the file afterwards. The
+    accumulators that have not seen every frame of their series are skipped with a warning.
+
+    Returns
+    -------
+    series_names : list of str
+        The names of the series whose summary images were written.
+    """
+    complete_accumulators = list()
+    for accumulator in accumulators:
+        if accumulator.is_complete:
+            complete_accumulators.append(accumulator)
+        else:
+            warn(
+                f"Only {accumulator.num_accumulated_frames} of the {accumulator.num_frames} frames of "
+                f"'{accumulator.series_name}' were read in order (e.g., the write was resumed); "
+                "its summary images are not written."
+            )
+    if not complete_accumulators:
+        return list()
+
+    if backend == "zarr":
+        from hdmf_zarr.nwb import NWBZarrIO as NWBIO
+    else:
+        from pynwb import NWBHDF5IO as NWBIO
+
+    with NWBIO(path=str(nwbfile_path), mode="a") as io:
+        nwbfile = io.read()
+        for accumulator in complete_accumulators:
+            accumulator.add_to_nwbfile(nwbfile=nwbfile)
+        io.write(nwbfile)
+    return [accumulator.series_name for accumulator in complete_accumulators]
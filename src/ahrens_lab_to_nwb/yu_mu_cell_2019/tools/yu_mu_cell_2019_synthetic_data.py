@@ -0,0 +1,321 @@
+"""Generation of synthetic sessions laid out and formatted like the source data of the Yu Mu 2019 Cell paper."""
+from pathlib import Path
+from typing import Optional, Tuple
+
+import h5py
+import numpy as np
+from scipy.io import savemat
+from neuroconv.utils import FilePathType, FolderPathType
+
+from .yu_mu_cell_2019_matlab_half_precision import HALF_PRECISION_PROPERTY_NAME, MCOS_MAGIC_NUMBER
+
+SINGLE_COLOR_FRAME_SHAPE = (29, 888, 2048)
+DUAL_COLOR_FRAME_SHAPE = (29, 2048, 2048)
+RAW_BEHAVIOR_CHANNELS = [
+    "ch1",
+    "ch2",
+    "ch3",
+    "stimVelTotal",
+    "stimVelNull",
+    "stimGain",
+    "stimID",
+    "stimParam3",
+    "stimParam4",
+    "stimParam5",
+]
+
+
+def write_synthetic_frames(
+    folder_path: FolderPathType,
+    num_frames: int,
+    frame_shape: Tuple[int, int, int] = SINGLE_COLOR_FRAME_SHAPE,
+    seed: int = 0,
+):
+    """
+    Write one 'TM#####_CM0_CHN00.h5' file per frame, each holding a (planes, columns, rows) int16 'default' volume.
+
+    The volumes are a fixed background with a few percent of noise, which compresses about as well as the
+    microscope data; the files themselves are written without compression, as by the acquisition software.
+    """
+    folder_path = Path(folder_path)
+    folder_path.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed=seed)
+    background = rng.integers(low=80, high=400, size=frame_shape, dtype="int16")
+    for frame_index in range(num_frames):
+        noise = rng.integers(low=-8, high=9, size=frame_shape, dtype="int16")
+        with h5py.File(name=folder_path / f"TM{frame_index:05d}_CM0_CHN00.h5", mode="w") as file:
+            file.create_dataset(name="default", data=background + noise)
+
+
+def write_synthetic_segmentation(
+    file_path: FilePathType,
+    session_type: str,
+    num_rois: int,
+    num_frames: int,
+    image_shape: Optional[Tuple[int, int, int]] = None,
+    max_num_pixels: int = 64,
+    half_precision: bool = False,
+    seed: int = 0,
+):
+    """
+    Write a MATLAB (v7.3) segmentation file of a single-color ('Cells*_clean.mat') or dual-color ('cells*.mat') session.
+
+    Parameters
+    ----------
+    file_path : FilePathType
+    session_type : str
+        Either 'single_color', with 'Cell_X'/'Cell_baseline'/'Cell_timesers' datasets,
+        or 'dual_color', with 'x'/'baseline'/'timeseries' datasets.
+    num_rois : int
+    num_frames : int
+        The number of samples of each trace.
+    image_shape : tuple of int, optional
+        The (x, y, z) extent of the 1-based voxel coordinates. Defaults to that of the session type.
+    max_num_pixels : int, default: 64
+        The number of rows of the coordinate arrays; each ROI uses a random number of them, the rest being padded
+        with zeros or NaN.
+    half_precision : bool, default: False
+        Store the traces as MATLAB 'half' objects in the '#subsystem#/MCOS' cell, as in some of the sessions.
+    seed : int, default: 0
+    """
+    assert session_type in ["single_color", "dual_color"], f"Unknown session type '{session_type}'!"
+    if session_type == "single_color":
+        mask_names, baseline_name, timeseries_name = ["Cell_X", "Cell_Y", "Cell_Z"], "Cell_baseline", "Cell_timesers"
+        image_shape = image_shape or (888, 2048, 29)
+    else:
+        mask_names, baseline_name, timeseries_name = ["x", "y", "z"], "baseline", "timeseries"
+        image_shape = image_shape or (2048, 2048, 29)
+    rng = np.random.default_rng(seed=seed)
+
+    # MATLAB writes column-major arrays, so each (num_pixels, num_rois) array is stored as (max_num_pixels, num_rois)
+    num_pixels = rng.integers(low=1, high=max_num_pixels + 1, size=num_rois)
+    is_padding = np.arange(max_num_pixels)[:, np.newaxis] >= num_pixels
+    centers = np.stack([rng.integers(low=1, high=extent + 1, size=num_rois) for extent in image_shape])
+    baseline = rng.uniform(low=100.0, high=1000.0, size=(1, num_rois))
+    # Traces are (num_rois, num_frames) in MATLAB, so each frame is a contiguous row of the HDF5 dataset
+    traces = dict(
+        baseline=(baseline + rng.normal(scale=5.0, size=(num_frames, num_rois))).astype("float32"),
+        timeseries=rng.gamma(shape=1.0, scale=0.2, size=(num_frames, num_rois)).astype("float32"),
+    )
+
+    with h5py.File(name=file_path, mode="w") as file:
+        for axis, mask_name in enumerate(mask_names):
+            offsets = rng.integers(low=-3, high=4, size=(max_num_pixels, num_rois))
+            coordinates = np.clip(centers[axis] + offsets, 1, image_shape[axis]).astype("float64")
+            coordinates[is_padding] = np.nan if session_type == "single_color" else 0
+            file.create_dataset(name=mask_name, data=coordinates)
+
+        if half_precision:
+            _write_matlab_half_precision_datasets(
+                file=file,
+                datasets={baseline_name: traces["baseline"], timeseries_name: traces["timeseries"]},
+            )
+        else:
+            file.create_dataset(name=baseline_name, data=traces["baseline"])
+            file.create_dataset(name=timeseries_name, data=traces["timeseries"])
+
+
+def _write_matlab_half_precision_datasets(file: h5py.File, datasets: dict):
+    """
+    Write each array as a MATLAB 'half' object, in the layout read by `resolve_matlab_half_precision_dataset`.
+
+    The coded values of the i-th object are the (i + 2)-th element of the MCOS cell, after the 'FileWrapper__'
+    metadata and the empty canonical element.
+    """
+    references_group = file.create_group(name="#refs#")
+    names = f"{HALF_PRECISION_PROPERTY_NAME}\x00half\x00".encode()
+    names += b"\x00" * (-len(names) % 8)
+    # A placeholder, then the class 'half' (name 2) outside of any package
+    class_segment = np.array([0, 0, 0, 0, 0, 2, 0, 0], dtype="<u4").tobytes()
+    object_records = [np.zeros(shape=6, dtype="<u4")]
+    property_sets = [np.zeros(shape=2, dtype="<u4")]
+    mcos_cell = list()
+    for object_id, (dataset_name, data) in enumerate(datasets.items(), start=1):
+        object_records.append(np.array([1, 0, 0, 0, object_id, object_id], dtype="<u4"))
+        # One property, 'codedValue' (name 1), stored in the MCOS cell (type 1) at value index (object_id - 1)
+        property_sets.append(np.array([1, 1, 1, object_id - 1], dtype="<u4"))
+
+        coded_dataset = references_group.create_dataset(
+            name=f"coded{object_id}", data=data.astype("float16").view("uint16")
+        )
+        mcos_cell.append(coded_dataset.ref)
+        handle = file.create_dataset(
+            name=dataset_name, data=np.array([[MCOS_MAGIC_NUMBER, 2, 1, 1, object_id, 1]], dtype="uint32")
+        )
+        handle.attrs["MATLAB_class"] = np.bytes_("half")
+    object_segment = np.concatenate(object_records).tobytes()
+    property_segment = np.concatenate(property_sets).tobytes()
+
+    names_end = 40 + len(names)
+    class_end = names_end + len(class_segment)
+    object_end = class_end + len(object_segment)
+    property_end = object_end + len(property_segment)
+    header = np.array(
+        [3, 2, names_end, class_end, class_end, object_end, property_end, property_end, property_end, property_end],
+        dtype="<u4",
+    )
+    metadata = header.tobytes() + names + class_segment + object_segment + property_segment
+    references_group.create_dataset(name="metadata", data=np.frombuffer(metadata, dtype="uint8"))
+    references_group.create_dataset(name="canonical", data=np.zeros(shape=2, dtype="uint8"))
+
+    mcos_cell = [references_group["metadata"].ref, references_group["canonical"].ref] + mcos_cell
+    file.create_group(name="#subsystem#").create_dataset(
+        name="MCOS", data=np.array([mcos_cell], dtype=h5py.special_dtype(ref=h5py.Reference))
+    )
+
+
+def write_synthetic_behavior(
+    folder_path: FolderPathType, num_samples: int, num_frames: int, num_swims: Optional[int] = None, seed: int = 0
+):
+    """
+    Write the 'rawdata.mat', 'data.mat', 'trial_info.mat' and 'ch*State.mat' files of an 'ephys' folder.
+
+    The frame tracker ('data/frame') toggles at a regular interval so that the frame timestamps derived from it
+    cover exactly `num_frames` frames.
+
+    Parameters
+    ----------
+    folder_path : FolderPathType
+    num_samples : int
+        The number of samples of every behavior channel.
+    num_frames : int
+        The number of imaging frames captured during the recording.
+    num_swims : int, optional
+        The number of swim bouts and of each type of activity state. Defaults to one per 2000 samples.
+    seed : int, default: 0
+    """
+    folder_path = Path(folder_path)
+    folder_path.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed=seed)
+    num_swims = num_swims or max(1, num_samples // 2000)
+    samples_per_frame = num_samples // (num_frames + 2)
+    assert samples_per_frame > 0, f"{num_samples} samples cannot hold a frame tracker for {num_frames} frames!"
+
+    with h5py.File(name=folder_path / "rawdata.mat", mode="w") as file:
+        for channel_name in RAW_BEHAVIOR_CHANNELS:
+            file.create_dataset(
+                name=f"rawdata/{channel_name}", data=rng.normal(size=(1, num_samples)).astype("float32")
+            )
+
+    swim_starts, swim_stops = _get_synthetic_intervals(rng=rng, num_samples=num_samples, num_intervals=num_swims)
+    with h5py.File(name=folder_path / "data.mat", mode="w") as file:
+        frame_numbers = np.minimum(np.arange(num_samples) // samples_per_frame, num_frames + 1)
+        frame = (frame_numbers % 2).astype("float64")
+        file.create_dataset(name="data/frame", data=frame[np.newaxis])
+        for channel_name in ["fltCh1", "fltCh2"]:
+            file.create_dataset(name=f"data/{channel_name}", data=rng.normal(size=(1, num_samples)))
+        file.create_dataset(name="data/swimStartIndT", data=swim_starts[np.newaxis])
+        file.create_dataset(name="data/swimEndIndT", data=swim_stops[np.newaxis])
+        file.create_dataset(name="data/swimPower__", data=rng.gamma(shape=2.0, size=(1, num_swims)))
+        file.create_dataset(name="data/swimWidth", data=rng.gamma(shape=2.0, size=(1, num_swims)))
+        file.create_dataset(name="data/burstBothIndT", data=np.sort(rng.choice(swim_starts, size=num_swims // 2))[None])
+
+    # The MATLAB (v5) files below are read with scipy.io.loadmat
+    trial_bounds = np.linspace(start=0, stop=num_samples, num=max(2, num_swims // 10) + 1).astype("int64")
+    trial_types = rng.choice([1, 2, 3], size=len(trial_bounds) - 1)
+    savemat(
+        file_name=folder_path / "trial_info.mat",
+        mdict=dict(trial_info=np.stack([trial_bounds[:-1], trial_bounds[1:], trial_types], axis=1)),
+    )
+    for channel_name in ["ch1", "ch2"]:
+        for state_name in ["active", "passive", "transient"]:
+            starts, stops = _get_synthetic_intervals(rng=rng, num_samples=num_samples, num_intervals=num_swims)
+            savemat(
+                file_name=folder_path / f"{channel_name}{state_name}State.mat",
+                mdict={f"{state_name}State": dict(start=starts[np.newaxis], end=stops[np.newaxis])},
+            )
+
+
+def _get_synthetic_intervals(rng: np.random.Generator, num_samples: int, num_intervals: int) -> Tuple[np.ndarray]:
+    starts = np.sort(rng.choice(num_samples - 1, size=num_intervals, replace=num_intervals >= num_samples - 1))
+    stops = np.minimum(starts + rng.integers(low=1, high=500, size=num_intervals), num_samples - 1)
+    return starts.astype("float64"), stops.astype("float64")
+
+
+def write_synthetic_session(
+    data_folder_path: FolderPathType,
+    session_name: str,
+    session_type: str,
+    num_frames: int = 10,
+    frame_shape: Optional[Tuple[int, int, int]] = None,
+    num_rois: int = 1000,
+    num_samples: Optional[int] = None,
+    half_precision: bool = False,
+    seed: int = 0,
+) -> dict:
+    """
+    Write every source file of a synthetic session at the locations expected by `get_session_paths`.
+
+    Parameters
+    ----------
+    data_folder_path : FolderPathType
+        The folder in which to create the 'Imaging' and 'Segmentation' folders.
+    session_name : str
+        For example, '20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241'.
+    session_type : str
+        Either 'single_color' or 'dual_color'. Single-color sessions have the segmentation of both populations.
+    num_frames : int, default: 10
+        The number of frame files, and of samples of each trace.
+    frame_shape : tuple of int, optional
+        The (planes, columns, rows) shape of each frame. Defaults to the full size for the session type.
+    num_rois : int, default: 1000
+        The number of ROIs of each segmentation.
+    num_samples : int, optional
+        The number of samples of each behavior channel. Defaults to that of a recording at 6 kHz during the frames.
+    half_precision : bool, default: False
+        Store the traces as MATLAB 'half' objects.
+    seed : int, default: 0
+
+    Returns
+    -------
+    session_paths : dict
+        The paths returned by `get_session_paths`.
+    """
+    from ..yu_mu_cell_2019_convert_session import get_session_paths
+
+    frame_shape = frame_shape or (
+        SINGLE_COLOR_FRAME_SHAPE if session_type == "single_color" else DUAL_COLOR_FRAME_SHAPE
+    )
+    num_samples = num_samples or (num_frames + 2) * 2000
+    image_shape = (frame_shape[1], frame_shape[2], frame_shape[0])
+    if session_type == "single_color":
+        segmentation_file_paths = [
+            get_session_paths(
+                session_name=session_name,
+                data_folder_path=data_folder_path,
+                session_type=session_type,
+                cell_type=cell_type,
+            )["segmentation_file_path"]
+            for cell_type in ["neuron", "glia"]
+        ]
+    else:
+        session_paths = get_session_paths(
+            session_name=session_name, data_folder_path=data_folder_path, session_type=session_type
+        )
+        segmentation_file_paths = [
+            session_paths["neuron_segmentation_file_path"],
+            session_paths["glia_segmentation_file_path"],
+        ]
+        image_shape = (frame_shape[1] // 2, frame_shape[2], frame_shape[0])  # Each population is one half
+    session_paths = get_session_paths(
+        session_name=session_name, data_folder_path=data_folder_path, session_type=session_type
+    )
+
+    write_synthetic_frames(
+        folder_path=session_paths["imaging_folder_path"], num_frames=num_frames, frame_shape=frame_shape, seed=seed
+    )
+    for index, segmentation_file_path in enumerate(segmentation_file_paths):
+        segmentation_file_path.parent.mkdir(parents=True, exist_ok=True)
+        write_synthetic_segmentation(
+            file_path=segmentation_file_path,
+            session_type=session_type,
+            num_rois=num_rois,
+            num_frames=num_frames,
+            image_shape=image_shape,
+            half_precision=half_precision,
+            seed=seed + 1 + index,
+        )
+    write_synthetic_behavior(
+        folder_path=session_paths["states_folder_path"], num_samples=num_samples, num_frames=num_frames, seed=seed
+    )
+    return session_paths
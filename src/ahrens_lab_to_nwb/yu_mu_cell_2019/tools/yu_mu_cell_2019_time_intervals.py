@@ -0,0 +1,77 @@
+"""Columnar construction of TimeIntervals tables from arrays of intervals."""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+from pynwb.epoch import TimeIntervals
+from hdmf.common import VectorData
+
+from .yu_mu_cell_2019_compression import wrap_data
+
+TIME_COLUMN_DESCRIPTIONS = {column["name"]: column["description"] for column in TimeIntervals.__columns__}
+
+
+def create_time_intervals_from_columns(
+    name: str,
+    description: str,
+    start_time: ArrayLike,
+    stop_time: ArrayLike,
+    columns: Optional[Dict[str, Tuple[str, ArrayLike]]] = None,
+    sort: bool = False,
+    compression_options: Optional[dict] = None,
+) -> TimeIntervals:
+    """
+    Create a TimeIntervals table whose columns are filled in one operation, instead of one row at a time.
+
+    Parameters
+    ----------
+    name : str
+        The name of the table; 'trials' for the trials table of an NWBFile.
+    description : str
+        The description of the table.
+    start_time : array-like of float
+        The start time of each interval, in seconds.
+    stop_time : array-like of float
+        The stop time of each interval, in seconds.
+    columns : dict, optional
+        Maps the name of each additional column to its description and the value of each interval.
+    sort : bool, default: False
+        Whether to order the intervals by their start time; intervals starting at the same time keep their order.
+    compression_options : dict, optional
+        Compression options (see `get_compression_options`) of every numeric column.
+        If not specified, the columns are written without chunking or compression.
+    """
+    column_data = dict(
+        start_time=(TIME_COLUMN_DESCRIPTIONS["start_time"], np.asarray(start_time, dtype="float64")),
+        stop_time=(TIME_COLUMN_DESCRIPTIONS["stop_time"], np.asarray(stop_time, dtype="float64")),
+    )
+    column_data.update(
+        {
+            column_name: (column_description, np.asarray(data))
+            for column_name, (column_description, data) in (columns or dict()).items()
+        }
+    )
+    num_intervals = len(column_data["start_time"][1])
+    for column_name, (_, data) in column_data.items():
+        assert (
+            len(data) == num_intervals
+        ), f"The '{column_name}' column has {len(data)} values, but there are {num_intervals} intervals!"
+
+    if sort:
+        order = np.argsort(column_data["start_time"][1], kind="stable")
+        column_data = {
+            column_name: (column_description, data[order])
+            for column_name, (column_description, data) in column_data.items()
+        }
+
+    vector_data = list()
+    for column_name, (column_description, data) in column_data.items():
+        if data.dtype.kind in "UO":
+            # Text columns are variable-length strings, which HDF5 can not compress; only their references would be
+            data = data.astype(str)
+        elif compression_options is not None and num_intervals > 0:  # Empty datasets can not be chunked
+            data = wrap_data(data, compression_options=compression_options)
+        vector_data.append(VectorData(name=column_name, description=column_description, data=data))
+    return TimeIntervals(
+        name=name, description=description, id=np.arange(num_intervals, dtype="int64"), columns=vector_data
+    )
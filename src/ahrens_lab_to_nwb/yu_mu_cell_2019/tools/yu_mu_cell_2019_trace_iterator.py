@@ -0,0 +1,189 @@
+"""DataChunkIterator for the fluorescence traces stored in the MATLAB (v7.3) segmentation files."""
+import math
+from typing import Optional, Tuple
+
+import h5py
+import numpy as np
+from hdmf.data_utils import GenericDataChunkIterator
+from neuroconv.utils import FilePathType
+
+from .yu_mu_cell_2019_file_handles import FileHandleCache
+from .yu_mu_cell_2019_matlab_half_precision import (
+    decode_half_precision,
+    is_matlab_half_precision,
+    resolve_matlab_half_precision_dataset,
+)
+from .yu_mu_cell_2019_memory_budget import BudgetedDataChunkIteratorMixin
+from .yu_mu_cell_2019_performance_report import MeasuredDataChunkIteratorMixin
+from .yu_mu_cell_2019_write_checkpoint import CheckpointedDataChunkIteratorMixin
+
+
+class MatlabTraceDataChunkIterator(
+    CheckpointedDataChunkIteratorMixin,
+    MeasuredDataChunkIteratorMixin,
+    BudgetedDataChunkIteratorMixin,
+    GenericDataChunkIterator,
+):
+    """
+    Iterate over a (num_frames, num_rois) trace dataset of a MATLAB segmentation file in its native storage order.
+
+    The trace datasets of the segmentation files are stored in the (num_frames, num_rois) layout of an NWB
+    RoiResponseSeries. The buffer is chosen as a multiple of both the NWB chunk shape and the source chunk shape that
+    spans all ROIs (the fastest-varying source axis) when it fits, so each compressed source chunk is decompressed once
+    and the buffers are visited in the same order the chunks are laid out on disk.
+    """
+
+    def __init__(
+        self,
+        file_path: FilePathType,
+        dataset_name: str,
+        half_precision_dtype: str = "float32",
+        start_frame: int = 0,
+        end_frame: Optional[int] = None,
+        end_roi: Optional[int] = None,
+        chunk_cache_mb: float = 64.0,
+        buffer_gb: Optional[float] = None,
+        buffer_shape: Optional[tuple] = None,
+        chunk_mb: Optional[float] = None,
+        chunk_shape: Optional[tuple] = None,
+        display_progress: bool = False,
+        progress_bar_options: Optional[dict] = None,
+    ):
+        """
+        Initialize an Iterable object which returns DataChunks with data and their selections on each iteration.
+
+        Parameters
+        ----------
+        file_path : FilePathType
+            Path to the MATLAB (v7.3) segmentation file.
+        dataset_name : str
+            Name of the trace dataset, e.g., 'Cell_baseline' or 'timeseries'.
+        half_precision_dtype : str, default: "float32"
+            The dtype to decode the values to if the dataset is a MATLAB 'half' array; either float16 or float32.
+        start_frame : int, default: 0
+            The first frame to iterate over.
+        end_frame : int, optional
+            The frame to stop iterating at. Defaults to the number of frames in the dataset.
+        end_roi : int, optional
+            The ROI to stop iterating at, e.g., to only convert the first ROIs of a stub. Defaults to all ROIs.
+        chunk_cache_mb : float, default: 64.0
+            Lower bound on the size of the HDF5 chunk cache used when reading the source dataset.
+            It is raised automatically to fit one full row of source chunks across the buffer.
+        buffer_gb : float, optional
+            The upper bound on size in gigabytes (GB) of each selection from the iteration.
+            Cannot be set if `buffer_shape` is also specified. The default is 1GB.
+        buffer_shape : tuple, optional
+            Manual specification of buffer shape to return on each iteration.
+            Must be a multiple of chunk_shape along each axis.
+            Cannot be set if `buffer_gb` is also specified.
+        chunk_mb : float, optional
+            The upper bound on size in megabytes (MB) of the internal chunk for the HDF5 dataset.
+            Cannot be set if `chunk_shape` is also specified. The default is 1MB.
+        chunk_shape : tuple, optional
+            Manual specification of the internal chunk shape for the HDF5 dataset.
+            Cannot be set if `chunk_mb` is also specified.
+        display_progress : bool, optional
+            Display a progress bar with iteration rate and estimated completion time.
+        progress_bar_options : dict, optional
+            Dictionary of keyword arguments to be passed directly to tqdm.
+        """
+        assert not (buffer_gb and buffer_shape), "Only one of 'buffer_gb' or 'buffer_shape' can be specified!"
+        assert not (chunk_mb and chunk_shape), "Only one of 'chunk_mb' or 'chunk_shape' can be specified!"
+
+        self.file_path = file_path
+        self.dataset_name = dataset_name
+        self.start_frame = start_frame
+        self.chunk_cache_mb = chunk_cache_mb
+
+        with h5py.File(name=file_path, mode="r") as file:
+            dataset = file[dataset_name]
+            self._half_precision = is_matlab_half_precision(dataset=dataset)
+            if self._half_precision:  # Read the coded uint16 values directly, decoding them one buffer at a time
+                self._source_dataset_name = resolve_matlab_half_precision_dataset(file=file, dataset_name=dataset_name)
+                dataset = file[self._source_dataset_name]
+            else:
+                self._source_dataset_name = dataset_name
+            source_shape = dataset.shape
+            self._source_dtype = dataset.dtype
+            source_chunks = dataset.chunks
+        self._output_dtype = np.dtype(half_precision_dtype) if self._half_precision else self._source_dtype
+        num_frames, num_rois = source_shape
+        self._num_rois = min(end_roi, num_rois) if end_roi is not None else num_rois
+        self.end_frame = min(end_frame, num_frames) if end_frame is not None else num_frames
+        assert 0 <= start_frame < self.end_frame, f"Invalid frame range [{start_frame}, {self.end_frame})!"
+
+        self._source_chunk_shape = source_chunks
+
+        self._maxshape = self._get_maxshape()
+        self._dtype = self._get_dtype()
+        if chunk_mb is None and chunk_shape is None:
+            chunk_mb = 1.0
+        if chunk_shape is None:
+            chunk_shape = super()._get_default_chunk_shape(chunk_mb=chunk_mb)
+        if buffer_gb is None and buffer_shape is None:
+            buffer_gb = 1.0
+        if buffer_shape is None:
+            buffer_shape = self._get_source_aligned_buffer_shape(buffer_gb=buffer_gb, chunk_shape=chunk_shape)
+
+        self._file_handles = FileHandleCache(max_open_files=1)  # Opened on the first read of each process
+        super().__init__(
+            buffer_shape=buffer_shape,
+            chunk_shape=chunk_shape,
+            display_progress=display_progress,
+            progress_bar_options=progress_bar_options,
+        )
+
+    def _get_budgeted_buffer_shape(self, buffer_gb: float) -> Tuple[int, int]:
+        return self._get_source_aligned_buffer_shape(buffer_gb=buffer_gb, chunk_shape=self.chunk_shape)
+
+    def _get_source_aligned_buffer_shape(self, buffer_gb: float, chunk_shape: tuple) -> Tuple[int, int]:
+        """Select the largest buffer within budget aligned to both the NWB and the source chunks."""
+        assert buffer_gb > 0, f"buffer_gb ({buffer_gb}) must be greater than zero!"
+
+        source_chunk_shape = self._source_chunk_shape or (1, 1)
+        alignment = [
+            chunk_axis * source_chunk_axis // math.gcd(chunk_axis, source_chunk_axis)
+            for chunk_axis, source_chunk_axis in zip(chunk_shape, source_chunk_shape)
+        ]
+        buffer_elements = max(1, int(buffer_gb * 1e9 / self._dtype.itemsize))
+
+        num_rois = self.maxshape[1]
+        if buffer_elements // num_rois >= alignment[0]:
+            buffer_shape = [buffer_elements // num_rois // alignment[0] * alignment[0], num_rois]
+        else:  # A full row of source chunks across the ROIs does not fit; split the ROIs as well
+            roi_length = buffer_elements // alignment[0]
+            buffer_shape = [alignment[0], max(roi_length // alignment[1] * alignment[1], chunk_shape[1])]
+
+        return tuple(
+            min(max(buffer_axis, chunk_axis), maxshape_axis)
+            for buffer_axis, chunk_axis, maxshape_axis in zip(buffer_shape, chunk_shape, self.maxshape)
+        )
+
+    def _get_dataset(self) -> h5py.Dataset:
+        row_of_source_chunks_bytes = 0
+        if self._source_chunk_shape is not None:
+            num_chunks_across_buffer = math.ceil(self.buffer_shape[1] / self._source_chunk_shape[1])
+            source_chunk_bytes = np.prod(self._source_chunk_shape) * self._source_dtype.itemsize
+            row_of_source_chunks_bytes = int(num_chunks_across_buffer * source_chunk_bytes)
+        chunk_cache_bytes = max(int(self.chunk_cache_mb * 1e6), row_of_source_chunks_bytes)
+        file = self._file_handles.open(file_path=self.file_path, rdcc_nbytes=chunk_cache_bytes, rdcc_nslots=100_003)
+        return file[self._source_dataset_name]
+
+    def _read_source(self, source_selection: Tuple[slice, slice]) -> np.ndarray:
+        if self._half_precision:
+            return decode_half_precision(coded_values=self._get_dataset()[source_selection], dtype=self.dtype)
+        return self._get_dataset()[source_selection]
+
+    def _get_data(self, selection: Tuple[slice]) -> np.ndarray:
+        frame_slice = slice(selection[0].start + self.start_frame, selection[0].stop + self.start_frame)
+        return self._read_source(source_selection=(frame_slice, selection[1]))
+
+    def _get_dtype(self) -> np.dtype:
+        return self._output_dtype
+
+    def _get_maxshape(self) -> Tuple[int, int]:
+        return (self.end_frame - self.start_frame, self._num_rois)
+
+    def __del__(self):
+        if hasattr(self, "_file_handles"):
+            self._file_handles.close()
@@ -0,0 +1,223 @@
+"""Sidecar checkpoints recording how much of each chunked dataset has been committed to a partially written NWB file."""
+import json
+import os
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from warnings import warn
+
+import h5py
+from hdmf.build import GroupBuilder
+from hdmf.data_utils import AbstractDataChunkIterator, DataChunk, DataIO
+from neuroconv.utils import FilePathType
+from pynwb import NWBFile, get_manager
+
+WRITE_CHECKPOINT_VERSION = 1
+
+
+def get_default_checkpoint_file_path(nwbfile_path: FilePathType) -> Path:
+    """The checkpoint lives next to the NWB file, e.g., 'session.nwb' is tracked by 'session.checkpoint.json'."""
+    return Path(nwbfile_path).with_suffix(".checkpoint.json")
+
+
+class CheckpointedDataChunkIteratorMixin:
+    """
+    Mixin for GenericDataChunkIterators that records each buffer committed to the file in a WriteCheckpoint.
+
+    When writing with `exhaust_dci=False`, HDMF creates every group, dataset, attribute and reference of the file
+    before iterating over any of its DataChunkIterators, and writes each DataChunk before asking its iterator for the
+    next one. So by the time a buffer is requested, all buffers previously returned by the same iterator are in the
+    file; the file is flushed before they are recorded.
+    """
+
+    checkpoint: Optional["WriteCheckpoint"] = None
+    checkpoint_key: Optional[str] = None
+    _num_returned_buffers: int = 0
+
+    def __next__(self):
+        if self.checkpoint is None:
+            return super().__next__()
+
+        self.checkpoint.set_structure_written()
+        if self._num_returned_buffers > 0:
+            self.checkpoint.commit(key=self.checkpoint_key, num_completed_buffers=self._num_returned_buffers)
+        try:
+            data_chunk = super().__next__()
+        except StopIteration:
+            self.checkpoint.commit(key=self.checkpoint_key, num_completed_buffers=self._num_returned_buffers)
+            raise
+        self._num_returned_buffers += 1
+        return data_chunk
+
+    def skip_buffers(self, num_buffers: int):
+        """Advance past buffers that are already in the file, e.g., when resuming a write."""
+        for _ in islice(self.buffer_selection_generator, num_buffers):
+            pass
+        self._num_returned_buffers += num_buffers
+        if getattr(self, "display_progress", False):
+            self.progress_bar.update(n=num_buffers)
+
+
+def find_checkpointed_iterators(nwbfile: NWBFile) -> Dict[str, CheckpointedDataChunkIteratorMixin]:
+    """
+    Map the location of every dataset of an in-memory NWBFile that will be written by an iterator to that iterator.
+
+    Raises an error if any dataset would be written by an iterator whose progress cannot be checkpointed.
+    """
+    root_builder = get_manager().build(nwbfile)
+
+    iterators = dict()
+    builders = [root_builder]
+    while builders:
+        builder = builders.pop()
+        if isinstance(builder, GroupBuilder):
+            builders.extend(builder.groups.values())
+            builders.extend(builder.datasets.values())
+            continue
+
+        data = builder.data.data if isinstance(builder.data, DataIO) else builder.data
+        dataset_path = "/" + builder.path.split("/", maxsplit=1)[1] if "/" in builder.path else builder.path
+        if isinstance(data, CheckpointedDataChunkIteratorMixin):
+            iterators[dataset_path] = data
+        elif isinstance(data, AbstractDataChunkIterator):
+            raise ValueError(
+                f"The dataset '{dataset_path}' is written by a {type(data).__name__}, "
+                "whose progress cannot be checkpointed!"
+            )
+    return iterators
+
+
+def iterate_round_robin(iterators: Dict[str, AbstractDataChunkIterator]) -> Iterator[Tuple[str, DataChunk]]:
+    """
+    The buffers of every iterator with the location of their dataset, taking one buffer from each iterator in turn.
+
+    This is the order in which HDMF writes the iterators of a file written with `exhaust_dci=False`, so that the
+    iterators over the two regions of the same frame files read each block of frames once for both (see
+    `AhrensHdf5FolderImagingExtractor.share_frame_reads`).
+    """
+    queue = deque(iterators.items())
+    while queue:
+        dataset_path, iterator = queue.popleft()
+        try:
+            data_chunk = next(iterator)
+        except StopIteration:
+            continue
+        yield dataset_path, data_chunk
+        queue.append((dataset_path, iterator))
+
+
+class WriteCheckpoint:
+    """
+    Progress of the chunked datasets of an NWB file, saved as a JSON sidecar after each committed buffer.
+
+    The file is resumable once its structure has been written: every dataset then exists at its full shape, and only
+    the buffers past the last recorded one of each chunked dataset remain to be filled in.
+    """
+
+    def __init__(self, nwbfile_path: FilePathType, checkpoint_file_path: Optional[FilePathType] = None):
+        self.nwbfile_path = Path(nwbfile_path).absolute()
+        self.checkpoint_file_path = (
+            Path(checkpoint_file_path)
+            if checkpoint_file_path is not None
+            else get_default_checkpoint_file_path(nwbfile_path=nwbfile_path)
+        )
+        self.file = None  # The h5py.File being written, flushed before each commit
+        self.structure_written = False
+        self.datasets = dict()
+        self._load()
+
+    def _load(self):
+        if not self.checkpoint_file_path.exists():
+            return
+
+        try:
+            with open(file=self.checkpoint_file_path, mode="r") as file:
+                checkpoint = json.load(fp=file)
+        except (OSError, ValueError):
+            warn(f"Unable to read the checkpoint at '{self.checkpoint_file_path}'; the file will be rewritten.")
+            return
+
+        if checkpoint.get("version") != WRITE_CHECKPOINT_VERSION or checkpoint.get("nwbfile_path") != str(
+            self.nwbfile_path
+        ):
+            return
+        self.structure_written = checkpoint["structure_written"]
+        self.datasets = checkpoint["datasets"]
+
+    def _save(self):
+        checkpoint = dict(
+            version=WRITE_CHECKPOINT_VERSION,
+            nwbfile_path=str(self.nwbfile_path),
+            structure_written=self.structure_written,
+            datasets=self.datasets,
+        )
+        temporary_file_path = self.checkpoint_file_path.with_suffix(".json.tmp")
+        try:
+            with open(file=temporary_file_path, mode="w") as file:
+                json.dump(obj=checkpoint, fp=file, indent=2)
+            os.replace(temporary_file_path, self.checkpoint_file_path)
+        except OSError:  # The write itself can go on; it just cannot be resumed past the last saved progress
+            warn(f"Unable to write the checkpoint to '{self.checkpoint_file_path}'.")
+
+    def attach(self, iterators: Dict[str, CheckpointedDataChunkIteratorMixin]):
+        """Track the progress of these iterators, keyed by the location of the dataset each one writes."""
+        for dataset_path, iterator in iterators.items():
+            iterator.checkpoint = self
+            iterator.checkpoint_key = dataset_path
+
+    def can_resume(self, iterators: Dict[str, CheckpointedDataChunkIteratorMixin]) -> bool:
+        """Whether the partial file was written by the same conversion, i.e., the same datasets and buffers."""
+        if not (self.structure_written and self.nwbfile_path.exists()):
+            return False
+        expected_datasets = {
+            dataset_path: iterator.num_buffers for dataset_path, iterator in iterators.items()
+        }  # Any change of the iterator or buffer options invalidates the recorded progress
+        recorded_datasets = {dataset_path: progress["num_buffers"] for dataset_path, progress in self.datasets.items()}
+        return expected_datasets == recorded_datasets
+
+    def start(self, file: h5py.File, iterators: Dict[str, CheckpointedDataChunkIteratorMixin]):
+        """Start recording a fresh write to the file."""
+        self.file = file
+        self.structure_written = False
+        self.datasets = {
+            dataset_path: dict(num_buffers=iterator.num_buffers, num_completed_buffers=0)
+            for dataset_path, iterator in iterators.items()
+        }
+        self._save()
+
+    def set_structure_written(self):
+        if not self.structure_written:
+            self.structure_written = True
+            self._save()
+
+    def commit(self, key: str, num_completed_buffers: int):
+        if self.datasets[key]["num_completed_buffers"] == num_completed_buffers:
+            return
+        if self.file is not None:
+            self.file.flush()
+        self.datasets[key]["num_completed_buffers"] = num_completed_buffers
+        self._save()
+
+    def resume(self, file: h5py.File, iterators: Dict[str, CheckpointedDataChunkIteratorMixin]):
+        """
+        Write the remaining buffers of every dataset into the partial file, continuing to record progress.
+
+        As in the interrupted write, the datasets take turns, one buffer at a time.
+        """
+        self.file = file
+        for dataset_path, iterator in iterators.items():
+            iterator.skip_buffers(num_buffers=self.datasets[dataset_path]["num_completed_buffers"])
+        for dataset_path, data_chunk in iterate_round_robin(iterators=iterators):
+            file[dataset_path][data_chunk.selection] = data_chunk.data
+
+    @property
+    def is_complete(self) -> bool:
+        return self.structure_written and all(
+            progress["num_completed_buffers"] == progress["num_buffers"] for progress in self.datasets.values()
+        )
+
+    def remove(self):
+        """Delete the sidecar once the file is complete."""
+        self.file = None
+        self.checkpoint_file_path.unlink(missing_ok=True)
@@ -0,0 +1,111 @@
+"""Writing of NWB-Zarr directory stores, filling the chunked datasets with a pool of threads."""
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+import numpy as np
+from hdmf.build import GroupBuilder
+from neuroconv.utils import FolderPathType
+from pynwb import NWBFile
+
+from .yu_mu_cell_2019_write_checkpoint import find_checkpointed_iterators, iterate_round_robin
+
+# Bound the number and the size of the buffers held in memory while waiting to be written
+PENDING_BUFFERS_PER_WORKER = 2
+DEFAULT_MAX_PENDING_GB = 1.0
+
+
+def write_nwbfile_to_zarr(
+    nwbfile: NWBFile,
+    nwbfile_path: FolderPathType,
+    max_workers: Optional[int] = None,
+    max_pending_gb: float = DEFAULT_MAX_PENDING_GB,
+):
+    """
+    Write an in-memory NWBFile to a Zarr directory store, compressing and writing its chunked datasets in parallel.
+
+    The structure of the file is written first, with every chunked dataset created at its full shape but left
+    empty. The buffers of all datasets are then read one at a time by the calling thread, since the sources share
+    open files and caches, while a pool of threads compresses and writes the buffers read so far. As when writing
+    HDF5, the datasets take turns, one buffer at a time, so that the two regions of the same frame files are read
+    once for both. Every buffer spans whole chunks, so no two threads ever write to the same chunk.
+
+    Datasets of lists of strings (e.g., the 'experimenter' or creation dates of the file, or the labels of events) are
+    written as arrays of strings, which the variable-length string codecs of Zarr require. If the write fails, the
+    partial store is removed.
+
+    Parameters
+    ----------
+    nwbfile : NWBFile
+        The NWBFile, with the data of each series wrapped in a ZarrDataIO (see `get_compression_options`).
+    nwbfile_path : FolderPathType
+        The directory of the store, e.g., 'session.nwb.zarr'; overwritten if it exists.
+    max_workers : int, optional
+        The number of threads compressing and writing buffers. Defaults to the number of CPUs.
+    max_pending_gb : float, default: 1.0
+        The size of the buffers read but not yet written beyond which reading waits for the threads, in GB; up to two
+        buffers per thread are held otherwise. A single buffer larger than this is still written, one at a time.
+    """
+    from hdmf_zarr.nwb import NWBZarrIO
+    import zarr
+
+    max_workers = max_workers or os.cpu_count()
+    iterators = find_checkpointed_iterators(nwbfile=nwbfile)
+    # Hold back the selections so that the writer only creates the datasets; the buffers are filled in below
+    buffer_selection_generators = dict()
+    for dataset_path, iterator in iterators.items():
+        buffer_selection_generators[dataset_path] = iterator.buffer_selection_generator
+        iterator.buffer_selection_generator = iter(())
+
+    try:
+        with NWBZarrIO(path=str(nwbfile_path), mode="w") as io:
+            _encode_string_lists(builder=io.manager.build(nwbfile, source=str(nwbfile_path), root=True))
+            io.write(nwbfile)
+        for dataset_path, iterator in iterators.items():
+            iterator.buffer_selection_generator = buffer_selection_generators[dataset_path]
+
+        store = zarr.open_group(store=str(nwbfile_path), mode="r+")
+        datasets = dict()
+        for dataset_path in iterators:
+            dataset = store[dataset_path.lstrip("/")]
+            if "zarr_dtype" not in dataset.attrs:  # Not recorded for iterators by hdmf-zarr<0.3, but needed to read
+                dataset.attrs["zarr_dtype"] = dataset.dtype.name
+            datasets[dataset_path] = dataset
+
+        max_pending_buffers = PENDING_BUFFERS_PER_WORKER * max_workers
+        max_pending_bytes = max_pending_gb * 1e9
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = dict()  # The number of bytes of each buffer waiting to be written
+            for dataset_path, data_chunk in iterate_round_robin(iterators=iterators):
+                num_bytes = np.asarray(data_chunk.data).nbytes
+                while pending and (
+                    len(pending) >= max_pending_buffers or sum(pending.values()) + num_bytes > max_pending_bytes
+                ):
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del pending[future]
+                        future.result()
+                future = executor.submit(
+                    _write_buffer, dataset=datasets[dataset_path], selection=data_chunk.selection, data=data_chunk.data
+                )
+                pending[future] = num_bytes
+            for future in pending:
+                future.result()
+    except BaseException:
+        shutil.rmtree(nwbfile_path, ignore_errors=True)
+        raise
+
+
+def _encode_string_lists(builder: GroupBuilder):
+    """Replace the lists of strings or bytes of the datasets under the builder with arrays, which Zarr can encode."""
+    for dataset_builder in builder.datasets.values():
+        data = dataset_builder.data
+        if isinstance(data, (list, tuple)) and data and all(isinstance(value, (str, bytes)) for value in data):
+            dataset_builder["data"] = np.array(data, dtype=object)  # DatasetBuilder.data can only be set once
+    for group_builder in builder.groups.values():
+        _encode_string_lists(builder=group_builder)
+
+
+def _write_buffer(dataset, selection: tuple, data):
+    dataset[selection] = data
@@ -0,0 +1,247 @@
+"""
+Convert many sessions in parallel from a manifest of session names.
+
+The manifest is a YAML or JSON file of the form
+
+    data_folder_path: E:/Ahrens  # Holds the 'Imaging' and 'Segmentation' folders
+    output_folder_path: E:/Ahrens/NWB
+    sessions:
+      - session_name: 20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241
+        session_type: single_color
+        cell_type: neuron
+      - session_name: 20170228_4_1_gfaprgeco_hucgc_6dpf_shorttrials_20170228_185002
+        session_type: dual_color
+        include_ophys: false  # Only the behavior
+
+Any other key of a session (e.g., 'stub_test', 'frame_offset', 'nwbfile_path' or 'session_paths') is passed on to
+`single_color_session_to_nwb` or `dual_color_session_to_nwb`. Usage:
+
+    python yu_mu_cell_2019_batch_conversion_script.py sessions.yml --max-workers 16 --max-imaging-workers 3
+
+With '--memory-gb', each conversion is bounded by that much memory, so that `max_workers` of them fit on a node.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from neuroconv.utils import FilePathType, FolderPathType, load_dict_from_file
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_convert_session import (
+    single_color_session_to_nwb,
+    dual_color_session_to_nwb,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_performance_report import (
+    get_default_performance_report_file_path,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_write_checkpoint import get_default_checkpoint_file_path
+
+
+def get_partial_nwbfile_path(nwbfile_path: FilePathType) -> Path:
+    """Where a session is written before being moved to its NWB file, e.g., 'session.nwb.partial'."""
+    nwbfile_path = Path(nwbfile_path)
+    return nwbfile_path.with_name(f"{nwbfile_path.name}.partial")
+
+
+def _remove_nwbfile(nwbfile_path: Path):
+    """Remove an NWB file, or the directory of a Zarr store."""
+    if nwbfile_path.is_dir():
+        shutil.rmtree(nwbfile_path)
+    elif nwbfile_path.exists():
+        nwbfile_path.unlink()
+
+
+def _convert_session(session: dict, data_folder_path: str, output_folder_path: str) -> float:
+    """Run in a worker process; returns the duration of the conversion in seconds."""
+    session = dict(session)
+    session_type = session.pop("session_type")
+    session_name = session["session_name"]
+    session.setdefault("nwbfile_path", str(Path(output_folder_path) / f"{session_name}.nwb"))
+    session.setdefault("display_progress", False)  # Progress bars of concurrent sessions would overwrite each other
+
+    # Without a checkpoint to tell a truncated file from a complete one, the file is only moved in place once complete
+    nwbfile_path = Path(session["nwbfile_path"])
+    partial_nwbfile_path = None if session.get("resumable", False) else get_partial_nwbfile_path(nwbfile_path)
+    if partial_nwbfile_path is not None:
+        _remove_nwbfile(nwbfile_path=partial_nwbfile_path)  # Left by a conversion that was killed
+        session.update(nwbfile_path=str(partial_nwbfile_path))
+
+    start_time = time.perf_counter()
+    session_to_nwb = single_color_session_to_nwb if session_type == "single_color" else dual_color_session_to_nwb
+    try:
+        session_to_nwb(data_folder_path=data_folder_path, **session)
+        if partial_nwbfile_path is not None:
+            _remove_nwbfile(nwbfile_path=nwbfile_path)
+            partial_nwbfile_path.rename(nwbfile_path)
+            get_default_performance_report_file_path(nwbfile_path=partial_nwbfile_path).replace(
+                get_default_performance_report_file_path(nwbfile_path=nwbfile_path)
+            )
+    except Exception:  # Not every exception can be pickled back to the parent process, but its traceback can
+        raise RuntimeError(traceback.format_exc()) from None
+    return time.perf_counter() - start_time
+
+
+def run_batch_conversion(
+    sessions: List[dict],
+    data_folder_path: FolderPathType,
+    output_folder_path: FolderPathType,
+    max_workers: Optional[int] = None,
+    max_imaging_workers: int = 2,
+    overwrite: bool = False,
+    resumable: bool = False,
+    memory_gb: Optional[float] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Convert the sessions across a pool of processes.
+
+    Sessions that include the raw imaging read and write hundreds of GB and are bound by the disks rather than the
+    processors, so at most `max_imaging_workers` of them run at once; the remaining workers are kept busy with
+    behavior-only sessions. Imaging sessions are started first whenever a slot allows,
+    since they take the longest.
+
+    Parameters
+    ----------
+    sessions : list of dict
+        Each with at least a 'session_name' and a 'session_type' ('single_color' or 'dual_color').
+    data_folder_path : FolderPathType
+        The folder holding the 'Imaging' and 'Segmentation' folders, e.g., 'E:/Ahrens'.
+    output_folder_path : FolderPathType
+        Where to write the NWB files, named after the sessions.
+    max_workers : int, optional
+        The number of processes. Defaults to the number of CPUs.
+    max_imaging_workers : int, default: 2
+        The maximum number of sessions including raw imaging that are converted at the same time.
+    overwrite : bool, default: False
+        Whether to convert sessions whose NWB file already exists.
+    resumable : bool, default: False
+        Record the progress of every write, so that a rerun of the batch continues the sessions that were interrupted
+        (e.g., by a crash or a killed job) from their last completed buffer rather than skipping or restarting them.
+        Otherwise, each session is written to a partial file (see `get_partial_nwbfile_path`) that is only moved to
+        its NWB file once complete, so a rerun restarts the sessions that were interrupted.
+    memory_gb : float, optional
+        The memory limit of each conversion (see `MemoryBudget`), unless a session specifies its own 'memory_gb'.
+        At most `max_workers` conversions run at once, so they need up to `max_workers * memory_gb` in total.
+
+    Returns
+    -------
+    errors : dict
+        The traceback of each session that failed, or None for each session that succeeded.
+    """
+    max_workers = max_workers or os.cpu_count()
+    assert max_imaging_workers >= 1, "At least one worker must be allowed to convert imaging!"
+    for session in sessions:
+        assert session.get("session_type") in ["single_color", "dual_color"], (
+            f"Session '{session.get('session_name')}' must specify a 'session_type' of "
+            "either 'single_color' or 'dual_color'!"
+        )
+    Path(output_folder_path).mkdir(parents=True, exist_ok=True)
+
+    if resumable:
+        sessions = [dict(session, resumable=True) for session in sessions]
+    if memory_gb is not None:
+        sessions = [dict(dict(memory_gb=memory_gb), **session) for session in sessions]
+    if not overwrite:
+        # A file with a checkpoint next to it is the partial result of an interrupted write
+        nwbfile_paths = [
+            Path(session.get("nwbfile_path", Path(output_folder_path) / f"{session['session_name']}.nwb"))
+            for session in sessions
+        ]
+        sessions = [
+            session
+            for session, nwbfile_path in zip(sessions, nwbfile_paths)
+            if not nwbfile_path.exists()
+            or (resumable and get_default_checkpoint_file_path(nwbfile_path=nwbfile_path).exists())
+        ]
+    pending_imaging_sessions = deque(session for session in sessions if session.get("include_ophys", True))
+    pending_other_sessions = deque(session for session in sessions if not session.get("include_ophys", True))
+
+    errors = dict()
+    running = dict()  # Future -> (session name, whether it includes imaging)
+    # Fresh interpreters rather than forks, so no HDF5 library state is shared with the parent
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        while pending_imaging_sessions or pending_other_sessions or running:
+            while len(running) < max_workers:
+                num_running_imaging = sum(includes_imaging for _, includes_imaging in running.values())
+                if pending_imaging_sessions and num_running_imaging < max_imaging_workers:
+                    session, includes_imaging = pending_imaging_sessions.popleft(), True
+                elif pending_other_sessions:
+                    session, includes_imaging = pending_other_sessions.popleft(), False
+                else:
+                    break
+                future = executor.submit(
+                    _convert_session,
+                    session=session,
+                    data_folder_path=str(data_folder_path),
+                    output_folder_path=str(output_folder_path),
+                )
+                running[future] = (session["session_name"], includes_imaging)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                session_name, _ = running.pop(future)
+                try:
+                    duration = future.result()
+                    errors[session_name] = None
+                    print(f"Converted {session_name} in {duration / 60:.1f} minutes.")
+                except Exception as exception:
+                    errors[session_name] = str(exception)
+                    print(f"Failed to convert {session_name}:\n{errors[session_name]}")
+
+    return errors
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Convert many sessions of the Yu Mu 2019 Cell dataset in parallel.")
+    parser.add_argument("manifest_file_path", help="YAML or JSON file listing the sessions to convert.")
+    parser.add_argument("--data-folder-path", help="Overrides the 'data_folder_path' of the manifest.")
+    parser.add_argument("--output-folder-path", help="Overrides the 'output_folder_path' of the manifest.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Defaults to the number of CPUs.")
+    parser.add_argument(
+        "--max-imaging-workers",
+        type=int,
+        default=2,
+        help="Maximum number of sessions including raw imaging that are converted at the same time.",
+    )
+    parser.add_argument("--overwrite", action="store_true", help="Convert sessions whose NWB file already exists.")
+    parser.add_argument(
+        "--resumable", action="store_true", help="Record progress so that interrupted sessions continue when rerun."
+    )
+    parser.add_argument("--stub-test", action="store_true", help="Write fast prototype files of every session.")
+    parser.add_argument(
+        "--summary-images", action="store_true", help="Add the mean, max and variance images of the imaging."
+    )
+    parser.add_argument("--memory-gb", type=float, default=None, help="The memory limit of each conversion, in GB.")
+    arguments = parser.parse_args(argv)
+
+    manifest = load_dict_from_file(file_path=arguments.manifest_file_path)
+    sessions = manifest["sessions"]
+    if arguments.stub_test:
+        sessions = [dict(session, stub_test=True) for session in sessions]
+    if arguments.summary_images:
+        sessions = [dict(session, summary_images=True) for session in sessions]
+
+    errors = run_batch_conversion(
+        sessions=sessions,
+        data_folder_path=arguments.data_folder_path or manifest["data_folder_path"],
+        output_folder_path=arguments.output_folder_path or manifest["output_folder_path"],
+        max_workers=arguments.max_workers,
+        max_imaging_workers=arguments.max_imaging_workers,
+        overwrite=arguments.overwrite,
+        resumable=arguments.resumable,
+        memory_gb=arguments.memory_gb,
+    )
+    failed_session_names = [session_name for session_name, error in errors.items() if error is not None]
+    print(f"Converted {len(errors) - len(failed_session_names)} of {len(errors)} sessions.")
+    if failed_session_names:
+        print("Failed sessions:\n" + "\n".join(failed_session_names))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
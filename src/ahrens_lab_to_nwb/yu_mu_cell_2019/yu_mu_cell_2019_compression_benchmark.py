@@ -0,0 +1,141 @@
+"""
+Compare compression filters on samples of the imaging, fluorescence and behavior series of a session.
+
+Each sample is the first buffer the conversion would write, with the chunk shape it would be written with. Usage:
+
+    python yu_mu_cell_2019_compression_benchmark.py 20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241 \\
+        --data-folder-path E:/Ahrens --session-type single_color --methods gzip:1 gzip:4 lzf blosc-zstd:5
+
+The chosen filters are passed to `single_color_session_to_nwb` or `dual_color_session_to_nwb` as 'compression'.
+"""
+import argparse
+import json
+from typing import List, Optional
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_imaging_extractor import (
+    AhrensHdf5FolderImagingExtractor,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_segmentation_extractor import (
+    YuMu2019SegmentationExtractor,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_behavior_iterator import MatlabBehaviorDataChunkIterator
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_compression import (
+    PLUGIN_COMPRESSION_METHODS,
+    benchmark_compression,
+    get_compression_options,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_imaging_iterator import AhrensImagingDataChunkIterator
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_trace_iterator import MatlabTraceDataChunkIterator
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_convert_session import (
+    SINGLE_COLOR_IMAGING_RATE,
+    DUAL_COLOR_IMAGING_RATE,
+    get_session_paths,
+)
+
+DEFAULT_METHODS = ["gzip:1", "gzip:4", "lzf", "blosc-lz4:5", "blosc-zstd:3", "zstd:3", "lz4"]
+
+
+def _parse_method(method: str) -> dict:
+    """'gzip:4' selects gzip at level 4; 'lzf' selects lzf at its only level."""
+    name, _, level = method.partition(":")
+    return dict(method=name, level=int(level) if level else None)
+
+
+def _get_samples(session_paths: dict, session_type: str, num_frames: int) -> dict:
+    """Maps each type of series to a (data, chunk_shape) sample."""
+    if session_type == "single_color":
+        imaging_extractor = AhrensHdf5FolderImagingExtractor(
+            folder_path=session_paths["imaging_folder_path"],
+            sampling_frequency=SINGLE_COLOR_IMAGING_RATE,
+        )
+        segmentation_file_path = session_paths["segmentation_file_path"]
+    else:
+        imaging_extractor = AhrensHdf5FolderImagingExtractor(
+            folder_path=session_paths["imaging_folder_path"],
+            sampling_frequency=DUAL_COLOR_IMAGING_RATE,
+            region="top",
+        )
+        segmentation_file_path = session_paths["neuron_segmentation_file_path"]
+
+    samples = dict()
+    imaging_iterator = AhrensImagingDataChunkIterator(
+        imaging_extractor.frame_slice(start_frame=0, end_frame=min(num_frames, imaging_extractor.get_num_frames())),
+        read_profile="frame",  # As written by the session conversions
+    )
+    samples.update(imaging=(next(imaging_iterator).data, imaging_iterator.chunk_shape))
+
+    segmentation_extractor = YuMu2019SegmentationExtractor(file_path=segmentation_file_path, sampling_frequency=1.0)
+    trace_iterator = MatlabTraceDataChunkIterator(
+        file_path=segmentation_file_path, dataset_name=segmentation_extractor.get_trace_dataset_names()["raw"]
+    )
+    samples.update(fluorescence=(next(trace_iterator).data, trace_iterator.chunk_shape))
+
+    behavior_iterator = MatlabBehaviorDataChunkIterator(
+        file_path=session_paths["raw_behavior_file_path"], dataset_paths=["rawdata/ch1", "rawdata/ch2"]
+    )
+    samples.update(behavior=(next(behavior_iterator).data, behavior_iterator.chunk_shape))
+    return samples
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare compression filters on samples of a session.")
+    parser.add_argument("session_name")
+    parser.add_argument("--data-folder-path", required=True, help="Holds the 'Imaging' and 'Segmentation' folders.")
+    parser.add_argument("--session-type", choices=["single_color", "dual_color"], default="single_color")
+    parser.add_argument("--cell-type", choices=["neuron", "glia"], default="neuron")
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        default=None,
+        help=f"Filters as 'method[:level]'. Defaults to {DEFAULT_METHODS}, without the plugins if not installed.",
+    )
+    parser.add_argument("--num-frames", type=int, default=8, help="Number of imaging frames to sample.")
+    parser.add_argument("--output-file-path", help="Also save the results as JSON.")
+    arguments = parser.parse_args(argv)
+
+    methods = arguments.methods
+    if methods is None:
+        try:
+            import hdf5plugin  # noqa: F401
+
+            methods = DEFAULT_METHODS
+        except ImportError:
+            methods = [
+                method
+                for method in DEFAULT_METHODS
+                if _parse_method(method)["method"] not in PLUGIN_COMPRESSION_METHODS
+            ]
+    compression_options = {method: get_compression_options(**_parse_method(method)) for method in methods}
+
+    session_paths = get_session_paths(
+        session_name=arguments.session_name,
+        data_folder_path=arguments.data_folder_path,
+        session_type=arguments.session_type,
+        cell_type=arguments.cell_type,
+    )
+    samples = _get_samples(
+        session_paths=session_paths, session_type=arguments.session_type, num_frames=arguments.num_frames
+    )
+
+    all_results = dict()
+    for series_type, (data, chunk_shape) in samples.items():
+        print(
+            f"\n{series_type}: {data.dtype} sample of shape {data.shape} ({data.nbytes / 1e6:.1f} MB), "
+            f"chunks {chunk_shape}"
+        )
+        print(f"{'method':<16}{'ratio':>8}{'write MB/s':>12}{'read MB/s':>12}")
+        results = benchmark_compression(data=data, chunk_shape=chunk_shape, compression_options=compression_options)
+        for result in results:
+            print(
+                f"{result['label']:<16}{result['ratio']:>8.2f}"
+                f"{result['write_mb_per_second']:>12.1f}{result['read_mb_per_second']:>12.1f}"
+            )
+        all_results[series_type] = results
+
+    if arguments.output_file_path is not None:
+        with open(file=arguments.output_file_path, mode="w") as file:
+            json.dump(obj=all_results, fp=file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,583 @@
+"""Conversion of a single session of single-color or dual-color data, with all paths derived from the session name."""
+from pathlib import Path
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+from dateutil import tz
+from neuroconv.utils import FilePathType, FolderPathType, load_dict_from_file, dict_deep_update
+
+from .yu_mu_cell_2019_nwbconverter import (
+    INTERFACE_SERIES_TYPES,
+    YuMuCell2019SingleColorNWBConverter,
+    YuMuCell2019DualColorNWBConverter,
+)
+from .tools.yu_mu_cell_2019_frame_manifest import FrameFileManifest
+from .tools.yu_mu_cell_2019_frame_timestamps import FrameTrackerTimestamps
+from .tools.yu_mu_cell_2019_compression import get_compression_options
+
+METADATA_FOLDER = Path(__file__).parent / "metadata"
+SINGLE_COLOR_SESSION_DESCRIPTION = "A single-color optic channel recording of either a neuron or a glia population."
+DUAL_COLOR_SESSION_DESCRIPTION = "A dual-color optic channel recording of both neuron and glia populations."
+BEHAVIOR_RATE = 5989.6
+SINGLE_COLOR_IMAGING_RATE = 2.73
+# The rate is estimated from the mean number of frames between TTL onset (ch3) for frame
+# captures divided by average reported volume sampling speed
+DUAL_COLOR_IMAGING_RATE = 1.56
+
+
+def get_session_paths(
+    session_name: str, data_folder_path: FolderPathType, session_type: str, cell_type: str = "neuron"
+) -> dict:
+    """
+    Derive the location of every source file of a session from the layout of the lab's data share.
+
+    Parameters
+    ----------
+    session_name : str
+        For example, '20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241'.
+    data_folder_path : FolderPathType
+        The folder holding the 'Imaging' and 'Segmentation' folders, e.g., 'E:/Ahrens'.
+    session_type : str
+        Either 'single_color' or 'dual_color'.
+    cell_type : str, default: "neuron"
+        For single-color sessions, which population was recorded; either 'neuron' or 'glia'.
+    """
+    assert session_type in ["single_color", "dual_color"], f"Unknown session type '{session_type}'!"
+    data_folder_path = Path(data_folder_path)
+    session_name_split = session_name.split("_")
+    subject_number = session_name_split[1]
+    session_start_date = session_name_split[-2]
+
+    session_folder_path = data_folder_path / "Imaging" / session_start_date / f"fish{subject_number}" / session_name
+    ephys_folder_path = session_folder_path / "ephys"
+    session_paths = dict(
+        imaging_folder_path=session_folder_path / "raw",
+        raw_behavior_file_path=ephys_folder_path / "rawdata.mat",
+        processed_behavior_file_path=ephys_folder_path / "data.mat",
+        trial_table_file_path=ephys_folder_path / "trial_info.mat",
+        states_folder_path=ephys_folder_path,
+    )
+    segmentation_folder_path = data_folder_path / "Segmentation" / session_name
+    if session_type == "single_color":
+        cell_type_id = 0 if cell_type == "neuron" else 1
+        session_paths.update(segmentation_file_path=segmentation_folder_path / f"Cells{cell_type_id}_clean.mat")
+    else:
+        session_paths.update(
+            neuron_segmentation_file_path=segmentation_folder_path / "cells1.mat",
+            glia_segmentation_file_path=segmentation_folder_path / "cells0.mat",
+        )
+    return session_paths
+
+
+def get_session_metadata(session_name: str, timezone: str = "US/Eastern") -> dict:
+    """Extract the session start time and subject information encoded in the session name."""
+    session_name_split = session_name.split("_")
+    subject_number = session_name_split[1]
+    session_start_date = session_name_split[-2]
+
+    session_start_time = datetime.strptime("".join(session_name_split[-2:]), "%Y%m%d%H%M%S")
+    session_start_time = session_start_time.replace(tzinfo=tz.gettz(timezone))
+
+    subject_id = "_".join([session_start_date, subject_number])
+    # dpf = days post fertilization
+    subject_age = "P" + next(string for string in session_name_split if "dpf" in string).replace("dpf", "D")
+    subject_sex = "U"  # U = unknown
+    return dict(
+        NWBFile=dict(session_start_time=session_start_time),
+        Subject=dict(subject_id=subject_id, age=subject_age, sex=subject_sex),
+    )
+
+
+def _add_behavior_source_data(source_data: dict, session_paths: dict, behavior_rate: float):
+    """Some of these may not exist and that's OK (existence is checked before adding it to the conversion)."""
+    if session_paths["raw_behavior_file_path"].exists():
+        source_data.update(
+            RawBehavior=dict(
+                data_file_path=str(session_paths["raw_behavior_file_path"]),
+                metadata_file_path=str(METADATA_FOLDER / "yu_mu_cell_2019_behavior_descriptions.yml"),
+                sampling_frequency=behavior_rate,
+            )
+        )
+    if session_paths["processed_behavior_file_path"].exists():
+        source_data.update(
+            ProcessedBehavior=dict(
+                file_path=str(session_paths["processed_behavior_file_path"]), sampling_frequency=behavior_rate
+            ),
+            SwimIntervals=dict(
+                file_path=str(session_paths["processed_behavior_file_path"]), sampling_frequency=behavior_rate
+            ),
+        )
+    if session_paths["trial_table_file_path"].exists():
+        source_data.update(
+            Trials=dict(file_path=str(session_paths["trial_table_file_path"]), sampling_frequency=behavior_rate),
+        )
+    source_data.update(
+        ActivityStates=dict(folder_path=str(session_paths["states_folder_path"]), sampling_frequency=behavior_rate)
+    )
+
+
+def _add_compression_options(
+    conversion_options: dict, source_data: dict, compression: Optional[dict], backend: str = "hdf5"
+):
+    """Interfaces whose type of series is not in 'compression' keep their default compression."""
+    for interface_name, series_type in INTERFACE_SERIES_TYPES.items():
+        if interface_name in source_data and series_type in (compression or dict()):
+            conversion_options.setdefault(interface_name, dict()).update(
+                compression_options=get_compression_options(**compression[series_type], backend=backend)
+            )
+
+
+def _get_progress_options(description: str, position: int, display_progress: bool) -> dict:
+    if not display_progress:
+        return dict()
+    return dict(display_progress=True, progress_bar_options=dict(desc=description, position=position))
+
+
+def _get_stub_source_data(stub_test: bool, stub_frames: int, stub_rois: Optional[int] = None) -> dict:
+    """Stubs are bounded as the interfaces are constructed, so only the stubbed part of each source is read."""
+    if not stub_test:
+        return dict()
+    if stub_rois is None:
+        return dict(stub_frames=stub_frames)
+    return dict(stub_frames=stub_frames, stub_rois=stub_rois)
+
+
+def _get_stub_num_timestamps(manifests: List[FrameFileManifest], num_frames: int, frame_offset: int = 0) -> int:
+    """The number of tracker timestamps needed by the frame files of stubbed manifests and the first trace frames."""
+    num_timestamps = num_frames
+    for manifest in manifests:
+        frame_numbers = manifest.frame_numbers
+        num_frame_files = frame_numbers[-1] + 1 if frame_numbers else len(manifest.entries)
+        num_timestamps = max(num_timestamps, frame_offset + num_frame_files)
+    return num_timestamps
+
+
+def _get_segmentation_timestamps(
+    frame_tracker_timestamps: FrameTrackerTimestamps,
+    num_frames: int,
+    stub_test: bool,
+) -> np.ndarray:
+    """The traces span every frame of the tracker; stubs only span their first `num_frames`."""
+    if stub_test:
+        return frame_tracker_timestamps.timestamps[:num_frames]
+    return frame_tracker_timestamps.timestamps
+
+
+def _update_metadata(
+    converter, session_name: str, session_description: str, ophys_metadata_path: Optional[Path], timezone: str
+):
+    metadata = converter.get_metadata()
+    metadata["NWBFile"].update(session_description=session_description)
+
+    # Update global metadata
+    global_metadata_from_yaml = load_dict_from_file(file_path=METADATA_FOLDER / "yu_mu_cell_2019_global_metadata.yml")
+    metadata = dict_deep_update(metadata, global_metadata_from_yaml)
+
+    # Add session start time and subject info
+    metadata = dict_deep_update(metadata, get_session_metadata(session_name=session_name, timezone=timezone))
+
+    # Add experiment-specific ophys metadata
+    if ophys_metadata_path is not None:
+        ophys_metadata_from_yaml = load_dict_from_file(file_path=ophys_metadata_path)
+        metadata = dict_deep_update(metadata, ophys_metadata_from_yaml, append_list=False)
+    return metadata
+
+
+def single_color_session_to_nwb(
+    session_name: str,
+    data_folder_path: FolderPathType,
+    nwbfile_path: FilePathType,
+    cell_type: str = "neuron",
+    include_ophys: bool = True,
+    stub_test: bool = False,
+    stub_frames: int = 4,
+    stub_rois: int = 100,
+    timezone: str = "US/Eastern",
+    imaging_rate: float = SINGLE_COLOR_IMAGING_RATE,
+    behavior_rate: float = BEHAVIOR_RATE,
+    display_progress: bool = True,
+    overwrite: bool = True,
+    resumable: bool = False,
+    compression: Optional[dict] = None,
+    backend: str = "hdf5",
+    max_workers: Optional[int] = None,
+    session_paths: Optional[dict] = None,
+    read_profile: str = "frame",
+    memory_gb: Optional[float] = None,
+    summary_images: bool = False,
+    binned_series_options: Optional[dict] = None,
+    frame_offset: int = 0,
+    allow_missing_trailing_frames: bool = False,
+):
+    """
+    Convert an entire single-color session of data using the NWBConverter.
+
+    Parameters
+    ----------
+    session_name : str
+        For example, '20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241'.
+    data_folder_path : FolderPathType
+        The folder holding the 'Imaging' and 'Segmentation' folders, e.g., 'E:/Ahrens'.
+    nwbfile_path : FilePathType
+        Where to write the NWB file.
+    cell_type : str, default: "neuron"
+        Either 'neuron' or 'glia'.
+    include_ophys : bool, default: True
+        Whether to include the imaging and segmentation; if False, only the behavior is converted.
+    stub_test : bool, default: False
+        True for a fast prototype file, False for converting the entire session.
+    stub_frames : int, default: 4
+        Length of stub file, if stub_test=True. Only these frame files are discovered, and only the timestamps and
+        trace frames they need are read.
+    stub_rois : int, default: 100
+        Number of ROIs of each segmentation, if stub_test=True; the first ROIs are read and the rest never touched.
+    resumable : bool, default: False
+        Record the progress of the write next to the NWB file, so that an interrupted conversion continues from the
+        last completed buffer of each dataset when run again. The summary images and the binned series are only
+        written by a run that writes every frame, so they are skipped (with a warning) when a write is resumed.
+    compression : dict, optional
+        The compression of each type of series ('imaging', 'fluorescence' or 'behavior'), as keyword arguments of
+        `get_compression_options`; e.g., dict(imaging=dict(method="blosc-zstd", level=3)).
+        Types that are not specified use the defaults of `DEFAULT_COMPRESSION` (or `DEFAULT_ZARR_COMPRESSION`).
+    backend : str, default: "hdf5"
+        Either 'hdf5', or 'zarr' to write a local NWB-Zarr store at 'nwbfile_path' with parallel chunk writes.
+    max_workers : int, optional
+        For the Zarr backend, the number of threads compressing and writing chunks. Defaults to the number of CPUs.
+    session_paths : dict, optional
+        Overrides for any of the paths returned by `get_session_paths`.
+    read_profile : str, default: "frame"
+        How the imaging data will most often be read, which determines the shape of its chunks: 'frame' for whole
+        planes of single frames, 'timeseries' for long time series of small regions, or 'balanced' for both.
+    memory_gb : float, optional
+        A limit on the memory of the conversion, in GB, which shrinks the buffers of the imaging, traces and behavior
+        to fit alongside the data held in memory (see `MemoryBudget`). The observed peak is recorded in the
+        performance report. If not specified, each iterator uses buffers of up to 0.5 GB.
+    summary_images : bool, default: False
+        Whether to accumulate the per-voxel mean, maximum and variance of the imaging while its frames are written,
+        and add them to the 'ophys' processing module as `Images` of each plane.
+    binned_series_options : dict, optional
+        If specified, also add a low-resolution copy of the imaging to the 'ophys' processing module, averaged over
+        bins of `frames_per_bin` frames and of `pixels_per_bin` pixels; e.g., dict(frames_per_bin=100, pixels_per_bin=4).
+    frame_offset : int, default: 0
+        The frame of the tracker acquired with the frame file numbered zero, e.g., when the imaging of the first
+        frames is missing but the files are numbered from zero. The conversion fails if the tracker holds more frames
+        than the files account for, asking for this offset.
+    allow_missing_trailing_frames : bool, default: False
+        Whether the last frame files of the session may be missing, in which case the tracker frames past the last
+        file are dropped with a warning.
+    """
+    session_paths = dict(
+        get_session_paths(
+            session_name=session_name,
+            data_folder_path=data_folder_path,
+            session_type="single_color",
+            cell_type=cell_type,
+        ),
+        **{key: Path(value) for key, value in (session_paths or dict()).items()},
+    )
+
+    source_data = dict()
+    conversion_options = dict()
+    if include_ophys:
+        source_data.update(
+            Imaging=dict(
+                folder_path=str(session_paths["imaging_folder_path"]),
+                sampling_frequency=imaging_rate,
+                **_get_stub_source_data(stub_test=stub_test, stub_frames=stub_frames),
+            ),
+            SingleColorSegmentation=dict(
+                file_path=str(session_paths["segmentation_file_path"]),
+                sampling_frequency=imaging_rate,
+                **_get_stub_source_data(stub_test=stub_test, stub_frames=stub_frames, stub_rois=stub_rois),
+            ),
+        )
+        conversion_options.update(
+            Imaging=dict(
+                stub_test=stub_test,
+                stub_frames=stub_frames,
+                read_profile=read_profile,
+                summary_images=summary_images,
+                binned_series_options=binned_series_options or dict(),
+                iterator_options=dict(
+                    buffer_gb=0.5,
+                    **_get_progress_options(
+                        description="Converting imaging data...", position=0, display_progress=display_progress
+                    ),
+                ),
+            ),
+            SingleColorSegmentation=dict(
+                stub_test=stub_test,
+                stub_frames=stub_frames,
+                iterator_options=dict(
+                    buffer_gb=0.5,
+                    **_get_progress_options(
+                        description="Converting segmentation data...", position=1, display_progress=display_progress
+                    ),
+                ),
+            ),
+        )
+    _add_behavior_source_data(source_data=source_data, session_paths=session_paths, behavior_rate=behavior_rate)
+    _add_compression_options(
+        conversion_options=conversion_options, source_data=source_data, compression=compression, backend=backend
+    )
+
+    converter = YuMuCell2019SingleColorNWBConverter(source_data=source_data)
+
+    if include_ophys:
+        # Add synchronized timestamps to all imaging and segmentation objects
+        # These are derived once from the frame tracker and reused from the session folder on later runs
+        imaging_extractor = converter.data_interface_objects["Imaging"].imaging_extractor
+        segmentation_extractor = converter.data_interface_objects["SingleColorSegmentation"].segmentation_extractor
+        frame_tracker_timestamps = FrameTrackerTimestamps(
+            file_path=session_paths["processed_behavior_file_path"],
+            sampling_frequency=behavior_rate,
+            max_num_frames=(
+                _get_stub_num_timestamps(
+                    manifests=[imaging_extractor.manifest],
+                    num_frames=segmentation_extractor.get_num_frames(),
+                    frame_offset=frame_offset,
+                )
+                if stub_test
+                else None
+            ),
+        )
+        # Frames missing from the folder (e.g., all data prior to the first file) are skipped using the file names
+        imaging_timestamps = frame_tracker_timestamps.get_frame_file_timestamps(
+            manifest=imaging_extractor.manifest,
+            frame_offset=frame_offset,
+            allow_missing_trailing_frames=allow_missing_trailing_frames,
+        )
+        imaging_extractor.set_times(times=imaging_timestamps)
+        segmentation_extractor.set_times(
+            times=_get_segmentation_timestamps(
+                frame_tracker_timestamps=frame_tracker_timestamps,
+                num_frames=segmentation_extractor.get_num_frames(),
+                stub_test=stub_test,
+            )
+        )
+
+    metadata = _update_metadata(
+        converter=converter,
+        session_name=session_name,
+        session_description=SINGLE_COLOR_SESSION_DESCRIPTION,
+        ophys_metadata_path=(
+            METADATA_FOLDER / f"yu_mu_cell_2019_single_color_{cell_type}_metadata.yml" if include_ophys else None
+        ),
+        timezone=timezone,
+    )
+    converter.run_conversion(
+        metadata=metadata,
+        nwbfile_path=nwbfile_path,
+        conversion_options=conversion_options,
+        overwrite=overwrite,
+        resumable=resumable,
+        backend=backend,
+        max_workers=max_workers,
+        memory_gb=memory_gb,
+    )
+
+
+def dual_color_session_to_nwb(
+    session_name: str,
+    data_folder_path: FolderPathType,
+    nwbfile_path: FilePathType,
+    include_ophys: bool = True,
+    stub_test: bool = False,
+    stub_frames: int = 4,
+    stub_rois: int = 100,
+    timezone: str = "US/Eastern",
+    imaging_rate: float = DUAL_COLOR_IMAGING_RATE,
+    behavior_rate: float = BEHAVIOR_RATE,
+    display_progress: bool = True,
+    overwrite: bool = True,
+    resumable: bool = False,
+    compression: Optional[dict] = None,
+    backend: str = "hdf5",
+    max_workers: Optional[int] = None,
+    session_paths: Optional[dict] = None,
+    read_profile: str = "frame",
+    memory_gb: Optional[float] = None,
+    summary_images: bool = False,
+    binned_series_options: Optional[dict] = None,
+    frame_offset: int = 0,
+    allow_missing_trailing_frames: bool = False,
+):
+    """
+    Convert an entire dual-color session of data using the NWBConverter.
+
+    Parameters
+    ----------
+    session_name : str
+        For example, '20170228_4_1_gfaprgeco_hucgc_6dpf_shorttrials_20170228_185002'.
+    data_folder_path : FolderPathType
+        The folder holding the 'Imaging' and 'Segmentation' folders, e.g., 'E:/Ahrens'.
+    nwbfile_path : FilePathType
+        Where to write the NWB file.
+    include_ophys : bool, default: True
+        Whether to include the imaging and segmentation; if False, only the behavior is converted.
+    stub_test : bool, default: False
+        True for a fast prototype file, False for converting the entire session.
+    stub_frames : int, default: 4
+        Length of stub file, if stub_test=True. Only these frame files are discovered, and only the timestamps and
+        trace frames they need are read.
+    stub_rois : int, default: 100
+        Number of ROIs of each segmentation, if stub_test=True; the first ROIs are read and the rest never touched.
+    resumable : bool, default: False
+        Record the progress of the write next to the NWB file, so that an interrupted conversion continues from the
+        last completed buffer of each dataset when run again. The summary images and the binned series are only
+        written by a run that writes every frame, so they are skipped (with a warning) when a write is resumed.
+    compression : dict, optional
+        The compression of each type of series ('imaging', 'fluorescence' or 'behavior'), as keyword arguments of
+        `get_compression_options`; e.g., dict(imaging=dict(method="blosc-zstd", level=3)).
+        Types that are not specified use the defaults of `DEFAULT_COMPRESSION` (or `DEFAULT_ZARR_COMPRESSION`).
+    backend : str, default: "hdf5"
+        Either 'hdf5', or 'zarr' to write a local NWB-Zarr store at 'nwbfile_path' with parallel chunk writes.
+    max_workers : int, optional
+        For the Zarr backend, the number of threads compressing and writing chunks. Defaults to the number of CPUs.
+    session_paths : dict, optional
+        Overrides for any of the paths returned by `get_session_paths`.
+    read_profile : str, default: "frame"
+        How the imaging data will most often be read, which determines the shape of its chunks: 'frame' for whole
+        planes of single frames, 'timeseries' for long time series of small regions, or 'balanced' for both.
+    memory_gb : float, optional
+        A limit on the memory of the conversion, in GB, which shrinks the buffers of the imaging, traces and behavior
+        to fit alongside the data held in memory (see `MemoryBudget`). The observed peak is recorded in the
+        performance report. If not specified, each iterator uses buffers of up to 0.5 GB.
+    summary_images : bool, default: False
+        Whether to accumulate the per-voxel mean, maximum and variance of the imaging while its frames are written,
+        and add them to the 'ophys' processing module as `Images` of each plane.
+    binned_series_options : dict, optional
+        If specified, also add a low-resolution copy of the imaging to the 'ophys' processing module, averaged over
+        bins of `frames_per_bin` frames and of `pixels_per_bin` pixels; e.g., dict(frames_per_bin=100, pixels_per_bin=4).
+    frame_offset : int, default: 0
+        The frame of the tracker acquired with the frame file numbered zero, e.g., when the imaging of the first
+        frames is missing but the files are numbered from zero. The conversion fails if the tracker holds more frames
+        than the files account for, asking for this offset.
+    allow_missing_trailing_frames : bool, default: False
+        Whether the last frame files of the session may be missing, in which case the tracker frames past the last
+        file are dropped with a warning.
+    """
+    session_paths = dict(
+        get_session_paths(session_name=session_name, data_folder_path=data_folder_path, session_type="dual_color"),
+        **{key: Path(value) for key, value in (session_paths or dict()).items()},
+    )
+
+    source_data = dict()
+    conversion_options = dict()
+    if include_ophys:
+        for index, (interface_name, region, population) in enumerate(
+            [("NeuronImaging", "top", "neuron"), ("GliaImaging", "bottom", "glia")]
+        ):
+            source_data[interface_name] = dict(
+                folder_path=str(session_paths["imaging_folder_path"]),
+                sampling_frequency=imaging_rate,
+                region=region,
+                **_get_stub_source_data(stub_test=stub_test, stub_frames=stub_frames),
+            )
+            conversion_options[interface_name] = dict(
+                imaging_plane_index=index,
+                two_photon_series_index=index,
+                stub_test=stub_test,
+                stub_frames=stub_frames,
+                read_profile=read_profile,
+                summary_images=summary_images,
+                binned_series_options=binned_series_options or dict(),
+                iterator_options=dict(
+                    buffer_gb=0.5,
+                    **_get_progress_options(
+                        description=f"Converting {population} imaging data...",
+                        position=index,
+                        display_progress=display_progress,
+                    ),
+                ),
+            )
+        source_data.update(
+            DualColorSegmentation=dict(
+                neuron_file_path=str(session_paths["neuron_segmentation_file_path"]),
+                glia_file_path=str(session_paths["glia_segmentation_file_path"]),
+                sampling_frequency=imaging_rate,
+                **_get_stub_source_data(stub_test=stub_test, stub_frames=stub_frames, stub_rois=stub_rois),
+            ),
+        )
+        conversion_options.update(
+            DualColorSegmentation=dict(
+                stub_test=stub_test,
+                stub_frames=stub_frames,
+                iterator_options=dict(
+                    buffer_gb=0.5,
+                    **_get_progress_options(
+                        description="Converting segmentation data...", position=2, display_progress=display_progress
+                    ),
+                ),
+            ),
+        )
+    _add_behavior_source_data(source_data=source_data, session_paths=session_paths, behavior_rate=behavior_rate)
+    _add_compression_options(
+        conversion_options=conversion_options, source_data=source_data, compression=compression, backend=backend
+    )
+
+    converter = YuMuCell2019DualColorNWBConverter(source_data=source_data)
+
+    if include_ophys:
+        # Add synchronized timestamps to all imaging and segmentation objects
+        # These are derived once from the frame tracker and reused from the session folder on later runs
+        imaging_extractors = [
+            converter.data_interface_objects[imaging_interface_name].imaging_extractor
+            for imaging_interface_name in ["NeuronImaging", "GliaImaging"]
+        ]
+        segmentation_interface = converter.data_interface_objects["DualColorSegmentation"]
+        segmentation_extractors = [
+            segmentation_interface.neuron_segmentation_extractor,
+            segmentation_interface.glia_segmentation_extractor,
+        ]
+        frame_tracker_timestamps = FrameTrackerTimestamps(
+            file_path=session_paths["processed_behavior_file_path"],
+            sampling_frequency=behavior_rate,
+            max_num_frames=(
+                _get_stub_num_timestamps(
+                    manifests=[imaging_extractor.manifest for imaging_extractor in imaging_extractors],
+                    num_frames=max(extractor.get_num_frames() for extractor in segmentation_extractors),
+                    frame_offset=frame_offset,
+                )
+                if stub_test
+                else None
+            ),
+        )
+        for imaging_extractor in imaging_extractors:
+            # Frames missing from the folder (e.g., at the end of a corrupted session) are skipped using the file names
+            # when allowed
+            imaging_timestamps = frame_tracker_timestamps.get_frame_file_timestamps(
+                manifest=imaging_extractor.manifest,
+                frame_offset=frame_offset,
+                allow_missing_trailing_frames=allow_missing_trailing_frames,
+            )
+            imaging_extractor.set_times(times=imaging_timestamps)
+        for segmentation_extractor in segmentation_extractors:
+            segmentation_extractor.set_times(
+                times=_get_segmentation_timestamps(
+                    frame_tracker_timestamps=frame_tracker_timestamps,
+                    num_frames=segmentation_extractor.get_num_frames(),
+                    stub_test=stub_test,
+                )
+            )
+
+    metadata = _update_metadata(
+        converter=converter,
+        session_name=session_name,
+        session_description=DUAL_COLOR_SESSION_DESCRIPTION,
+        ophys_metadata_path=(
+            METADATA_FOLDER / "yu_mu_cell_2019_dual_color_neuron_metadata.yml" if include_ophys else None
+        ),
+        timezone=timezone,
+    )
+    converter.run_conversion(
+        metadata=metadata,
+        nwbfile_path=nwbfile_path,
+        conversion_options=conversion_options,
+        overwrite=overwrite,
+        resumable=resumable,
+        backend=backend,
+        max_workers=max_workers,
+        memory_gb=memory_gb,
+    )
@@ -0,0 +1,178 @@
+"""
+Time the startup of a conversion: importing the package, its converters and interfaces, constructing the converters
+on a synthetic session and retrieving their metadata.
+
+Every measurement runs in a fresh interpreter, so that no module is already imported, and the median over the repeats
+is reported. Usage:
+
+    python yu_mu_cell_2019_import_benchmark.py --session-type dual_color --repeats 5 --import-time
+
+With '--import-time', the modules taking the longest to import the converters are also listed (see 'python -X
+importtime'). The synthetic data are written to a temporary folder, removed afterwards, unless '--data-folder-path'
+is given.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019 import __all__ as INTERFACE_NAMES
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import (
+    DUAL_COLOR_FRAME_SHAPE,
+    SINGLE_COLOR_FRAME_SHAPE,
+    write_synthetic_session,
+)
+
+PACKAGE_NAME = "ahrens_lab_to_nwb.yu_mu_cell_2019"
+SESSION_NAMES = dict(
+    single_color="20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241",
+    dual_color="20170228_4_1_gfaprgeco_hucgc_6dpf_shorttrials_20170228_185002",
+)
+FRAME_SHAPES = dict(single_color=SINGLE_COLOR_FRAME_SHAPE, dual_color=DUAL_COLOR_FRAME_SHAPE)
+CONVERTER_NAMES = dict(
+    single_color="YuMuCell2019SingleColorNWBConverter", dual_color="YuMuCell2019DualColorNWBConverter"
+)
+
+_IMPORT_STATEMENT = """
+import time
+start_time = time.perf_counter()
+{statement}
+print(time.perf_counter() - start_time)
+"""
+
+# Prints the seconds spent constructing the converter, then retrieving its metadata
+_CONVERTER_STATEMENT = """
+import json, time
+from {package_name}.yu_mu_cell_2019_interface_benchmark import get_interfaces
+from {package_name}.yu_mu_cell_2019_nwbconverter import {converter_name} as Converter
+interfaces = get_interfaces(
+    session_paths=json.loads({session_paths!r}), session_type={session_type!r}, frame_shape={frame_shape!r}
+)
+source_data = {{name: interface[1] for name, interface in interfaces.items()}}
+start_time = time.perf_counter()
+converter = Converter(source_data=source_data, verbose=False)
+print(time.perf_counter() - start_time)
+start_time = time.perf_counter()
+converter.get_metadata()
+print(time.perf_counter() - start_time)
+"""
+
+
+def _run(code: str, options: Optional[List[str]] = None) -> subprocess.CompletedProcess:
+    """Run the code in a fresh interpreter, raising its error output if it fails."""
+    completed_process = subprocess.run([sys.executable, *(options or []), "-c", code], capture_output=True, text=True)
+    if completed_process.returncode != 0:
+        raise RuntimeError(f"The measurement failed:\n{completed_process.stderr}")
+    return completed_process
+
+
+def time_statement(statement: str, repeats: int = 3) -> float:
+    """The median seconds taken by the `statement` in a fresh interpreter."""
+    return statistics.median(
+        float(_run(code=_IMPORT_STATEMENT.format(statement=statement)).stdout.split()[-1]) for _ in range(repeats)
+    )
+
+
+def time_converter(session_paths: dict, session_type: str, frame_shape: tuple, repeats: int = 3) -> dict:
+    """The median seconds taken to construct the converter of the session type, and to retrieve its metadata."""
+    code = _CONVERTER_STATEMENT.format(
+        package_name=PACKAGE_NAME,
+        converter_name=CONVERTER_NAMES[session_type],
+        session_paths=json.dumps({key: str(value) for key, value in session_paths.items()}),
+        session_type=session_type,
+        frame_shape=tuple(frame_shape),
+    )
+    timings = [[float(line) for line in _run(code=code).stdout.split()[-2:]] for _ in range(repeats)]
+    return dict(
+        init=statistics.median(timing[0] for timing in timings),
+        get_metadata=statistics.median(timing[1] for timing in timings),
+    )
+
+
+def get_slowest_imports(statement: str, num_modules: int = 10) -> List[tuple]:
+    """The (module, cumulative seconds) slowest to import with the `statement`, from 'python -X importtime'."""
+    records = []
+    for line in _run(code=statement, options=["-X", "importtime"]).stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_microseconds, module_name = line[len("import time:") :].split("|")
+        records.append((module_name.strip(), int(cumulative_microseconds) / 1e6))
+    return sorted(records, key=lambda record: record[1], reverse=True)[:num_modules]
+
+
+def benchmark_startup(session_paths: dict, session_type: str, frame_shape: tuple, repeats: int = 3) -> dict:
+    """
+    Measure the startup of the conversion of a session.
+
+    Returns
+    -------
+    results : dict
+        The median seconds of importing the package ('package'), the converters ('converters') and each interface
+        (by name), and of constructing the converter of the session ('converter_init') and retrieving its metadata
+        ('get_metadata').
+    """
+    results = dict(
+        package=time_statement(statement=f"import {PACKAGE_NAME}", repeats=repeats),
+        converters=time_statement(statement=f"import {PACKAGE_NAME}.yu_mu_cell_2019_nwbconverter", repeats=repeats),
+    )
+    for interface_name in INTERFACE_NAMES:
+        results[interface_name] = time_statement(
+            statement=f"from {PACKAGE_NAME} import {interface_name}", repeats=repeats
+        )
+    converter_timings = time_converter(
+        session_paths=session_paths, session_type=session_type, frame_shape=frame_shape, repeats=repeats
+    )
+    results.update(converter_init=converter_timings["init"], get_metadata=converter_timings["get_metadata"])
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Time the imports and construction of the converters.")
+    parser.add_argument("--session-type", choices=["single_color", "dual_color"], default="single_color")
+    parser.add_argument("--num-frames", type=int, default=10, help="Number of imaging frames and trace samples.")
+    parser.add_argument("--num-rois", type=int, default=1000, help="Number of ROIs of each segmentation.")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of fresh interpreters for each measurement.")
+    parser.add_argument("--import-time", action="store_true", help="Also list the slowest imports of the converters.")
+    parser.add_argument("--data-folder-path", help="Where to write, or reuse, the synthetic session.")
+    parser.add_argument("--output-file-path", help="Also save the results as JSON.")
+    arguments = parser.parse_args(argv)
+
+    session_name = SESSION_NAMES[arguments.session_type]
+    frame_shape = FRAME_SHAPES[arguments.session_type]
+    with tempfile.TemporaryDirectory() as temporary_folder_path:
+        session_paths = write_synthetic_session(
+            data_folder_path=Path(arguments.data_folder_path or temporary_folder_path),
+            session_name=session_name,
+            session_type=arguments.session_type,
+            num_frames=arguments.num_frames,
+            num_rois=arguments.num_rois,
+        )
+        results = benchmark_startup(
+            session_paths=session_paths,
+            session_type=arguments.session_type,
+            frame_shape=frame_shape,
+            repeats=arguments.repeats,
+        )
+
+    print(f"{'measurement':<44}{'seconds':>10}")
+    for name, seconds in results.items():
+        print(f"{name:<44}{seconds:>10.3f}")
+
+    if arguments.import_time:
+        print(f"\n{'slowest imports of the converters':<80}{'seconds':>10}")
+        for module_name, seconds in get_slowest_imports(
+            statement=f"import {PACKAGE_NAME}.yu_mu_cell_2019_nwbconverter"
+        ):
+            print(f"{module_name:<80}{seconds:>10.3f}")
+
+    if arguments.output_file_path is not None:
+        with open(arguments.output_file_path, mode="w") as file:
+            json.dump(dict(session_type=arguments.session_type, repeats=arguments.repeats, seconds=results), file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Time and memory-profile the conversion of every interface on a synthetic session of configurable scale.
+
+Each interface is constructed, run on a fresh in-memory NWBFile and written to its own file, measuring the wall time,
+I/O and peak resident memory of each of these phases, as well as the reads and writes of the buffers of its data
+(see `PerformanceReport`). Usage:
+
+    python yu_mu_cell_2019_interface_benchmark.py --session-type dual_color --num-frames 20 \\
+        --frame-shape 29 512 512 --num-rois 20000 --output-file-path benchmark.json
+
+The synthetic data are written to a temporary folder, removed afterwards, unless '--data-folder-path' is given.
+"""
+import argparse
+import json
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from pynwb import NWBHDF5IO
+from neuroconv.tools.nwb_helpers import make_nwbfile_from_metadata
+from neuroconv.utils import dict_deep_update, load_dict_from_file
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019 import (
+    AhrensHdf5ImagingInterface,
+    YuMu2019SingleColorSegmentationInterface,
+    YuMu2019DualColorSegmentationInterface,
+    YuMu2019RawBehaviorInterface,
+    YuMu2019ProcessedBehaviorInterface,
+    YuMu2019TrialsInterface,
+    YuMu2019SwimIntervalsInterface,
+    YuMu2019ActivityStatesInterface,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_chunk_shape import READ_PROFILES
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_performance_report import (
+    PerformanceReport,
+    attach_performance_report,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import (
+    DUAL_COLOR_FRAME_SHAPE,
+    SINGLE_COLOR_FRAME_SHAPE,
+    write_synthetic_session,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_convert_session import (
+    BEHAVIOR_RATE,
+    DUAL_COLOR_IMAGING_RATE,
+    METADATA_FOLDER,
+    SINGLE_COLOR_IMAGING_RATE,
+    get_session_metadata,
+)
+
+SESSION_NAMES = dict(
+    single_color="20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241",
+    dual_color="20170228_4_1_gfaprgeco_hucgc_6dpf_shorttrials_20170228_185002",
+)
+
+FRAME_SHAPES = dict(single_color=SINGLE_COLOR_FRAME_SHAPE, dual_color=DUAL_COLOR_FRAME_SHAPE)
+
+
+def get_interfaces(session_paths: dict, session_type: str, frame_shape: tuple, read_profile: str = "frame") -> dict:
+    """
+    Configure the interfaces of a session as the session conversions do.
+
+    Parameters
+    ----------
+    session_paths : dict
+        The paths of the source files of the session, as returned by `get_session_paths`.
+    session_type : {'single_color', 'dual_color'}
+    frame_shape : tuple
+        The shape of a frame file (planes, height, width).
+    read_profile : str, default: "frame"
+        The read profile the imaging series are chunked for (see `get_imaging_chunk_shape`).
+
+    Returns
+    -------
+    interfaces : dict
+        Maps the name of each interface to its class, source data, conversion options and the names of the imaging
+        interfaces whose series it references.
+    """
+    behavior_interfaces = dict(
+        RawBehavior=(
+            YuMu2019RawBehaviorInterface,
+            dict(
+                data_file_path=str(session_paths["raw_behavior_file_path"]),
+                metadata_file_path=str(METADATA_FOLDER / "yu_mu_cell_2019_behavior_descriptions.yml"),
+                sampling_frequency=BEHAVIOR_RATE,
+            ),
+            dict(),
+            [],
+        ),
+        ProcessedBehavior=(
+            YuMu2019ProcessedBehaviorInterface,
+            dict(file_path=str(session_paths["processed_behavior_file_path"]), sampling_frequency=BEHAVIOR_RATE),
+            dict(),
+            [],
+        ),
+        SwimIntervals=(
+            YuMu2019SwimIntervalsInterface,
+            dict(file_path=str(session_paths["processed_behavior_file_path"]), sampling_frequency=BEHAVIOR_RATE),
+            dict(),
+            [],
+        ),
+        Trials=(
+            YuMu2019TrialsInterface,
+            dict(file_path=str(session_paths["trial_table_file_path"]), sampling_frequency=BEHAVIOR_RATE),
+            dict(),
+            [],
+        ),
+        ActivityStates=(
+            YuMu2019ActivityStatesInterface,
+            dict(folder_path=str(session_paths["states_folder_path"]), sampling_frequency=BEHAVIOR_RATE),
+            dict(),
+            [],
+        ),
+    )
+
+    if session_type == "single_color":
+        ophys_interfaces = dict(
+            Imaging=(
+                AhrensHdf5ImagingInterface,
+                dict(
+                    folder_path=str(session_paths["imaging_folder_path"]),
+                    sampling_frequency=SINGLE_COLOR_IMAGING_RATE,
+                    shape=list(frame_shape),
+                    dtype="int16",
+                ),
+                dict(read_profile=read_profile, iterator_options=dict(buffer_gb=0.5)),
+                [],
+            ),
+            SingleColorSegmentation=(
+                YuMu2019SingleColorSegmentationInterface,
+                dict(
+                    file_path=str(session_paths["segmentation_file_path"]),
+                    sampling_frequency=SINGLE_COLOR_IMAGING_RATE,
+                ),
+                dict(iterator_options=dict(buffer_gb=0.5)),
+                ["Imaging"],
+            ),
+        )
+    else:
+        ophys_interfaces = dict()
+        for index, (interface_name, region) in enumerate([("NeuronImaging", "top"), ("GliaImaging", "bottom")]):
+            ophys_interfaces[interface_name] = (
+                AhrensHdf5ImagingInterface,
+                dict(
+                    folder_path=str(session_paths["imaging_folder_path"]),
+                    sampling_frequency=DUAL_COLOR_IMAGING_RATE,
+                    region=region,
+                    shape=list(frame_shape),
+                    dtype="int16",
+                ),
+                dict(
+                    imaging_plane_index=index,
+                    two_photon_series_index=index,
+                    read_profile=read_profile,
+                    iterator_options=dict(buffer_gb=0.5),
+                ),
+                [],
+            )
+        ophys_interfaces.update(
+            DualColorSegmentation=(
+                YuMu2019DualColorSegmentationInterface,
+                dict(
+                    neuron_file_path=str(session_paths["neuron_segmentation_file_path"]),
+                    glia_file_path=str(session_paths["glia_segmentation_file_path"]),
+                    sampling_frequency=DUAL_COLOR_IMAGING_RATE,
+                ),
+                dict(iterator_options=dict(buffer_gb=0.5)),
+                ["NeuronImaging", "GliaImaging"],
+            )
+        )
+    return dict(ophys_interfaces, **behavior_interfaces)
+
+
+def benchmark_interfaces(
+    session_paths: dict,
+    session_name: str,
+    session_type: str,
+    frame_shape: tuple,
+    output_folder_path: Path,
+    interface_names: Optional[List[str]] = None,
+    read_profile: str = "frame",
+) -> dict:
+    """
+    Measure the 'init', 'run_conversion' and 'write' phases of each interface on its own NWBFile.
+
+    Interfaces referencing imaging series (the segmentations) are run on a file already holding a single frame
+    of each referenced series; adding that frame is not measured, and writing it takes a negligible time.
+    The imaging series are chunked for the `read_profile` (see `get_imaging_chunk_shape`).
+
+    Returns
+    -------
+    results : dict
+        Maps the name of each interface to the records of its phases, as in `PerformanceReport`, and the size of its
+        file ('file_mb'). The 'data_write' phase is the part of the 'write' spent on the buffers of the interface.
+    """
+    interfaces = get_interfaces(
+        session_paths=session_paths, session_type=session_type, frame_shape=frame_shape, read_profile=read_profile
+    )
+    metadata = dict_deep_update(
+        load_dict_from_file(file_path=METADATA_FOLDER / "yu_mu_cell_2019_global_metadata.yml"),
+        get_session_metadata(session_name=session_name),
+    )
+    ophys_metadata_file_name = (
+        "yu_mu_cell_2019_single_color_neuron_metadata.yml"
+        if session_type == "single_color"
+        else "yu_mu_cell_2019_dual_color_neuron_metadata.yml"
+    )
+    metadata = dict_deep_update(metadata, load_dict_from_file(file_path=METADATA_FOLDER / ophys_metadata_file_name))
+
+    performance_report = PerformanceReport()
+    file_sizes = dict()
+    for interface_name in interface_names or interfaces:
+        assert interface_name in interfaces, f"Unknown interface '{interface_name}'; choose from {list(interfaces)}!"
+        interface_class, source_data, conversion_options, referenced_interface_names = interfaces[interface_name]
+
+        nwbfile = make_nwbfile_from_metadata(metadata=metadata)
+        for referenced_interface_name in referenced_interface_names:
+            referenced_class, referenced_source_data, referenced_options, _ = interfaces[referenced_interface_name]
+            referenced_class(**referenced_source_data).run_conversion(
+                nwbfile=nwbfile, metadata=metadata, **dict(referenced_options, stub_test=True, stub_frames=1)
+            )
+        existing_object_ids = {container.object_id for container in nwbfile.all_children()}
+
+        with performance_report.measure(phase="init", name=interface_name):
+            interface = interface_class(**source_data)
+        with performance_report.measure(phase="run_conversion", name=interface_name):
+            interface.run_conversion(nwbfile=nwbfile, metadata=metadata, **conversion_options)
+        attach_performance_report(
+            containers=[
+                container for container in nwbfile.all_children() if container.object_id not in existing_object_ids
+            ],
+            performance_report=performance_report,
+            key=interface_name,
+        )
+        nwbfile_path = output_folder_path / f"{interface_name}.nwb"
+        with performance_report.measure(phase="write", name=interface_name):
+            with NWBHDF5IO(path=str(nwbfile_path), mode="w") as io:
+                io.write(nwbfile)
+        file_sizes[interface_name] = nwbfile_path.stat().st_size / 1e6
+
+    return {
+        interface_name: dict(records, file_mb=file_sizes[interface_name])
+        for interface_name, records in performance_report.to_dict()["interfaces"].items()
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile every interface on a synthetic session.")
+    parser.add_argument("--session-type", choices=["single_color", "dual_color"], default="single_color")
+    parser.add_argument("--num-frames", type=int, default=10, help="Number of imaging frames and trace samples.")
+    parser.add_argument(
+        "--frame-shape",
+        type=int,
+        nargs=3,
+        default=None,
+        help="The (planes, columns, rows) of each frame. Defaults to the full size of the session type.",
+    )
+    parser.add_argument("--num-rois", type=int, default=1000, help="Number of ROIs of each segmentation.")
+    parser.add_argument("--num-samples", type=int, default=None, help="Number of samples of each behavior channel.")
+    parser.add_argument("--half-precision", action="store_true", help="Store the traces as MATLAB 'half' arrays.")
+    parser.add_argument(
+        "--read-profile", choices=READ_PROFILES, default="frame", help="The read profile chunking the imaging series."
+    )
+    parser.add_argument("--interfaces", nargs="+", default=None, help="Only benchmark these interfaces.")
+    parser.add_argument("--data-folder-path", help="Where to write, or reuse, the synthetic session.")
+    parser.add_argument("--output-file-path", help="Also save the results as JSON.")
+    arguments = parser.parse_args(argv)
+
+    session_name = SESSION_NAMES[arguments.session_type]
+    frame_shape = tuple(arguments.frame_shape or FRAME_SHAPES[arguments.session_type])
+    with tempfile.TemporaryDirectory() as temporary_folder_path:
+        data_folder_path = Path(arguments.data_folder_path or temporary_folder_path)
+        session_paths = write_synthetic_session(
+            data_folder_path=data_folder_path,
+            session_name=session_name,
+            session_type=arguments.session_type,
+            num_frames=arguments.num_frames,
+            frame_shape=frame_shape,
+            num_rois=arguments.num_rois,
+            num_samples=arguments.num_samples,
+            half_precision=arguments.half_precision,
+        )
+        output_folder_path = Path(temporary_folder_path) / "nwb"
+        output_folder_path.mkdir()
+        results = benchmark_interfaces(
+            session_paths=session_paths,
+            session_name=session_name,
+            session_type=arguments.session_type,
+            frame_shape=frame_shape,
+            output_folder_path=output_folder_path,
+            interface_names=arguments.interfaces,
+            read_profile=arguments.read_profile,
+        )
+
+    phases = ["init", "run_conversion", "write"]
+    print(
+        f"{'interface':<24}"
+        + "".join(f"{phase + ' s':>18}" for phase in phases)
+        + f"{'data read s':>14}{'peak RSS MB':>14}{'file MB':>10}{'write MB/s':>12}"
+    )
+    for interface_name, records in results.items():
+        data_read_seconds = records.get("data_write", dict()).get("read_seconds", 0.0)
+        peak_rss_mb = max(records[phase]["peak_rss_mb"] for phase in phases)
+        write_mb_per_second = records["file_mb"] / records["write"]["seconds"]
+        print(
+            f"{interface_name:<24}"
+            + "".join(f"{records[phase]['seconds']:>18.3f}" for phase in phases)
+            + f"{data_read_seconds:>14.3f}{peak_rss_mb:>14.1f}{records['file_mb']:>10.1f}{write_mb_per_second:>12.1f}"
+        )
+
+    if arguments.output_file_path is not None:
+        scale = dict(
+            session_type=arguments.session_type,
+            num_frames=arguments.num_frames,
+            frame_shape=list(frame_shape),
+            num_rois=arguments.num_rois,
+            num_samples=arguments.num_samples,
+            half_precision=arguments.half_precision,
+        )
+        with open(file=arguments.output_file_path, mode="w") as file:
+            json.dump(obj=dict(scale=scale, results=results), fp=file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
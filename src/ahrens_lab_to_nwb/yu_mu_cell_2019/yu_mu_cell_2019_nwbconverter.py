@@ -1,42 +1,474 @@
 """Primary NWBConverter class for this dataset."""
+import importlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+from warnings import warn
+
+import h5py
+from pynwb import NWBFile, NWBHDF5IO
 from neuroconv import NWBConverter
+from neuroconv.tools.nwb_helpers import get_default_nwbfile_metadata, make_nwbfile_from_metadata
+from neuroconv.utils import FilePathType, dict_deep_update
 
-from . import (
-    AhrensHdf5ImagingInterface,
-    YuMu2019SingleColorSegmentationInterface,
-    YuMu2019DualColorSegmentationInterface,
-    YuMu2019RawBehaviorInterface,
-    YuMu2019ProcessedBehaviorInterface,
-    YuMu2019TrialsInterface,
-    YuMu2019SwimIntervalsInterface,
-    YuMu2019ActivityStatesInterface,
+from .tools.yu_mu_cell_2019_compression import get_default_compression_options
+from .tools.yu_mu_cell_2019_memory_budget import DEFAULT_RESERVED_GB, MemoryBudget
+from .tools.yu_mu_cell_2019_performance_report import (
+    PerformanceReport,
+    attach_performance_report,
+    get_default_performance_report_file_path,
 )
+from .tools.yu_mu_cell_2019_summary_images import find_summary_image_accumulators, write_summary_images
+from .tools.yu_mu_cell_2019_write_checkpoint import WriteCheckpoint, find_checkpointed_iterators
+from .tools.yu_mu_cell_2019_zarr_write import PENDING_BUFFERS_PER_WORKER, write_nwbfile_to_zarr
 
+# The type of series written by each interface, which selects its default compression
+INTERFACE_SERIES_TYPES = dict(
+    Imaging="imaging",
+    NeuronImaging="imaging",
+    GliaImaging="imaging",
+    SingleColorSegmentation="fluorescence",
+    DualColorSegmentation="fluorescence",
+    RawBehavior="behavior",
+    ProcessedBehavior="behavior",
+    SwimIntervals="behavior",
+    Trials="behavior",
+    ActivityStates="behavior",
+)
+# The interfaces of each converter are imported from the package on first use (see `_InterfaceClasses`)
+SINGLE_COLOR_INTERFACE_CLASS_NAMES = dict(
+    Imaging="AhrensHdf5ImagingInterface",
+    SingleColorSegmentation="YuMu2019SingleColorSegmentationInterface",
+    RawBehavior="YuMu2019RawBehaviorInterface",
+    ProcessedBehavior="YuMu2019ProcessedBehaviorInterface",
+    Trials="YuMu2019TrialsInterface",
+    SwimIntervals="YuMu2019SwimIntervalsInterface",
+    ActivityStates="YuMu2019ActivityStatesInterface",
+)
+DUAL_COLOR_INTERFACE_CLASS_NAMES = dict(
+    NeuronImaging="AhrensHdf5ImagingInterface",
+    GliaImaging="AhrensHdf5ImagingInterface",
+    DualColorSegmentation="YuMu2019DualColorSegmentationInterface",
+    RawBehavior="YuMu2019RawBehaviorInterface",
+    ProcessedBehavior="YuMu2019ProcessedBehaviorInterface",
+    Trials="YuMu2019TrialsInterface",
+    SwimIntervals="YuMu2019SwimIntervalsInterface",
+    ActivityStates="YuMu2019ActivityStatesInterface",
+)
+# The number of blocks of frames cached for the other region when both regions share their frame reads
+SHARED_FRAME_BLOCKS = 2
 
-class YuMuCell2019SingleColorNWBConverter(NWBConverter):
-    """Primary conversion class for this dataset."""
 
-    data_interface_classes = dict(
-        Imaging=AhrensHdf5ImagingInterface,
-        SingleColorSegmentation=YuMu2019SingleColorSegmentationInterface,
-        RawBehavior=YuMu2019RawBehaviorInterface,
-        ProcessedBehavior=YuMu2019ProcessedBehaviorInterface,
-        Trials=YuMu2019TrialsInterface,
-        SwimIntervals=YuMu2019SwimIntervalsInterface,
-        ActivityStates=YuMu2019ActivityStatesInterface,
+class _InterfaceClasses:
+    """
+    The `data_interface_classes` of a converter, imported from the package when the converter first needs them.
+
+    Importing the converters then does not import the interfaces and their extractors.
+    """
+
+    def __init__(self, interface_class_names: Dict[str, str]):
+        self.interface_class_names = interface_class_names
+        self._interface_classes = None
+
+    def __get__(self, instance, owner) -> dict:
+        if self._interface_classes is None:
+            package = importlib.import_module(name=__package__)
+            self._interface_classes = {
+                name: getattr(package, class_name) for name, class_name in self.interface_class_names.items()
+            }
+        return self._interface_classes
+
+
+@contextmanager
+def _make_or_load_nwbfile(
+    nwbfile_path: Optional[FilePathType] = None,
+    nwbfile: Optional[NWBFile] = None,
+    metadata: Optional[dict] = None,
+    overwrite: bool = False,
+    verbose: bool = True,
+):
+    """
+    A copy of neuroconv.tools.nwb_helpers.make_or_load_nwbfile that writes the file with `exhaust_dci=False`.
+
+    HDF5IO then writes the data chunk iterators a buffer at a time in turn, rather than each in full before the next,
+    so the iterators over the two regions of the same frame files read each block of frames once for both (see
+    `AhrensHdf5FolderImagingExtractor.share_frame_reads`). Only that argument differs from the upstream function,
+    which is checked by the tests, so that an upgrade of neuroconv cannot make them diverge unnoticed.
+    """
+    nwbfile_path_in = Path(nwbfile_path) if nwbfile_path else None
+    assert not (nwbfile_path is None and nwbfile is None and metadata is None), (
+        "You must specify either an 'nwbfile_path', or an in-memory 'nwbfile' object, "
+        "or provide the metadata for creating one."
+    )
+    assert not (overwrite is False and nwbfile_path_in and nwbfile_path_in.exists() and nwbfile is not None), (
+        "'nwbfile_path' exists at location, 'overwrite' is False (append mode), but an in-memory 'nwbfile' object was "
+        "passed! Cannot reconcile which nwbfile object to write."
     )
 
+    load_kwargs = dict()
+    success = True
+    file_initially_exists = nwbfile_path_in.is_file() if nwbfile_path_in is not None else None
+    if nwbfile_path_in:
+        load_kwargs.update(path=nwbfile_path_in)
+        if file_initially_exists and not overwrite:
+            load_kwargs.update(mode="r+", load_namespaces=True)
+        else:
+            load_kwargs.update(mode="w")
+        io = NWBHDF5IO(**load_kwargs)
+    try:
+        if load_kwargs.get("mode", "") == "r+":
+            nwbfile = io.read()
+        elif nwbfile is None:
+            nwbfile = make_nwbfile_from_metadata(metadata=metadata)
+        yield nwbfile
+    except Exception as e:
+        success = False
+        raise e
+    finally:
+        if nwbfile_path_in:
+            try:
+                if success:
+                    io.write(nwbfile, exhaust_dci=False)
+
+                    if verbose:
+                        print(f"NWB file saved at {nwbfile_path_in}!")
+            finally:
+                io.close()
+
+                if not success and not file_initially_exists:
+                    nwbfile_path_in.unlink()
+
+
+class YuMuCell2019NWBConverter(NWBConverter):
+    """
+    Base conversion class for this dataset, with the options of resuming an interrupted write or writing Zarr.
+
+    The time, I/O and memory spent by each interface in each phase of the conversion are measured in the
+    `performance_report`, which is saved as JSON at the end of every conversion to a file.
+
+    Conversions can be bounded by a single memory limit, divided by a MemoryBudget among the data the interfaces
+    hold in memory and the buffers of their iterators.
+
+    The summary images accumulated by the imaging interfaces while their frames are written are appended to the file
+    once the write is complete.
+    """
+
+    def __init__(self, source_data: Dict[str, dict], verbose: bool = True):
+        """Validate source_data against source_schema and initialize all data interfaces."""
+        self.performance_report = PerformanceReport()
+        self.verbose = verbose
+        self._validate_source_data(source_data=source_data, verbose=self.verbose)
+        self.data_interface_objects = dict()
+        for name, data_interface in self.data_interface_classes.items():
+            if name in source_data:
+                with self.performance_report.measure(phase="init", name=name):
+                    self.data_interface_objects[name] = data_interface(**source_data[name])
+
+    def get_metadata(self):
+        """Auto-fill as much of the metadata as possible. Must comply with metadata schema."""
+        metadata = get_default_nwbfile_metadata()
+        for name, interface in self.data_interface_objects.items():
+            with self.performance_report.measure(phase="metadata", name=name):
+                interface_metadata = interface.get_metadata()
+            metadata = dict_deep_update(metadata, interface_metadata)
+        return metadata
+
+    def _add_to_nwbfile(
+        self,
+        nwbfile: NWBFile,
+        metadata: dict,
+        conversion_options: Optional[dict],
+        memory_budget: Optional[MemoryBudget] = None,
+        backend: str = "hdf5",
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Add the objects of every interface to the in-memory NWBFile, as in NWBConverter.run_conversion.
+
+        With a `memory_budget`, the buffers of the iterators are then shrunk to fit in the memory left by the data
+        the interfaces added to the file, for the number of buffers the `backend` holds at once.
+        """
+        conversion_options_to_run = dict_deep_update(self.get_conversion_options(), conversion_options or dict())
+        self.validate_conversion_options(conversion_options=conversion_options_to_run)
+        self._share_frame_reads()
+
+        for name, data_interface in self.data_interface_objects.items():
+            existing_object_ids = {container.object_id for container in nwbfile.all_children()}
+            with self.performance_report.measure(phase="object_construction", name=name):
+                data_interface.run_conversion(
+                    nwbfile=nwbfile, metadata=metadata, **conversion_options_to_run.get(name, dict())
+                )
+            new_containers = [
+                container for container in nwbfile.all_children() if container.object_id not in existing_object_ids
+            ]
+            # The buffers of the iterators added by the interface are measured as its 'data_write'
+            attach_performance_report(containers=new_containers, performance_report=self.performance_report, key=name)
+            if memory_budget is not None:
+                memory_budget.add(name=name, containers=new_containers)
+
+        if memory_budget is not None:
+            # The Zarr writer holds the buffers waiting for its threads along with the one being read
+            num_concurrent_buffers = (
+                1 if backend == "hdf5" else PENDING_BUFFERS_PER_WORKER * (max_workers or os.cpu_count()) + 1
+            )
+            memory_budget.allocate(
+                num_concurrent_buffers=num_concurrent_buffers, buffer_copies=self._get_buffer_copies()
+            )
+
+    def _share_frame_reads(self):
+        """Share the frame reads of the imaging interfaces, once their extractors are needed to add their data."""
+        pass
 
-class YuMuCell2019DualColorNWBConverter(NWBConverter):
+    def _get_buffer_copies(self) -> Dict[str, float]:
+        """The number of buffers held at once by the iterators of each interface, where it differs from their own."""
+        return dict()
+
+    def run_conversion(
+        self,
+        nwbfile_path: Optional[FilePathType] = None,
+        nwbfile: Optional[NWBFile] = None,
+        metadata: Optional[dict] = None,
+        overwrite: bool = False,
+        conversion_options: Optional[dict] = None,
+        resumable: bool = False,
+        backend: str = "hdf5",
+        max_workers: Optional[int] = None,
+        performance_report_file_path: Optional[FilePathType] = None,
+        memory_gb: Optional[float] = None,
+        reserved_gb: float = DEFAULT_RESERVED_GB,
+    ) -> NWBFile:
+        """
+        Run the NWB conversion over all the instantiated data interfaces.
+
+        Parameters
+        ----------
+        resumable : bool, default: False
+            Record the progress of every chunked dataset in a sidecar checkpoint next to 'nwbfile_path'
+            (e.g., 'session.checkpoint.json'). If the checkpoint of an interrupted write of the same conversion
+            exists, the partial file is reopened and only the remaining buffers are written. The checkpoint is
+            removed once the file is complete. Requires 'nwbfile_path'; always writes a new file otherwise.
+            The summary images of the imaging interfaces need every frame to be read in the same run, so they are
+            skipped (with a warning) when a write is resumed; convert again without the checkpoint to add them.
+        backend : str, default: "hdf5"
+            Either 'hdf5' or 'zarr'. With 'zarr', 'nwbfile_path' is the directory of a local NWB-Zarr store, and the
+            chunks of the imaging, traces and behavior are compressed and written by a pool of threads. Interfaces
+            without 'compression_options' among their conversion options use the Zarr defaults of their type of
+            series. Requires the 'hdmf-zarr' package.
+        max_workers : int, optional
+            For the Zarr backend, the number of threads compressing and writing chunks. Defaults to the number of CPUs.
+        performance_report_file_path : FilePathType, optional
+            Where to save the `performance_report` as JSON. Defaults to next to 'nwbfile_path'
+            (e.g., 'session.performance.json'); not saved if neither is specified.
+            For the Zarr backend, the buffers are compressed and written by the threads while the next ones are read,
+            so the 'write_seconds' of each interface only measure the time spent waiting for the threads.
+        memory_gb : float, optional
+            A limit on the memory of the conversion, in GB. The data the interfaces hold in memory until the file is
+            written are subtracted from it, and the buffers of every iterator are shrunk to fit in the remainder (see
+            `MemoryBudget`). The division and the observed peak are recorded under 'memory_budget' in the
+            `performance_report`. If not specified, the buffers follow the 'iterator_options' of each interface.
+        reserved_gb : float, default: 0.5
+            The part of 'memory_gb' reserved for the process itself, the libraries and the caches of the open files.
+
+        The other parameters are those of NWBConverter.run_conversion.
+        """
+        assert backend in ["hdf5", "zarr"], f"Unknown backend '{backend}'; choose from ['hdf5', 'zarr']!"
+        if performance_report_file_path is None and nwbfile_path is not None:
+            performance_report_file_path = get_default_performance_report_file_path(nwbfile_path=nwbfile_path)
+        self.performance_report.metadata.update(
+            nwbfile_path=None if nwbfile_path is None else str(nwbfile_path), backend=backend, resumable=resumable
+        )
+        memory_budget = None if memory_gb is None else MemoryBudget(memory_gb=memory_gb, reserved_gb=reserved_gb)
+
+        try:
+            with self.performance_report.measure(phase="conversion"):
+                nwbfile = self._run_conversion(
+                    nwbfile_path=nwbfile_path,
+                    nwbfile=nwbfile,
+                    metadata=metadata,
+                    overwrite=overwrite,
+                    conversion_options=conversion_options,
+                    resumable=resumable,
+                    backend=backend,
+                    max_workers=max_workers,
+                    memory_budget=memory_budget,
+                )
+        finally:
+            if memory_budget is not None and "conversion" in self.performance_report.phases:
+                memory_budget.record_peak(peak_rss_gb=self.performance_report.phases["conversion"]["peak_rss_mb"] / 1e3)
+                self.performance_report.metadata.update(memory_budget=memory_budget.to_dict())
+            # Also saved when the conversion fails, to show how far it got
+            if performance_report_file_path is not None:
+                self.performance_report.save(file_path=performance_report_file_path)
+                if self.verbose:
+                    print(f"Performance report saved at {performance_report_file_path}!")
+        return nwbfile
+
+    def _run_conversion(
+        self,
+        nwbfile_path: Optional[FilePathType],
+        nwbfile: Optional[NWBFile],
+        metadata: Optional[dict],
+        overwrite: bool,
+        conversion_options: Optional[dict],
+        resumable: bool,
+        backend: str,
+        max_workers: Optional[int],
+        memory_budget: Optional[MemoryBudget],
+    ) -> NWBFile:
+        if metadata is None:
+            metadata = self.get_metadata()
+        self.validate_metadata(metadata=metadata)
+
+        if backend == "zarr":
+            assert nwbfile_path is not None, "A conversion to Zarr must specify the 'nwbfile_path'!"
+            assert nwbfile is None, "A conversion to Zarr creates its own in-memory NWBFile!"
+            assert not resumable, "Resuming an interrupted write is only supported by the HDF5 backend!"
+            assert overwrite or not Path(nwbfile_path).exists(), f"'{nwbfile_path}' exists, but 'overwrite' is False!"
+
+            conversion_options = {
+                interface_name: dict(options) for interface_name, options in (conversion_options or dict()).items()
+            }
+            for interface_name in self.data_interface_objects:
+                if interface_name in INTERFACE_SERIES_TYPES:
+                    conversion_options.setdefault(interface_name, dict()).setdefault(
+                        "compression_options",
+                        get_default_compression_options(
+                            series_type=INTERFACE_SERIES_TYPES[interface_name], backend="zarr"
+                        ),
+                    )
+            nwbfile = make_nwbfile_from_metadata(metadata=metadata)
+            self._add_to_nwbfile(
+                nwbfile=nwbfile,
+                metadata=metadata,
+                conversion_options=conversion_options,
+                memory_budget=memory_budget,
+                backend=backend,
+                max_workers=max_workers,
+            )
+            with self.performance_report.measure(phase="write"):
+                write_nwbfile_to_zarr(nwbfile=nwbfile, nwbfile_path=nwbfile_path, max_workers=max_workers)
+            self._write_summary_images(nwbfile=nwbfile, nwbfile_path=nwbfile_path, backend=backend)
+            if self.verbose:
+                print(f"NWB file saved at {nwbfile_path}!")
+            return nwbfile
+
+        if not resumable:
+            write_measurement = None
+            try:
+                with _make_or_load_nwbfile(
+                    nwbfile_path=nwbfile_path,
+                    nwbfile=nwbfile,
+                    metadata=metadata,
+                    overwrite=overwrite,
+                    verbose=self.verbose,
+                ) as nwbfile_out:
+                    self._add_to_nwbfile(
+                        nwbfile=nwbfile_out,
+                        metadata=metadata,
+                        conversion_options=conversion_options,
+                        memory_budget=memory_budget,
+                    )
+                    # The file is written when leaving the context
+                    write_measurement = self.performance_report.start(phase="write")
+            finally:
+                if write_measurement is not None:
+                    self.performance_report.stop(measurement=write_measurement)
+            if nwbfile_path is not None:
+                self._write_summary_images(nwbfile=nwbfile_out, nwbfile_path=nwbfile_path, backend=backend)
+            return nwbfile_out
+        assert nwbfile_path is not None, "A resumable conversion must specify the 'nwbfile_path'!"
+        assert nwbfile is None, "A resumable conversion creates its own in-memory NWBFile!"
+
+        # Assemble the file in memory; none of the chunked data is read until the file is written
+        nwbfile = make_nwbfile_from_metadata(metadata=metadata)
+        self._add_to_nwbfile(
+            nwbfile=nwbfile, metadata=metadata, conversion_options=conversion_options, memory_budget=memory_budget
+        )
+        iterators = find_checkpointed_iterators(nwbfile=nwbfile)
+        checkpoint = WriteCheckpoint(nwbfile_path=nwbfile_path)
+        checkpoint.attach(iterators=iterators)
+
+        with self.performance_report.measure(phase="write"):
+            if checkpoint.can_resume(iterators=iterators):
+                if self.verbose:
+                    print(f"Resuming the interrupted write of '{nwbfile_path}'...")
+                with h5py.File(name=nwbfile_path, mode="r+") as file:
+                    checkpoint.resume(file=file, iterators=iterators)
+                # The specifications are cached only after all data is written, so they may be missing from the file
+                with NWBHDF5IO(path=str(nwbfile_path), mode="a") as io:
+                    io.write(io.read())
+            else:
+                assert overwrite or not Path(nwbfile_path).exists(), (
+                    f"'{nwbfile_path}' exists, but 'overwrite' is False and there is no checkpoint of "
+                    "an interrupted write to resume!"
+                )
+                with NWBHDF5IO(path=str(nwbfile_path), mode="w") as io:
+                    checkpoint.start(file=io._file, iterators=iterators)
+                    # Create the full structure of the file before writing any of the chunked data
+                    io.write(nwbfile, exhaust_dci=False)
+                checkpoint.set_structure_written()  # For files without any chunked datasets
+        self._write_summary_images(nwbfile=nwbfile, nwbfile_path=nwbfile_path, backend=backend)
+
+        if not checkpoint.is_complete:
+            warn(f"Not every chunked dataset of '{nwbfile_path}' was recorded as complete; keeping its checkpoint.")
+        else:
+            checkpoint.remove()
+        if self.verbose:
+            print(f"NWB file saved at {nwbfile_path}!")
+        return nwbfile
+
+    def _write_summary_images(self, nwbfile: NWBFile, nwbfile_path: FilePathType, backend: str):
+        """Append the summary images accumulated while the data of the NWBFile were written, if any."""
+        accumulators = find_summary_image_accumulators(containers=nwbfile.all_children())
+        if not accumulators:
+            return
+
+        with self.performance_report.measure(phase="summary_images"):
+            series_names = write_summary_images(nwbfile_path=nwbfile_path, accumulators=accumulators, backend=backend)
+        if self.verbose and series_names:
+            print(f"Summary images of {', '.join(series_names)} added to {nwbfile_path}!")
+
+
+class YuMuCell2019SingleColorNWBConverter(YuMuCell2019NWBConverter):
     """Primary conversion class for this dataset."""
 
-    data_interface_classes = dict(
-        NeuronImaging=AhrensHdf5ImagingInterface,
-        GliaImaging=AhrensHdf5ImagingInterface,
-        DualColorSegmentation=YuMu2019DualColorSegmentationInterface,
-        RawBehavior=YuMu2019RawBehaviorInterface,
-        ProcessedBehavior=YuMu2019ProcessedBehaviorInterface,
-        Trials=YuMu2019TrialsInterface,
-        SwimIntervals=YuMu2019SwimIntervalsInterface,
-        ActivityStates=YuMu2019ActivityStatesInterface,
-    )
+    data_interface_classes = _InterfaceClasses(interface_class_names=SINGLE_COLOR_INTERFACE_CLASS_NAMES)
+
+
+class YuMuCell2019DualColorNWBConverter(YuMuCell2019NWBConverter):
+    """Primary conversion class for this dataset."""
+
+    data_interface_classes = _InterfaceClasses(interface_class_names=DUAL_COLOR_INTERFACE_CLASS_NAMES)
+
+    def __init__(self, source_data: Dict[str, dict], verbose: bool = True):
+        super().__init__(source_data=source_data, verbose=verbose)
+        self._shares_frame_reads = False
+
+    def _share_frame_reads(self):
+        # Both regions are split from the same frame files, so read each file once for both TwoPhotonSeries
+        # Done when the data are added rather than on construction, which only holds the paths of the interfaces
+        if self._shares_frame_reads:
+            return
+        if "NeuronImaging" not in self.data_interface_objects or "GliaImaging" not in self.data_interface_objects:
+            return
+        neuron_imaging_interface = self.data_interface_objects["NeuronImaging"]
+        glia_imaging_interface = self.data_interface_objects["GliaImaging"]
+        if (
+            Path(neuron_imaging_interface.source_data["folder_path"]).absolute()
+            == Path(glia_imaging_interface.source_data["folder_path"]).absolute()
+        ):
+            neuron_imaging_interface.imaging_extractor.share_frame_reads(
+                glia_imaging_interface.imaging_extractor, max_blocks=SHARED_FRAME_BLOCKS
+            )
+            self._shares_frame_reads = True
+
+    def _get_buffer_copies(self) -> Dict[str, float]:
+        if not self._shares_frame_reads:
+            return dict()
+
+        from .tools.yu_mu_cell_2019_imaging_iterator import AhrensImagingDataChunkIterator
+
+        # Each cached block spans the full height of the frames, i.e., a buffer of each region, and the cache is shared
+        buffer_copies = AhrensImagingDataChunkIterator.buffer_copies + SHARED_FRAME_BLOCKS
+        return dict(NeuronImaging=buffer_copies, GliaImaging=buffer_copies)
@@ -0,0 +1,511 @@
+"""
+Verify a converted session by comparing sampled (or all) chunks of its NWB file against the source data.
+
+The imaging series are compared with the frame files (through AhrensHdf5FolderImagingExtractor), the fluorescence
+series with the segmentation files (through YuMu2019SegmentationExtractor), and the behavior series with the ephys
+files. The chunks are compared across a pool of processes, and the checksums, mismatches and throughput of each series
+are reported. Usage:
+
+    python yu_mu_cell_2019_verify_conversion.py 20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241 \\
+        E:/Ahrens/NWB/20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241.nwb \\
+        --data-folder-path E:/Ahrens --session-type single_color --fraction 0.01 --max-workers 8
+
+Use '--full' to compare every chunk, which reads as much as the conversion itself. Exits with status 1 if any chunk
+differs from its source.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import traceback
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from neuroconv.utils import FilePathType, FolderPathType, load_dict_from_file
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_imaging_extractor import (
+    AhrensHdf5FolderImagingExtractor,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_segmentation_extractor import (
+    YuMu2019SegmentationExtractor,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.interfaces.yu_mu_cell_2019_processsed_behavior_interface import (
+    YuMu2019ProcessedBehaviorInterface,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.interfaces.yu_mu_cell_2019_raw_behavior_interface import (
+    YuMu2019RawBehaviorInterface,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_behavior_iterator import MatlabBehaviorDataChunkIterator
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_convert_session import (
+    BEHAVIOR_RATE,
+    METADATA_FOLDER,
+    get_session_paths,
+)
+
+DEFAULT_NUM_SAMPLES = 16  # Chunks of each series, unless a fraction is specified
+MAX_REPORTED_MISMATCHES = 20  # Of each series
+# The regions of the imaging series written by `dual_color_session_to_nwb`, in the order of their metadata
+DUAL_COLOR_REGIONS = ["top", "bottom"]
+
+# The sources and NWB files opened by each worker process, reused by the chunks it is sent
+_sources = dict()
+_nwbfiles = dict()
+
+
+def get_source_specs(
+    session_name: str,
+    data_folder_path: FolderPathType,
+    session_type: str,
+    cell_type: str = "neuron",
+    session_paths: Optional[dict] = None,
+) -> dict:
+    """
+    Map the path of the data of each series the session functions write to a picklable description of its source.
+
+    Parameters
+    ----------
+    session_name : str
+        For example, '20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241'.
+    data_folder_path : FolderPathType
+        The folder holding the 'Imaging' and 'Segmentation' folders, e.g., 'E:/Ahrens'.
+    session_type : str
+        Either 'single_color' or 'dual_color'.
+    cell_type : str, default: "neuron"
+        For single-color sessions, which population was recorded; either 'neuron' or 'glia'.
+    session_paths : dict, optional
+        Overrides for any of the paths returned by `get_session_paths`, as passed to the session functions.
+
+    Returns
+    -------
+    source_specs : dict
+        Maps each dataset path (e.g., 'acquisition/SwimSignals/data') to a dict of its 'kind' ('imaging', 'trace' or
+        'behavior') and the arguments to open its source.
+    """
+    session_paths = dict(
+        get_session_paths(
+            session_name=session_name,
+            data_folder_path=data_folder_path,
+            session_type=session_type,
+            cell_type=cell_type,
+        ),
+        **{key: Path(value) for key, value in (session_paths or dict()).items()},
+    )
+
+    source_specs = dict()
+    if session_type == "single_color":
+        ophys_metadata_file_path = METADATA_FOLDER / f"yu_mu_cell_2019_single_color_{cell_type}_metadata.yml"
+        regions = [None]
+        segmentation_file_paths = [session_paths["segmentation_file_path"]]
+    else:
+        ophys_metadata_file_path = METADATA_FOLDER / "yu_mu_cell_2019_dual_color_neuron_metadata.yml"
+        regions = DUAL_COLOR_REGIONS
+        segmentation_file_paths = [
+            session_paths["neuron_segmentation_file_path"],
+            session_paths["glia_segmentation_file_path"],
+        ]
+    ophys_metadata = load_dict_from_file(file_path=ophys_metadata_file_path)["Ophys"]
+
+    for series_metadata, region in zip(ophys_metadata["TwoPhotonSeries"], regions):
+        source_specs[f"acquisition/{series_metadata['name']}/data"] = dict(
+            kind="imaging", folder_path=str(session_paths["imaging_folder_path"]), region=region
+        )
+    for container_name, trace_name in [("Fluorescence", "raw"), ("DfOverF", "dff")]:
+        container_metadata = ophys_metadata[container_name]
+        for series_metadata, file_path in zip(container_metadata["roi_response_series"], segmentation_file_paths):
+            dataset_path = f"processing/ophys/{container_metadata['name']}/{series_metadata['name']}/data"
+            source_specs[dataset_path] = dict(kind="trace", file_path=str(file_path), name=trace_name)
+
+    if session_paths["raw_behavior_file_path"].exists():
+        raw_behavior_interface = YuMu2019RawBehaviorInterface(
+            data_file_path=str(session_paths["raw_behavior_file_path"]),
+            metadata_file_path=str(METADATA_FOLDER / "yu_mu_cell_2019_behavior_descriptions.yml"),
+            sampling_frequency=BEHAVIOR_RATE,
+        )
+        for series_name, dataset_paths in raw_behavior_interface.get_series_dataset_paths().items():
+            source_specs[f"acquisition/{series_name}/data"] = dict(
+                kind="behavior", file_path=str(session_paths["raw_behavior_file_path"]), dataset_paths=dataset_paths
+            )
+    if session_paths["processed_behavior_file_path"].exists():
+        processed_behavior_interface = YuMu2019ProcessedBehaviorInterface(
+            file_path=str(session_paths["processed_behavior_file_path"]), sampling_frequency=BEHAVIOR_RATE
+        )
+        for series_name, dataset_paths in processed_behavior_interface.get_series_dataset_paths().items():
+            source_specs[f"processing/behavior/{series_name}/data"] = dict(
+                kind="behavior",
+                file_path=str(session_paths["processed_behavior_file_path"]),
+                dataset_paths=dataset_paths,
+            )
+    return source_specs
+
+
+class _ImagingSource:
+    """The frames of a region of a folder, transposed as written; the frames of the last chunk row are reused."""
+
+    def __init__(self, folder_path: str, region: Optional[str], num_frames: int):
+        # The manifest left by the conversion is reused; only the frames written to the file are discovered
+        self.imaging_extractor = AhrensHdf5FolderImagingExtractor(
+            folder_path=folder_path, sampling_frequency=1.0, region=region, max_num_frames=num_frames
+        )
+        self._frame_range = None
+        self._frames = None
+
+    def read(self, selection: Tuple[slice, ...]) -> np.ndarray:
+        frame_range = (selection[0].start, selection[0].stop)
+        if frame_range != self._frame_range:
+            self._frames = None  # Released before the next frames are read
+            video = self.imaging_extractor.get_video(start_frame=frame_range[0], end_frame=frame_range[1])
+            self._frames, self._frame_range = video.transpose(0, 2, 1, 3), frame_range
+        return self._frames[(slice(None),) + tuple(selection[1:])]
+
+
+class _TraceSource:
+    """The (num_frames, num_rois) traces of a segmentation file, reading only the frames and ROIs of each chunk."""
+
+    def __init__(self, file_path: str, name: str):
+        self.segmentation_extractor = YuMu2019SegmentationExtractor(file_path=file_path, sampling_frequency=1.0)
+        self.name = name
+
+    def read(self, selection: Tuple[slice, slice]) -> np.ndarray:
+        return self.segmentation_extractor.get_traces(
+            roi_ids=np.arange(selection[1].start, selection[1].stop),
+            start_frame=selection[0].start,
+            end_frame=selection[0].stop,
+            name=self.name,
+        )
+
+
+class _BehaviorSource:
+    """The channels of a MATLAB ephys file, stacked as written."""
+
+    def __init__(self, file_path: str, dataset_paths):
+        self.behavior_iterator = MatlabBehaviorDataChunkIterator(file_path=file_path, dataset_paths=dataset_paths)
+
+    def read(self, selection: Tuple[slice, ...]) -> np.ndarray:
+        return self.behavior_iterator._get_data(selection=selection)
+
+
+def _get_source(source_spec: dict, num_frames: int):
+    key = json.dumps(source_spec, sort_keys=True)
+    if key not in _sources:
+        source_kwargs = {name: value for name, value in source_spec.items() if name != "kind"}
+        if source_spec["kind"] == "imaging":
+            _sources[key] = _ImagingSource(num_frames=num_frames, **source_kwargs)
+        elif source_spec["kind"] == "trace":
+            _sources[key] = _TraceSource(**source_kwargs)
+        else:
+            _sources[key] = _BehaviorSource(**source_kwargs)
+    return _sources[key]
+
+
+def _open_nwbfile(nwbfile_path: FilePathType):
+    """An HDF5 file, or the root group of a Zarr store (a folder), opened for reading only."""
+    nwbfile_path = str(nwbfile_path)
+    if nwbfile_path not in _nwbfiles:
+        if Path(nwbfile_path).is_dir():
+            import zarr
+
+            _nwbfiles[nwbfile_path] = zarr.open(store=nwbfile_path, mode="r")
+        else:
+            import h5py
+
+            _nwbfiles[nwbfile_path] = h5py.File(name=nwbfile_path, mode="r")
+    return _nwbfiles[nwbfile_path]
+
+
+def _get_checksum(data: np.ndarray) -> int:
+    return zlib.crc32(np.ascontiguousarray(data).view("uint8").reshape(-1))
+
+
+def _verify_chunks(
+    nwbfile_path: str, dataset_path: str, source_spec: dict, chunk_indices: List[tuple], chunk_shape: tuple
+) -> dict:
+    """
+    Run in a worker process; compare chunks of the same row along time with their source.
+
+    Returns the checksums of each chunk in the file and in the source, whether they are equal, and the number of bytes
+    and seconds spent reading and comparing them. Any error is recorded for every chunk of the row.
+    """
+    start_time = time.perf_counter()
+    chunks = list()
+    num_bytes = 0
+    try:
+        dataset = _open_nwbfile(nwbfile_path=nwbfile_path)[dataset_path]
+        source = _get_source(source_spec=source_spec, num_frames=dataset.shape[0])
+        for chunk_index in chunk_indices:
+            selection = tuple(
+                slice(index * length, min((index + 1) * length, extent))
+                for index, length, extent in zip(chunk_index, chunk_shape, dataset.shape)
+            )
+            data = dataset[selection]
+            source_data = np.asarray(source.read(selection=selection))
+            is_equal = data.shape == source_data.shape and np.array_equal(
+                data, source_data, equal_nan=np.issubdtype(data.dtype, np.floating)
+            )
+            chunks.append(
+                dict(
+                    chunk_index=list(chunk_index),
+                    checksum=_get_checksum(data),
+                    source_checksum=_get_checksum(source_data.astype(data.dtype, copy=False)),
+                    is_equal=bool(is_equal),
+                )
+            )
+            num_bytes += data.nbytes
+    except Exception:  # Reported as mismatches of the chunks, rather than failing the whole verification
+        error = traceback.format_exc()
+        verified_chunk_indices = [chunk["chunk_index"] for chunk in chunks]
+        for chunk_index in chunk_indices:
+            if list(chunk_index) not in verified_chunk_indices:
+                chunks.append(
+                    dict(
+                        chunk_index=list(chunk_index), checksum=None, source_checksum=None, is_equal=False, error=error
+                    )
+                )
+    return dict(dataset_path=dataset_path, chunks=chunks, num_bytes=num_bytes, seconds=time.perf_counter() - start_time)
+
+
+def sample_chunk_indices(
+    shape: tuple,
+    chunk_shape: tuple,
+    num_samples: Optional[int] = DEFAULT_NUM_SAMPLES,
+    fraction: Optional[float] = None,
+    full: bool = False,
+    rng: Optional[np.random.Generator] = None,
+) -> List[tuple]:
+    """
+    Draw distinct chunks of a dataset uniformly at random, in the order they are stored.
+
+    Parameters
+    ----------
+    shape : tuple
+        The shape of the dataset.
+    chunk_shape : tuple
+        The shape of its chunks.
+    num_samples : int, optional
+        The number of chunks to draw; all of them if the dataset has fewer. Ignored if `fraction` is specified.
+    fraction : float, optional
+        The fraction of the chunks to draw, with at least one.
+    full : bool, default: False
+        Whether to return every chunk instead.
+    rng : numpy.random.Generator, optional
+        The generator of the draws. Defaults to a generator seeded with 0.
+
+    Returns
+    -------
+    chunk_indices : list of tuple
+        The index of each chunk along each axis of the dataset.
+    """
+    assert fraction is None or 0 < fraction <= 1, f"'fraction' ({fraction}) must be in (0, 1]!"
+    rng = rng or np.random.default_rng(seed=0)
+    grid_shape = tuple(-(-extent // length) for extent, length in zip(shape, chunk_shape))
+    num_chunks = int(np.prod(grid_shape))
+    if full:
+        num_samples = num_chunks
+    elif fraction is not None:
+        num_samples = max(1, int(round(fraction * num_chunks)))
+    num_samples = min(num_samples, num_chunks)
+    if num_chunks == 0:
+        return list()
+
+    flat_indices = np.sort(rng.choice(num_chunks, size=num_samples, replace=False))
+    return [tuple(int(index) for index in indices) for indices in zip(*np.unravel_index(flat_indices, grid_shape))]
+
+
+def _get_chunk_shape(dataset, max_chunk_mb: float = 16.0) -> tuple:
+    """The chunks of the dataset, or blocks of whole rows of up to `max_chunk_mb` for contiguous datasets."""
+    if dataset.chunks is not None:
+        return tuple(dataset.chunks)
+    row_bytes = int(np.prod(dataset.shape[1:])) * dataset.dtype.itemsize
+    num_rows = max(1, int(max_chunk_mb * 1e6 // max(row_bytes, 1)))
+    return (min(num_rows, dataset.shape[0]),) + tuple(dataset.shape[1:])
+
+
+def verify_conversion(
+    nwbfile_path: FilePathType,
+    source_specs: dict,
+    num_samples: Optional[int] = DEFAULT_NUM_SAMPLES,
+    fraction: Optional[float] = None,
+    full: bool = False,
+    max_workers: Optional[int] = None,
+    seed: int = 0,
+) -> dict:
+    """
+    Compare chunks of the data of an NWB file against their sources, across a pool of processes.
+
+    The chunks of each series are drawn at random (see `sample_chunk_indices`) and those of the same row along time
+    are compared by the same worker, so that each imaging frame is read from its file once. The workers open the
+    sources themselves, from their `source_specs`, and keep them open for the following chunks. Series of the file
+    that are not in `source_specs` (e.g., the summary images) are not compared.
+
+    Parameters
+    ----------
+    nwbfile_path : FilePathType
+        The NWB file, or NWB-Zarr store, to verify.
+    source_specs : dict
+        The source of each dataset path; see `get_source_specs`.
+    num_samples : int, optional
+        The number of chunks to compare in each series. Ignored if `fraction` is specified.
+    fraction : float, optional
+        The fraction of the chunks to compare in each series.
+    full : bool, default: False
+        Whether to compare every chunk instead.
+    max_workers : int, optional
+        The number of processes. Defaults to the number of CPUs.
+    seed : int, default: 0
+        The seed of the draws of chunks, so that a verification can be repeated.
+
+    Returns
+    -------
+    report : dict
+        For each verified series, the number of chunks compared and of mismatches (along with the first of them),
+        the checksums of the compared chunks in the file and in the source, and the throughput of the comparison;
+        and the totals over all series.
+    """
+    rng = np.random.default_rng(seed=seed)
+    nwbfile = _open_nwbfile(nwbfile_path=nwbfile_path)
+    series_reports = dict()
+    work_items = list()
+    for dataset_path, source_spec in source_specs.items():
+        if dataset_path not in nwbfile:
+            continue
+        dataset = nwbfile[dataset_path]
+        chunk_shape = _get_chunk_shape(dataset=dataset)
+        chunk_indices = sample_chunk_indices(
+            shape=dataset.shape, chunk_shape=chunk_shape, num_samples=num_samples, fraction=fraction, full=full, rng=rng
+        )
+        series_reports[dataset_path] = dict(
+            kind=source_spec["kind"],
+            shape=list(dataset.shape),
+            chunk_shape=list(chunk_shape),
+            num_chunks=int(np.prod([-(-extent // length) for extent, length in zip(dataset.shape, chunk_shape)])),
+        )
+        chunk_rows = defaultdict(list)
+        for chunk_index in chunk_indices:
+            chunk_rows[chunk_index[0]].append(chunk_index)
+        for row_chunk_indices in chunk_rows.values():
+            work_items.append(
+                dict(
+                    nwbfile_path=str(nwbfile_path),
+                    dataset_path=dataset_path,
+                    source_spec=source_spec,
+                    chunk_indices=row_chunk_indices,
+                    chunk_shape=chunk_shape,
+                )
+            )
+    # The workers open the file themselves
+    if hasattr(_nwbfiles.pop(str(nwbfile_path)), "close"):
+        nwbfile.close()
+
+    start_time = time.perf_counter()
+    results = defaultdict(list)
+    max_workers = max(1, min(max_workers or os.cpu_count(), len(work_items)))
+    # Fresh interpreters rather than forks, so no HDF5 library state is shared with the parent
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_verify_chunks, **work_item) for work_item in work_items]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["dataset_path"]].append(result)
+    seconds = time.perf_counter() - start_time
+
+    for dataset_path, series_report in series_reports.items():
+        series_results = results[dataset_path]
+        chunks = sorted(
+            [chunk for result in series_results for chunk in result["chunks"]], key=lambda chunk: chunk["chunk_index"]
+        )
+        mismatches = [chunk for chunk in chunks if not chunk["is_equal"]]
+        num_bytes = sum(result["num_bytes"] for result in series_results)
+        worker_seconds = sum(result["seconds"] for result in series_results)
+        series_report.update(
+            num_verified_chunks=len(chunks),
+            num_mismatches=len(mismatches),
+            mismatches=mismatches[:MAX_REPORTED_MISMATCHES],
+            # Checksums of the checksums of the compared chunks, in the order they are stored
+            checksum=f"{_get_checksum(np.array([chunk['checksum'] or 0 for chunk in chunks], dtype='uint32')):08x}",
+            source_checksum=(
+                f"{_get_checksum(np.array([chunk['source_checksum'] or 0 for chunk in chunks], dtype='uint32')):08x}"
+            ),
+            megabytes=num_bytes / 1e6,
+            worker_seconds=worker_seconds,
+            mb_per_second=num_bytes / 1e6 / worker_seconds if worker_seconds else None,
+        )
+
+    num_bytes = sum(series_report["megabytes"] for series_report in series_reports.values()) * 1e6
+    return dict(
+        nwbfile_path=str(nwbfile_path),
+        max_workers=max_workers,
+        seed=seed,
+        num_verified_chunks=sum(series_report["num_verified_chunks"] for series_report in series_reports.values()),
+        num_mismatches=sum(series_report["num_mismatches"] for series_report in series_reports.values()),
+        megabytes=num_bytes / 1e6,
+        seconds=seconds,
+        mb_per_second=num_bytes / 1e6 / seconds if seconds else None,
+        series=series_reports,
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Verify a converted session against its source data.")
+    parser.add_argument("session_name")
+    parser.add_argument("nwbfile_path", help="The NWB file (or NWB-Zarr store) written for the session.")
+    parser.add_argument("--data-folder-path", required=True, help="Holds the 'Imaging' and 'Segmentation' folders.")
+    parser.add_argument("--session-type", choices=["single_color", "dual_color"], default="single_color")
+    parser.add_argument("--cell-type", choices=["neuron", "glia"], default="neuron")
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument(
+        "--num-samples", type=int, default=DEFAULT_NUM_SAMPLES, help="Number of chunks to compare in each series."
+    )
+    sampling.add_argument("--fraction", type=float, default=None, help="Fraction of the chunks of each series.")
+    sampling.add_argument("--full", action="store_true", help="Compare every chunk.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Defaults to the number of CPUs.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the draws of chunks.")
+    parser.add_argument("--output-file-path", help="Also save the report as JSON.")
+    arguments = parser.parse_args(argv)
+
+    source_specs = get_source_specs(
+        session_name=arguments.session_name,
+        data_folder_path=arguments.data_folder_path,
+        session_type=arguments.session_type,
+        cell_type=arguments.cell_type,
+    )
+    report = verify_conversion(
+        nwbfile_path=arguments.nwbfile_path,
+        source_specs=source_specs,
+        num_samples=arguments.num_samples,
+        fraction=arguments.fraction,
+        full=arguments.full,
+        max_workers=arguments.max_workers,
+        seed=arguments.seed,
+    )
+
+    print(f"{'series':<56}{'chunks':>14}{'mismatches':>12}{'checksum':>10}{'MB/s':>10}")
+    for dataset_path, series_report in report["series"].items():
+        chunks = f"{series_report['num_verified_chunks']}/{series_report['num_chunks']}"
+        mb_per_second = series_report["mb_per_second"] or 0.0
+        print(
+            f"{dataset_path:<56}{chunks:>14}{series_report['num_mismatches']:>12}"
+            f"{series_report['checksum']:>10}{mb_per_second:>10.1f}"
+        )
+        for mismatch in series_report["mismatches"]:
+            if "error" in mismatch:
+                print(f"    chunk {mismatch['chunk_index']} could not be compared:\n{mismatch['error']}")
+            else:
+                print(f"    chunk {mismatch['chunk_index']} differs from its source")
+    print(
+        f"Compared {report['megabytes']:.1f} MB in {report['num_verified_chunks']} chunks in {report['seconds']:.1f} s "
+        f"({report['mb_per_second'] or 0.0:.1f} MB/s) on {report['max_workers']} processes; "
+        f"{report['num_mismatches']} mismatches."
+    )
+
+    if arguments.output_file_path is not None:
+        with open(file=arguments.output_file_path, mode="w") as file:
+            json.dump(obj=report, fp=file, indent=2)
+    if report["num_mismatches"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import write_synthetic_session
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_batch_conversion_script import (
+    _convert_session,
+    get_partial_nwbfile_path,
+)
+
+SESSION_NAME = "20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241"
+
+
+@pytest.fixture
+def session(tmp_path):
+    """A behavior-only session, with the partial file of a conversion that was killed."""
+    write_synthetic_session(
+        data_folder_path=tmp_path / "data",
+        session_name=SESSION_NAME,
+        session_type="single_color",
+        num_frames=2,
+        num_rois=10,
+    )
+    output_folder_path = tmp_path / "output"
+    output_folder_path.mkdir()
+    get_partial_nwbfile_path(nwbfile_path=output_folder_path / f"{SESSION_NAME}.nwb").write_bytes(b"truncated")
+    return dict(session_name=SESSION_NAME, session_type="single_color", include_ophys=False)
+
+
+def test_convert_session_moves_complete_file(tmp_path, session):
+    output_folder_path = tmp_path / "output"
+    _convert_session(
+        session=session, data_folder_path=str(tmp_path / "data"), output_folder_path=str(output_folder_path)
+    )
+
+    nwbfile_path = output_folder_path / f"{SESSION_NAME}.nwb"
+    assert nwbfile_path.is_file()
+    assert (output_folder_path / f"{SESSION_NAME}.performance.json").is_file()
+    assert not get_partial_nwbfile_path(nwbfile_path=nwbfile_path).exists()
+
+
+def test_failed_conversion_leaves_no_file(tmp_path, session):
+    output_folder_path = tmp_path / "output"
+    corrupted_file_path = tmp_path / "data.mat"
+    corrupted_file_path.write_bytes(b"not a MATLAB file")
+    with pytest.raises(RuntimeError):
+        _convert_session(
+            session=dict(session, session_paths=dict(processed_behavior_file_path=str(corrupted_file_path))),
+            data_folder_path=str(tmp_path / "data"),
+            output_folder_path=str(output_folder_path),
+        )
+
+    assert not (output_folder_path / f"{SESSION_NAME}.nwb").exists()
@@ -0,0 +1,55 @@
+import warnings
+
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_chunk_shape import (
+    MIN_TIMESERIES_TILE_SHAPE,
+    READ_PROFILES,
+    get_imaging_chunk_shape,
+    get_max_frames_per_buffer,
+)
+
+# The (frames, width, height, depth) of a long series of each region of a dual-color session, and of a single-color one
+DUAL_COLOR_MAXSHAPE = (10000, 2048, 1024, 29)
+SINGLE_COLOR_MAXSHAPE = (10000, 2048, 888, 29)
+
+
+def _get_chunk_shapes(maxshape: tuple, buffer_gb: float, chunk_mb: float = 5.0) -> dict:
+    buffer_frames = get_max_frames_per_buffer(maxshape=maxshape, dtype="int16", buffer_gb=buffer_gb)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # The chunks of 'timeseries' and 'balanced' reads are limited by the buffers
+        return {
+            read_profile: get_imaging_chunk_shape(
+                maxshape=maxshape,
+                dtype="int16",
+                read_profile=read_profile,
+                chunk_mb=chunk_mb,
+                buffer_frames=buffer_frames,
+            )
+            for read_profile in READ_PROFILES
+        }
+
+
+@pytest.mark.parametrize("maxshape", [DUAL_COLOR_MAXSHAPE, SINGLE_COLOR_MAXSHAPE])
+@pytest.mark.parametrize("buffer_gb", [0.5, 1.0, 10.0])
+def test_read_profiles_differ(maxshape, buffer_gb):
+    chunk_shapes = _get_chunk_shapes(maxshape=maxshape, buffer_gb=buffer_gb)
+    buffer_frames = get_max_frames_per_buffer(maxshape=maxshape, dtype="int16", buffer_gb=buffer_gb)
+
+    assert len(set(chunk_shapes.values())) == len(READ_PROFILES)
+    assert chunk_shapes["frame"] == (1, maxshape[1], maxshape[2], 1)
+    assert chunk_shapes["timeseries"][1:] == MIN_TIMESERIES_TILE_SHAPE + (1,)
+    assert chunk_shapes["timeseries"][0] <= buffer_frames
+    assert chunk_shapes["balanced"][0] <= buffer_frames
+
+
+def test_frame_chunks_split_large_planes_along_one_axis():
+    chunk_shape = _get_chunk_shapes(maxshape=DUAL_COLOR_MAXSHAPE, buffer_gb=0.5, chunk_mb=1.0)["frame"]
+
+    assert chunk_shape == (1, 488, 1024, 1)
+
+
+def test_frame_chunks_span_several_small_planes():
+    chunk_shape = _get_chunk_shapes(maxshape=(100, 64, 32, 8), buffer_gb=0.5)["frame"]
+
+    assert chunk_shape == (1, 64, 32, 8)
@@ -0,0 +1,84 @@
+import h5py
+import numpy as np
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_frame_manifest import FrameFileManifest
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import (
+    write_synthetic_frames,
+    write_synthetic_session,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_convert_session import single_color_session_to_nwb
+
+FRAME_SHAPE = (2, 16, 8)
+NUM_FRAMES = 4
+
+
+@pytest.fixture
+def folder_path(tmp_path):
+    folder_path = tmp_path / "frames"
+    write_synthetic_frames(folder_path=folder_path, num_frames=NUM_FRAMES, frame_shape=FRAME_SHAPE)
+    return folder_path
+
+
+def test_shape_from_reference_file(folder_path):
+    manifest = FrameFileManifest(folder_path=folder_path)
+    manifest.validate()
+
+    assert manifest.shape == FRAME_SHAPE
+    assert manifest.dtype == np.dtype("int16")
+
+
+def test_unexpected_shape_raises(folder_path):
+    manifest = FrameFileManifest(folder_path=folder_path, shape=(29, 888, 2048), dtype="int16")
+
+    assert manifest.truncated_frame_numbers == []
+    with pytest.raises(ValueError, match=r"not of the expected shape \(29, 888, 2048\).*has shape \(2, 16, 8\)"):
+        manifest.validate()
+
+
+def test_misshapen_file_raises(folder_path):
+    with h5py.File(name=folder_path / "TM00002_CM0_CHN00.h5", mode="w") as file:
+        file.create_dataset(name="default", data=np.zeros(shape=(1, 16, 8), dtype="int16"))
+    manifest = FrameFileManifest(folder_path=folder_path)
+
+    assert manifest.misshapen_frames == {2: ((1, 16, 8), np.dtype("int16"))}
+    with pytest.raises(ValueError, match=r"1 frame files .* not of the expected shape"):
+        manifest.validate()
+
+
+def test_truncated_file_raises(folder_path):
+    (folder_path / "TM00001_CM0_CHN00.h5").write_bytes(b"truncated")
+    manifest = FrameFileManifest(folder_path=folder_path)
+
+    with pytest.raises(ValueError, match=r"truncated or corrupt: \[1\]"):
+        manifest.validate()
+
+
+def test_convert_synthetic_session_of_another_frame_shape(tmp_path):
+    session_name = "20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241"
+    write_synthetic_session(
+        data_folder_path=tmp_path,
+        session_name=session_name,
+        session_type="single_color",
+        num_frames=NUM_FRAMES,
+        frame_shape=FRAME_SHAPE,
+        num_rois=20,
+    )
+    nwbfile_path = tmp_path / "session.nwb"
+    single_color_session_to_nwb(
+        session_name=session_name,
+        data_folder_path=tmp_path,
+        nwbfile_path=nwbfile_path,
+        stub_test=True,
+        stub_frames=NUM_FRAMES,
+        stub_rois=10,
+        display_progress=False,
+    )
+
+    with h5py.File(name=nwbfile_path, mode="r") as file:
+        assert file["acquisition/NeuronOnePhotonSeries/data"].shape == (
+            NUM_FRAMES,
+            FRAME_SHAPE[1],
+            FRAME_SHAPE[2],
+            FRAME_SHAPE[0],
+        )
@@ -0,0 +1,51 @@
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_imaging_extractor import (
+    AhrensHdf5FolderImagingExtractor,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import write_synthetic_frames
+
+NUM_FRAMES = 12
+BUFFER_FRAMES = 4
+
+
+@pytest.fixture
+def imaging_extractors(tmp_path):
+    """The extractors of both regions of a dual-color folder, sharing their frame reads."""
+    folder_path = tmp_path / "frames"
+    write_synthetic_frames(folder_path=folder_path, num_frames=NUM_FRAMES, frame_shape=(2, 32, 16))
+    neuron_imaging_extractor, glia_imaging_extractor = [
+        AhrensHdf5FolderImagingExtractor(folder_path=folder_path, sampling_frequency=1.0, region=region)
+        for region in ["top", "bottom"]
+    ]
+    neuron_imaging_extractor.share_frame_reads(glia_imaging_extractor, max_blocks=2)
+    yield neuron_imaging_extractor, glia_imaging_extractor
+    neuron_imaging_extractor.close()
+    glia_imaging_extractor.close()
+
+
+def _read_buffer(imaging_extractor: AhrensHdf5FolderImagingExtractor, start_frame: int):
+    """Read a buffer as AhrensImagingDataChunkIterator does, scheduling it and the next one first."""
+    imaging_extractor.prefetch_frames(start_frame=start_frame, end_frame=start_frame + 2 * BUFFER_FRAMES)
+    imaging_extractor.get_video(start_frame=start_frame, end_frame=start_frame + BUFFER_FRAMES)
+
+
+def test_prefetch_interleaved_regions(imaging_extractors):
+    for start_frame in range(0, NUM_FRAMES, BUFFER_FRAMES):
+        for imaging_extractor in imaging_extractors:
+            _read_buffer(imaging_extractor=imaging_extractor, start_frame=start_frame)
+    prefetcher = imaging_extractors[0]._prefetcher
+    prefetcher.close()  # Waits for the threads, which record the reads
+
+    assert prefetcher.num_prefetched_files == NUM_FRAMES
+
+
+def test_prefetch_consecutive_regions(imaging_extractors):
+    """Once the cached blocks are evicted, the second region reads every frame file again, ahead as the first."""
+    for imaging_extractor in imaging_extractors:
+        for start_frame in range(0, NUM_FRAMES, BUFFER_FRAMES):
+            _read_buffer(imaging_extractor=imaging_extractor, start_frame=start_frame)
+    prefetcher = imaging_extractors[0]._prefetcher
+    prefetcher.close()
+
+    assert prefetcher.num_prefetched_files == 2 * NUM_FRAMES
@@ -0,0 +1,77 @@
+import h5py
+import numpy as np
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_frame_manifest import FrameFileManifest
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_frame_timestamps import FrameTrackerTimestamps
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import write_synthetic_frames
+
+NUM_TRACKER_FRAMES = 10
+NUM_FRAME_FILES = 6
+SAMPLES_PER_FRAME = 4
+SAMPLING_FREQUENCY = 100.0
+
+
+@pytest.fixture
+def frame_tracker_timestamps(tmp_path):
+    """A tracker of NUM_TRACKER_FRAMES frames, with a final transition marking the end of the recording."""
+    frame_tracker = np.repeat(np.arange(NUM_TRACKER_FRAMES + 2) % 2, SAMPLES_PER_FRAME)[np.newaxis]
+    file_path = tmp_path / "data.mat"
+    with h5py.File(name=file_path, mode="w") as file:
+        file.create_dataset(name="data/frame", data=frame_tracker)
+    return FrameTrackerTimestamps(file_path=file_path, sampling_frequency=SAMPLING_FREQUENCY)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    """The frame files of the last NUM_FRAME_FILES frames of the tracker, numbered from zero."""
+    folder_path = tmp_path / "frames"
+    write_synthetic_frames(folder_path=folder_path, num_frames=NUM_FRAME_FILES, frame_shape=(1, 4, 4))
+    return FrameFileManifest(folder_path=folder_path)
+
+
+def test_frame_offset(frame_tracker_timestamps, manifest):
+    frame_offset = NUM_TRACKER_FRAMES - NUM_FRAME_FILES
+    timestamps = frame_tracker_timestamps.get_frame_file_timestamps(manifest=manifest, frame_offset=frame_offset)
+
+    np.testing.assert_array_equal(timestamps, frame_tracker_timestamps.timestamps[frame_offset:])
+
+
+def test_missing_frame_offset_raises(frame_tracker_timestamps, manifest):
+    with pytest.raises(ValueError, match="'frame_offset'"):
+        frame_tracker_timestamps.get_frame_file_timestamps(manifest=manifest)
+
+
+def test_allow_missing_trailing_frames(frame_tracker_timestamps, manifest):
+    with pytest.warns(UserWarning, match=f"{NUM_TRACKER_FRAMES - NUM_FRAME_FILES} after the last file"):
+        timestamps = frame_tracker_timestamps.get_frame_file_timestamps(
+            manifest=manifest, allow_missing_trailing_frames=True
+        )
+
+    np.testing.assert_array_equal(timestamps, frame_tracker_timestamps.timestamps[:NUM_FRAME_FILES])
+
+
+def test_frame_offset_past_tracker_raises(frame_tracker_timestamps, manifest):
+    with pytest.raises(ValueError, match="lie beyond"):
+        frame_tracker_timestamps.get_frame_file_timestamps(manifest=manifest, frame_offset=NUM_TRACKER_FRAMES)
+
+
+def test_stub_after_full_run(frame_tracker_timestamps, manifest):
+    """A stub reuses the timestamps saved by a full run, without taking the frames past its files as missing."""
+    frame_offset = NUM_TRACKER_FRAMES - NUM_FRAME_FILES
+    full_timestamps = frame_tracker_timestamps.get_frame_file_timestamps(manifest=manifest, frame_offset=frame_offset)
+    assert frame_tracker_timestamps.timestamps_file_path.exists()
+
+    num_stub_files = 2
+    stub_manifest = FrameFileManifest(folder_path=manifest.folder_path, max_num_files=num_stub_files)
+    stub_frame_tracker_timestamps = FrameTrackerTimestamps(
+        file_path=frame_tracker_timestamps.file_path,
+        sampling_frequency=SAMPLING_FREQUENCY,
+        max_num_frames=frame_offset + num_stub_files,
+    )
+    assert not stub_frame_tracker_timestamps.is_complete
+    stub_timestamps = stub_frame_tracker_timestamps.get_frame_file_timestamps(
+        manifest=stub_manifest, frame_offset=frame_offset
+    )
+
+    np.testing.assert_array_equal(stub_timestamps, full_timestamps[:num_stub_files])
@@ -0,0 +1,79 @@
+import h5py
+import numpy as np
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_matlab_half_precision import (
+    MatlabHalfPrecisionDataset,
+    is_matlab_half_precision,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import (
+    _write_matlab_half_precision_datasets,
+)
+
+DATASETS = dict(
+    baseline=np.linspace(start=0.0, stop=2.0, num=24, dtype="float32").reshape(4, 6),
+    timeseries=np.linspace(start=-1.0, stop=1.0, num=24, dtype="float32").reshape(6, 4),
+)
+
+
+@pytest.fixture
+def file_path(tmp_path):
+    file_path = tmp_path / "segmentation.mat"
+    with h5py.File(name=file_path, mode="w") as file:
+        _write_matlab_half_precision_datasets(file=file, datasets=DATASETS)
+    return file_path
+
+
+def _edit_metadata(file_path, edit):
+    """Apply `edit` to the uint32 words of the 'FileWrapper__' metadata, which may also shorten it."""
+    with h5py.File(name=file_path, mode="r+") as file:
+        words = np.frombuffer(file["#refs#/metadata"][()].tobytes(), dtype="<u4").copy()
+        words = edit(words)
+        del file["#refs#/metadata"]
+        file["#refs#"].create_dataset(name="metadata", data=np.frombuffer(words.tobytes(), dtype="uint8"))
+        # The MCOS cell references the metadata dataset, which has been replaced
+        mcos_cell = file["#subsystem#/MCOS"][()]
+        mcos_cell[0, 0] = file["#refs#/metadata"].ref
+        file["#subsystem#/MCOS"][...] = mcos_cell
+
+
+def _get_segment_start(words: np.ndarray, segment_index: int) -> int:
+    return int(words[2 + segment_index]) // 4
+
+
+def test_decode(file_path):
+    with h5py.File(name=file_path, mode="r") as file:
+        for dataset_name, data in DATASETS.items():
+            assert is_matlab_half_precision(dataset=file[dataset_name])
+            dataset = MatlabHalfPrecisionDataset(file=file, dataset_name=dataset_name)
+            np.testing.assert_array_equal(dataset[:], data.astype("float16").astype("float32"))
+
+
+def _set_class_name_index(words: np.ndarray) -> np.ndarray:
+    words[_get_segment_start(words=words, segment_index=0) + 5] = 1  # 'codedValue' rather than 'half'
+    return words
+
+
+def _set_unused_object_field(words: np.ndarray) -> np.ndarray:
+    words[_get_segment_start(words=words, segment_index=2) + 6 + 3] = 1  # The first object after the placeholder
+    return words
+
+
+def _truncate_property_sets(words: np.ndarray) -> np.ndarray:
+    return words[: _get_segment_start(words=words, segment_index=3) + 4]
+
+
+@pytest.mark.parametrize(
+    "edit, match",
+    [
+        (_set_class_name_index, "of class 'codedValue'"),
+        (_set_unused_object_field, r"the record \[1, 0, 0, 1, 1, 1\]"),
+        (_truncate_property_sets, "segment offsets"),
+    ],
+)
+def test_unexpected_layout_raises(file_path, edit, match):
+    _edit_metadata(file_path=file_path, edit=edit)
+
+    with h5py.File(name=file_path, mode="r") as file:
+        with pytest.raises(ValueError, match=f"Unexpected layout of the MATLAB subsystem metadata.*{match}"):
+            MatlabHalfPrecisionDataset(file=file, dataset_name="baseline")
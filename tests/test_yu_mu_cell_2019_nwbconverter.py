@@ -0,0 +1,196 @@
+import inspect
+import subprocess
+import sys
+from collections import Counter
+from datetime import datetime
+from itertools import groupby
+
+import h5py
+import numpy as np
+import pytest
+from dateutil import tz
+from hdmf.backends.hdf5.h5_utils import HDF5IODataChunkIteratorQueue
+from neuroconv.tools.nwb_helpers import make_or_load_nwbfile
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_imaging_extractor import (
+    AhrensHdf5FolderImagingExtractor,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import write_synthetic_frames
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_write_checkpoint import WriteCheckpoint
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_nwbconverter import (
+    YuMuCell2019DualColorNWBConverter,
+    _make_or_load_nwbfile,
+)
+
+NUM_FRAMES = 12
+FRAME_SHAPE = (2, 32, 16)  # (planes, columns, rows); each region is half of the columns
+BUFFER_SHAPE = (4, 16, 16, 2)
+REGIONS = dict(NeuronImaging="top", GliaImaging="bottom")
+SERIES_NAMES = dict(NeuronImaging="TwoPhotonSeriesNeuron", GliaImaging="TwoPhotonSeriesGlia")
+
+
+@pytest.fixture
+def frames_folder_path(tmp_path):
+    folder_path = tmp_path / "frames"
+    write_synthetic_frames(folder_path=folder_path, num_frames=NUM_FRAMES, frame_shape=FRAME_SHAPE)
+    return folder_path
+
+
+@pytest.fixture
+def frame_reads(monkeypatch):
+    """The number of times the dataset of each frame file is read by any imaging extractor."""
+    frame_reads = Counter()
+    get_frame_dataset = AhrensHdf5FolderImagingExtractor._get_frame_dataset
+
+    def counted_get_frame_dataset(self, frame_index: int):
+        frame_reads[frame_index] += 1
+        return get_frame_dataset(self, frame_index=frame_index)
+
+    monkeypatch.setattr(AhrensHdf5FolderImagingExtractor, "_get_frame_dataset", counted_get_frame_dataset)
+    return frame_reads
+
+
+def _run_dual_color_conversion(frames_folder_path, nwbfile_path, resumable: bool, backend: str = "hdf5"):
+    source_data = {
+        interface_name: dict(folder_path=str(frames_folder_path), sampling_frequency=1.0, region=region)
+        for interface_name, region in REGIONS.items()
+    }
+    converter = YuMuCell2019DualColorNWBConverter(source_data=source_data, verbose=False)
+    metadata = converter.get_metadata()
+    metadata["NWBFile"].update(session_start_time=datetime(2017, 2, 28, tzinfo=tz.gettz("US/Eastern")))
+    two_photon_series_metadata = metadata["Ophys"]["TwoPhotonSeries"][0]
+    metadata["Ophys"]["TwoPhotonSeries"] = [
+        dict(two_photon_series_metadata, name=series_name) for series_name in SERIES_NAMES.values()
+    ]
+    conversion_options = {
+        interface_name: dict(two_photon_series_index=index, iterator_options=dict(buffer_shape=BUFFER_SHAPE))
+        for index, interface_name in enumerate(REGIONS)
+    }
+    converter.run_conversion(
+        nwbfile_path=nwbfile_path,
+        metadata=metadata,
+        conversion_options=conversion_options,
+        overwrite=True,
+        resumable=resumable,
+        backend=backend,
+    )
+
+
+def _read_series_data(nwbfile_path, backend: str) -> dict:
+    if backend == "zarr":
+        import zarr
+
+        file = zarr.open_group(store=str(nwbfile_path), mode="r")
+        return {name: file[f"acquisition/{series_name}/data"][:] for name, series_name in SERIES_NAMES.items()}
+    with h5py.File(name=nwbfile_path, mode="r") as file:
+        return {name: file[f"acquisition/{series_name}/data"][()] for name, series_name in SERIES_NAMES.items()}
+
+
+@pytest.mark.parametrize("backend, resumable", [("hdf5", False), ("hdf5", True), ("zarr", False)])
+def test_dual_color_conversion_reads_each_frame_once(tmp_path, frames_folder_path, frame_reads, backend, resumable):
+    nwbfile_path = tmp_path / ("session.nwb.zarr" if backend == "zarr" else "session.nwb")
+    _run_dual_color_conversion(
+        frames_folder_path=frames_folder_path, nwbfile_path=nwbfile_path, resumable=resumable, backend=backend
+    )
+
+    assert frame_reads == Counter(range(NUM_FRAMES))
+    series_data = _read_series_data(nwbfile_path=nwbfile_path, backend=backend)
+    for interface_name, region in REGIONS.items():
+        imaging_extractor = AhrensHdf5FolderImagingExtractor(
+            folder_path=frames_folder_path, sampling_frequency=1.0, region=region
+        )
+        np.testing.assert_array_equal(series_data[interface_name], imaging_extractor.get_video().transpose(0, 2, 1, 3))
+
+
+def test_resumed_dual_color_conversion_reads_each_remaining_frame_once(tmp_path, frame_reads, monkeypatch):
+    """With more buffers left than the shared cache holds, the regions still take turns after resuming."""
+    num_frames = 6 * BUFFER_SHAPE[0]
+    frames_folder_path = tmp_path / "frames"
+    write_synthetic_frames(folder_path=frames_folder_path, num_frames=num_frames, frame_shape=FRAME_SHAPE)
+    nwbfile_path = tmp_path / "session.nwb"
+
+    interrupted_after_buffers = 2
+    commit = WriteCheckpoint.commit
+
+    def interrupted_commit(self, key: str, num_completed_buffers: int):
+        commit(self, key=key, num_completed_buffers=num_completed_buffers)
+        if key.endswith(f"{SERIES_NAMES['NeuronImaging']}/data") and num_completed_buffers == interrupted_after_buffers:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(WriteCheckpoint, "commit", interrupted_commit)
+    with pytest.raises(KeyboardInterrupt):
+        _run_dual_color_conversion(frames_folder_path=frames_folder_path, nwbfile_path=nwbfile_path, resumable=True)
+    monkeypatch.setattr(WriteCheckpoint, "commit", commit)
+    frame_reads.clear()
+    _run_dual_color_conversion(frames_folder_path=frames_folder_path, nwbfile_path=nwbfile_path, resumable=True)
+
+    first_remaining_frame = interrupted_after_buffers * BUFFER_SHAPE[0]
+    assert set(range(first_remaining_frame, num_frames)) <= set(frame_reads)
+    assert max(frame_reads.values()) == 1
+    series_data = _read_series_data(nwbfile_path=nwbfile_path, backend="hdf5")
+    for interface_name, region in REGIONS.items():
+        imaging_extractor = AhrensHdf5FolderImagingExtractor(
+            folder_path=frames_folder_path, sampling_frequency=1.0, region=region
+        )
+        np.testing.assert_array_equal(series_data[interface_name], imaging_extractor.get_video().transpose(0, 2, 1, 3))
+
+
+def test_dual_color_converter_construction_reads_no_frame_files(frames_folder_path, frame_reads):
+    source_data = {
+        interface_name: dict(folder_path=str(frames_folder_path), sampling_frequency=1.0, region=region)
+        for interface_name, region in REGIONS.items()
+    }
+    converter = YuMuCell2019DualColorNWBConverter(source_data=source_data, verbose=False)
+
+    assert all(converter.data_interface_objects[name]._imaging_extractor is None for name in REGIONS)
+    assert not frames_folder_path.with_name(f"{frames_folder_path.name}_frame_manifest.json").exists()
+    assert not frame_reads
+
+
+def _get_body(function) -> str:
+    """The source of a function after its docstring."""
+    return inspect.getsource(function).split('"""', maxsplit=2)[2]
+
+
+def test_make_or_load_nwbfile_mirrors_neuroconv():
+    upstream_body = _get_body(make_or_load_nwbfile)
+    assert upstream_body.count("io.write(nwbfile)") == 1
+    assert _get_body(_make_or_load_nwbfile) == upstream_body.replace(
+        "io.write(nwbfile)", "io.write(nwbfile, exhaust_dci=False)"
+    )
+
+
+@pytest.mark.parametrize("resumable", [False, True])
+def test_dual_color_conversion_writes_interleaved(tmp_path, frames_folder_path, monkeypatch, resumable):
+    """The buffers of the two imaging series are written in turn rather than one series after the other."""
+    written_dataset_names = list()
+    write_chunk = HDF5IODataChunkIteratorQueue._write_chunk
+
+    def recorded_write_chunk(cls, dset, data):
+        is_written = write_chunk(dset, data)
+        if is_written:
+            written_dataset_names.append(dset.name)
+        return is_written
+
+    monkeypatch.setattr(HDF5IODataChunkIteratorQueue, "_write_chunk", classmethod(recorded_write_chunk))
+    _run_dual_color_conversion(
+        frames_folder_path=frames_folder_path, nwbfile_path=tmp_path / "session.nwb", resumable=resumable
+    )
+
+    imaging_dataset_names = [f"/acquisition/{series_name}/data" for series_name in SERIES_NAMES.values()]
+    imaging_writes = [name for name in written_dataset_names if name in imaging_dataset_names]
+    num_buffers = NUM_FRAMES // BUFFER_SHAPE[0]
+    assert len(imaging_writes) == 2 * num_buffers
+    # Each series is written one buffer at a time, alternating with the other
+    assert [len(list(writes)) for _, writes in groupby(imaging_writes)] == [1] * (2 * num_buffers)
+
+
+def test_converter_import_does_not_import_interfaces():
+    code = (
+        "import sys\n"
+        "from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_nwbconverter import YuMuCell2019DualColorNWBConverter\n"
+        "print(any(name.startswith('ahrens_lab_to_nwb.yu_mu_cell_2019.interfaces.') for name in sys.modules))\n"
+    )
+    completed_process = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert completed_process.stdout.strip() == "False"
@@ -0,0 +1,34 @@
+import warnings
+
+import numpy as np
+import pytest
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_TwoPhotonSeries
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_plane_segmentation import OPHYS_MODULE_DESCRIPTION
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_summary_images import SummaryImageAccumulator
+
+FRAMES = np.arange(4 * 6 * 8 * 2, dtype="uint16").reshape(4, 6, 8, 2)
+
+
+@pytest.mark.parametrize("module_exists", [False, True])
+def test_add_to_ophys_module_of_segmentation(module_exists):
+    """The images join the 'ophys' module created by the segmentation interfaces without a mismatched description."""
+    nwbfile = mock_NWBFile()
+    nwbfile.add_acquisition(mock_TwoPhotonSeries(name="TwoPhotonSeries", data=FRAMES, rate=2.0))
+    if module_exists:
+        nwbfile.create_processing_module(name="ophys", description=OPHYS_MODULE_DESCRIPTION)
+    accumulator = SummaryImageAccumulator(
+        series_name="TwoPhotonSeries", num_frames=len(FRAMES), frame_shape=FRAMES.shape[1:], dtype=FRAMES.dtype
+    )
+    accumulator.add_frames(frames=FRAMES, start_frame=0)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        accumulator.add_to_nwbfile(nwbfile=nwbfile)
+
+    ophys = nwbfile.processing["ophys"]
+    assert ophys.description == OPHYS_MODULE_DESCRIPTION
+    summary_images = ophys["TwoPhotonSeriesSummaryImages"]
+    np.testing.assert_allclose(summary_images["mean_plane_01"].data, FRAMES[..., 1].mean(axis=0))
+    np.testing.assert_array_equal(summary_images["max_plane_00"].data, FRAMES[..., 0].max(axis=0))
@@ -0,0 +1,47 @@
+import h5py
+import numpy as np
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_trace_iterator import MatlabTraceDataChunkIterator
+
+NUM_FRAMES = 100
+NUM_ROIS = 30
+SOURCE_CHUNK_SHAPE = (10, NUM_ROIS)
+
+
+@pytest.fixture
+def traces(tmp_path):
+    traces = np.random.default_rng(seed=0).random(size=(NUM_FRAMES, NUM_ROIS), dtype="float32")
+    file_path = tmp_path / "segmentation.mat"
+    with h5py.File(name=file_path, mode="w") as file:
+        file.create_dataset(name="timeseries", data=traces, chunks=SOURCE_CHUNK_SHAPE)
+    return file_path, traces
+
+
+def _iterate(iterator: MatlabTraceDataChunkIterator) -> np.ndarray:
+    data = np.full(shape=iterator.maxshape, fill_value=np.nan, dtype=iterator.dtype)
+    for data_chunk in iterator:
+        data[data_chunk.selection] = data_chunk.data
+    return data
+
+
+def test_buffers_aligned_to_source_chunks(traces):
+    file_path, expected_traces = traces
+    # Room for 25 frames of every ROI; the buffers are cut down to whole source chunks of 10 frames
+    buffer_gb = 25 * NUM_ROIS * 4 / 1e9
+    iterator = MatlabTraceDataChunkIterator(
+        file_path=file_path, dataset_name="timeseries", buffer_gb=buffer_gb, chunk_shape=(5, NUM_ROIS)
+    )
+
+    assert iterator.buffer_shape == (20, NUM_ROIS)
+    np.testing.assert_array_equal(_iterate(iterator), expected_traces)
+
+
+def test_frame_and_roi_range(traces):
+    file_path, expected_traces = traces
+    iterator = MatlabTraceDataChunkIterator(
+        file_path=file_path, dataset_name="timeseries", start_frame=15, end_frame=60, end_roi=12
+    )
+
+    assert iterator.maxshape == (45, 12)
+    np.testing.assert_array_equal(_iterate(iterator), expected_traces[15:60, :12])
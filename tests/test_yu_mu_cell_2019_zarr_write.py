@@ -0,0 +1,111 @@
+import threading
+import time
+from functools import partial
+
+import numpy as np
+import pytest
+
+from ahrens_lab_to_nwb.yu_mu_cell_2019.extractors.yu_mu_cell_2019_imaging_extractor import (
+    AhrensHdf5FolderImagingExtractor,
+)
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools import yu_mu_cell_2019_zarr_write
+from ahrens_lab_to_nwb.yu_mu_cell_2019.tools.yu_mu_cell_2019_synthetic_data import write_synthetic_session
+from ahrens_lab_to_nwb.yu_mu_cell_2019 import yu_mu_cell_2019_nwbconverter
+from ahrens_lab_to_nwb.yu_mu_cell_2019.yu_mu_cell_2019_convert_session import (
+    get_session_paths,
+    single_color_session_to_nwb,
+)
+
+pytest.importorskip("hdmf_zarr")
+
+SESSION_NAME = "20160113_4_1_cy14_7dpf_0gain_trial_20170113_171241"
+NUM_FRAMES = 2
+
+
+@pytest.fixture(scope="module")
+def data_folder_path(tmp_path_factory):
+    data_folder_path = tmp_path_factory.mktemp("data")
+    write_synthetic_session(
+        data_folder_path=data_folder_path,
+        session_name=SESSION_NAME,
+        session_type="single_color",
+        num_frames=NUM_FRAMES,
+        num_rois=20,
+    )
+    return data_folder_path
+
+
+def _convert_session_to_zarr(data_folder_path, nwbfile_path):
+    single_color_session_to_nwb(
+        session_name=SESSION_NAME,
+        data_folder_path=data_folder_path,
+        nwbfile_path=nwbfile_path,
+        stub_test=True,
+        stub_frames=NUM_FRAMES,
+        stub_rois=10,
+        display_progress=False,
+        backend="zarr",
+        max_workers=2,
+    )
+
+
+def test_single_color_session_to_zarr(tmp_path, data_folder_path):
+    import ndx_events  # noqa: F401; registers the extension of the events, to read them
+    from hdmf_zarr.nwb import NWBZarrIO
+
+    nwbfile_path = tmp_path / "session.nwb.zarr"
+    _convert_session_to_zarr(data_folder_path=data_folder_path, nwbfile_path=nwbfile_path)
+
+    session_paths = get_session_paths(
+        session_name=SESSION_NAME, data_folder_path=data_folder_path, session_type="single_color"
+    )
+    imaging_extractor = AhrensHdf5FolderImagingExtractor(
+        folder_path=session_paths["imaging_folder_path"], sampling_frequency=1.0
+    )
+    with NWBZarrIO(path=str(nwbfile_path), mode="r") as io:
+        nwbfile = io.read()
+        assert len(nwbfile.experimenter) > 1
+        assert list(nwbfile.processing["behavior"]["BurstEvents"]["label"][:]) == ["bursts"]
+        np.testing.assert_array_equal(
+            nwbfile.acquisition["NeuronOnePhotonSeries"].data[:], imaging_extractor.get_video().transpose(0, 2, 1, 3)
+        )
+
+
+def test_failed_zarr_write_removes_store(tmp_path, data_folder_path, monkeypatch):
+    def get_video(self, *args, **kwargs):
+        raise OSError("Unreadable frame file!")
+
+    monkeypatch.setattr(AhrensHdf5FolderImagingExtractor, "get_video", get_video)
+    nwbfile_path = tmp_path / "session.nwb.zarr"
+    with pytest.raises(OSError, match="Unreadable frame file!"):
+        _convert_session_to_zarr(data_folder_path=data_folder_path, nwbfile_path=nwbfile_path)
+
+    assert not nwbfile_path.exists()
+
+
+def test_pending_buffers_bounded_by_size(tmp_path, data_folder_path, monkeypatch):
+    """Buffers larger than 'max_pending_gb' are written one at a time, whatever the number of threads."""
+    num_writing = 0
+    max_num_writing = 0
+    lock = threading.Lock()
+    write_buffer = yu_mu_cell_2019_zarr_write._write_buffer
+
+    def counted_write_buffer(dataset, selection: tuple, data):
+        nonlocal num_writing, max_num_writing
+        with lock:
+            num_writing += 1
+            max_num_writing = max(max_num_writing, num_writing)
+        time.sleep(0.01)
+        write_buffer(dataset=dataset, selection=selection, data=data)
+        with lock:
+            num_writing -= 1
+
+    monkeypatch.setattr(yu_mu_cell_2019_zarr_write, "_write_buffer", counted_write_buffer)
+    monkeypatch.setattr(
+        yu_mu_cell_2019_nwbconverter,
+        "write_nwbfile_to_zarr",
+        partial(yu_mu_cell_2019_zarr_write.write_nwbfile_to_zarr, max_pending_gb=1e-9),
+    )
+    _convert_session_to_zarr(data_folder_path=data_folder_path, nwbfile_path=tmp_path / "session.nwb.zarr")
+
+    assert max_num_writing == 1